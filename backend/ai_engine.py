@@ -1,74 +1,264 @@
 # backend/ai_engine.py (Versi FINAL Lengkap)
 
+import os
 import json
-import fitz # PyMuPDF
-from PIL import Image
+import time
+from typing import Callable, Dict, List
+
+from artefak_halaman import ArtefakDokumen
+import konteks_extractor
+from cache_hasil import get_cache_hasil
+from metrik_layanan import HALAMAN
 
 # Impor semua fungsi dan getter dari file-file helper kita
-from .konteks_extractor import (
-    analisis_halaman_dengan_layoutlmv3,
-    tata_ulang_dengan_flan_t5,
-    get_models # Impor getter utama
+from konteks_extractor import (
+    siapkan_input_layoutlmv3,
+    get_batcher_layoutlmv3,
+    tata_ulang_batch_dengan_flan_t5,
+    get_models, # Impor getter utama
+    versi_model
 )
-from .validasi_konten import (
+from validasi_konten import (
     _gabungkan_token_menjadi_entitas,
+    entitas_punya_label_field,
     cek_validitas_isian_data,
     deteksi_tipe_dokumen_dari_hasil_ai,
+    praklasifikasi_dokumen,
     ATURAN_VALIDASI
 )
 
-def run_ai_pipeline(path_pdf_str: str, nama_file_asli: str) -> dict:
+# 1 = model hanya dijalankan pada halaman yang kemungkinan berisi field wajib (hasil
+# praklasifikasi dari lapisan teks + nama file), dengan pemindaian penuh sebagai cadangan
+# jika masih ada field wajib yang kosong; 0 = semua halaman diproses seperti semula
+AI_PRAKLASIFIKASI = os.environ.get("AI_PRAKLASIFIKASI", "1") == "1"
+
+
+def _proses_halaman_dengan_model(
+    artefak: ArtefakDokumen,
+    daftar_halaman: List[int],
+    cache,
+    versi: str,
+    progress_callback: Callable[[str, int, int], None] = None
+) -> tuple:
+    """
+    LayoutLMv3 lalu FLAN-T5 untuk halaman-halaman `daftar_halaman` (nomor mulai dari 1).
+    Mengembalikan ({halaman: hasil_halaman}, metrik FLAN-T5 untuk halaman-halaman ini).
+    """
+    # Langkah 1: Analisis Kontekstual (LayoutLMv3) per halaman
+    print("AI Engine: [1/3] Memulai analisis kontekstual (LayoutLMv3)...")
+    hasil_kontekstual = []
+    # Hasil halaman yang isinya sudah pernah diproses dengan model yang sama
+    hasil_cache_per_halaman = {}
+    hash_per_halaman = {}
+    sumber_kata_per_halaman = {}
+    # Halaman yang OCR-nya gagal diproses dengan kata kosong, tetapi hasilnya tidak di-cache
+    # agar kegagalan sementara (mis. Tesseract) tidak menjadi hasil permanen halaman itu
+    halaman_ocr_gagal = set()
+    batcher = get_batcher_layoutlmv3()
+    # Semua halaman dikirim ke penggabung batch; halaman dari dokumen lain yang
+    # sedang diproses worker AI lain bisa ikut masuk ke batch yang sama.
+    future_per_halaman = []
+    for halaman_ke in daftar_halaman:
+        if cache:
+            hash_per_halaman[halaman_ke] = artefak.hash_halaman(halaman_ke)
+            hasil_cache = cache.ambil_ai_halaman(hash_per_halaman[halaman_ke], versi)
+            if hasil_cache is not None:
+                hasil_cache_per_halaman[halaman_ke] = hasil_cache
+                future_per_halaman.append(None)
+                continue
+
+        print(f"  - Menyiapkan Halaman {halaman_ke}/{len(artefak)}")
+        image = artefak.gambar(halaman_ke)
+        try:
+            # Lapisan teks PDF untuk halaman digital, Tesseract hanya untuk halaman scan
+            data_ocr_halaman = artefak.data_kata(halaman_ke)
+        except Exception as e:
+            print(f"[ERROR] OCR halaman {halaman_ke} gagal: {e}")
+            halaman_ocr_gagal.add(halaman_ke)
+            data_ocr_halaman = {"lebar": image.width, "tinggi": image.height, "kata": [], "sumber": None}
+        sumber_kata_per_halaman[halaman_ke] = data_ocr_halaman.get("sumber")
+
+        input_halaman = siapkan_input_layoutlmv3(image, data_ocr_halaman)
+        future_per_halaman.append(batcher.submit(input_halaman) if input_halaman is not None else None)
+
+    for posisi, (halaman_ke, future) in enumerate(zip(daftar_halaman, future_per_halaman), 1):
+        hasil_analisis_halaman = future.result() if future is not None else None
+        if hasil_analisis_halaman is None:
+            hasil_analisis_halaman = {"hasil_analisis_kontekstual": []}
+
+        hasil_kontekstual.append({"halaman": halaman_ke, "analisis": hasil_analisis_halaman})
+        if progress_callback:
+            progress_callback("layoutlmv3", posisi, len(daftar_halaman))
+    if hasil_cache_per_halaman:
+        print(f"AI Engine: {len(hasil_cache_per_halaman)}/{len(hasil_kontekstual)} halaman diambil dari cache.")
+    HALAMAN.tambah(len(daftar_halaman) - len(hasil_cache_per_halaman), tahap="ai")
+
+    # Langkah 2: Rekonstruksi (FLAN-T5), semua halaman di-generate per batch
+    print("AI Engine: [2/3] Memulai rekonstruksi data (FLAN-T5)...")
+    entitas_per_halaman = []
+    for item in hasil_kontekstual:
+        analisis_mentah = item.get('analisis', {}).get('hasil_analisis_kontekstual', [])
+        entitas_halaman = _gabungkan_token_menjadi_entitas(analisis_mentah) if analisis_mentah else []
+        # Halaman tanpa satu pun label field (mis. lampiran foto) tidak perlu di-generate
+        entitas_per_halaman.append(entitas_halaman if entitas_punya_label_field(entitas_halaman) else [])
+
+    indeks_diproses = [i for i, entitas in enumerate(entitas_per_halaman) if entitas]
+    mulai_flan_t5 = time.perf_counter()
+    hasil_flan_t5 = tata_ulang_batch_dengan_flan_t5([entitas_per_halaman[i] for i in indeks_diproses]) if indeks_diproses else []
+    waktu_flan_t5 = time.perf_counter() - mulai_flan_t5
+    data_per_halaman = dict(zip(indeks_diproses, hasil_flan_t5))
+
+    hasil_per_halaman = {}
+    for i, item in enumerate(hasil_kontekstual):
+        page_num = item["halaman"]
+        if page_num in hasil_cache_per_halaman:
+            hasil_halaman = {"halaman": page_num, **hasil_cache_per_halaman[page_num], "dari_cache": True}
+        else:
+            hasil_halaman = {
+                "halaman": page_num,
+                "hasil_ekstraksi": data_per_halaman.get(i, {}),
+                "flan_t5_dilewati": i not in data_per_halaman,
+                "sumber_kata": sumber_kata_per_halaman.get(page_num),
+                "jumlah_jendela_layoutlmv3": item.get('analisis', {}).get('jumlah_jendela', 0)
+            }
+            if page_num in halaman_ocr_gagal:
+                hasil_halaman["ocr_gagal"] = True
+            elif cache:
+                cache.simpan_ai_halaman(hash_per_halaman[page_num], versi, {k: v for k, v in hasil_halaman.items() if k != "halaman"})
+        hasil_per_halaman[page_num] = hasil_halaman
+        if progress_callback:
+            progress_callback("flan_t5", i + 1, len(hasil_kontekstual))
+
+    metrik_flan_t5 = {
+        "halaman_diproses": len(indeks_diproses),
+        "halaman_dilewati": len(hasil_kontekstual) - len(indeks_diproses) - len(hasil_cache_per_halaman),
+        "halaman_dari_cache": len(hasil_cache_per_halaman),
+        "waktu_detik": waktu_flan_t5,
+        "jumlah_parse_json": sum("error" not in h for h in hasil_flan_t5),
+    }
+    return hasil_per_halaman, metrik_flan_t5
+
+
+def run_ai_pipeline(
+    path_pdf_str: str,
+    nama_file_asli: str,
+    progress_callback: Callable[[str, int, int], None] = None,
+    data_ocr: Dict[int, dict] = None
+) -> dict:
     """
     Fungsi utama pipeline AI. Memuat model (jika perlu) dan memproses satu PDF.
+    `progress_callback(langkah, halaman, total)` dipanggil setiap kali satu halaman selesai.
+    `data_ocr` berisi hasil OCR halaman dari tahap ekstraksi agar tidak di-OCR ulang.
     """
     print(f"--- AI Engine Mulai: Memproses {nama_file_asli} ---")
-    
+
     # Langkah 0: Pastikan semua model sudah dimuat ke memori (GPU/CPU)
     # Getter akan menangani pemuatan hanya jika belum ada.
     get_models()
-    
+
+    cache = get_cache_hasil()
+    versi = versi_model() if cache else None
+
     laporan_final = {}
     try:
-        # Langkah 1: Analisis Kontekstual (LayoutLMv3) per halaman
-        print("AI Engine: [1/3] Memulai analisis kontekstual (LayoutLMv3)...")
-        doc = fitz.open(path_pdf_str)
-        hasil_kontekstual_proyek = []
-        for page_num in range(len(doc)):
-            print(f"  - Menganalisis Halaman {page_num+1}/{len(doc)}")
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(dpi=200)
-            image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            hasil_analisis_halaman = analisis_halaman_dengan_layoutlmv3(image)
-            if hasil_analisis_halaman is None:
-                hasil_analisis_halaman = {"hasil_analisis_kontekstual": []}
-            
-            hasil_kontekstual_proyek.append({"halaman": page_num + 1, "analisis": hasil_analisis_halaman})
-        doc.close()
-
-        # Langkah 2: Rekonstruksi (FLAN-T5) per halaman
-        print("AI Engine: [2/3] Memulai rekonstruksi data (FLAN-T5)...")
-        hasil_per_halaman = []
+        with ArtefakDokumen(path_pdf_str, data_ocr_awal=data_ocr) as artefak:
+            semua_halaman = list(range(1, len(artefak) + 1))
+            # Praklasifikasi murah (lapisan teks + nama file) sebelum model dijalankan
+            if AI_PRAKLASIFIKASI:
+                praklasifikasi = praklasifikasi_dokumen(
+                    [artefak.halaman(n).get_text() for n in semua_halaman], nama_file_asli
+                )
+            else:
+                praklasifikasi = {"tipe": None, "sumber": None, "halaman_terpilih": semua_halaman}
+            print(f"AI Engine: praklasifikasi {praklasifikasi['tipe'] or 'tidak dikenali'}, "
+                  f"{len(praklasifikasi['halaman_terpilih'])}/{len(semua_halaman)} halaman dipilih.")
+
+            hasil_per_halaman, metrik_flan_t5 = _proses_halaman_dengan_model(
+                artefak, praklasifikasi["halaman_terpilih"], cache, versi, progress_callback
+            )
+
+            # Cadangan: jika field wajib tipe tebakan belum lengkap, halaman sisanya ikut diproses
+            halaman_sisa = [n for n in semua_halaman if n not in hasil_per_halaman]
+            field_kosong_sebelum_cadangan = []
+            if halaman_sisa and praklasifikasi["tipe"]:
+                # Halaman yang keluaran FLAN-T5-nya gagal di-parse ({"error": ...}) tidak ikut
+                # digabung, agar kunci "error" tidak membuat seluruh validasi GAGAL
+                gabungan = {}
+                for hasil_halaman in hasil_per_halaman.values():
+                    if "error" not in hasil_halaman["hasil_ekstraksi"]:
+                        gabungan.update(hasil_halaman["hasil_ekstraksi"])
+                validasi_sementara = cek_validitas_isian_data(gabungan, praklasifikasi["tipe"])
+                if validasi_sementara["status"] == "GAGAL":
+                    field_kosong_sebelum_cadangan = list(ATURAN_VALIDASI.get(praklasifikasi["tipe"], ATURAN_VALIDASI["UMUM"])["field_wajib"])
+                else:
+                    field_kosong_sebelum_cadangan = validasi_sementara.get("field_kosong", [])
+                if field_kosong_sebelum_cadangan:
+                    print(f"AI Engine: field {field_kosong_sebelum_cadangan} belum ditemukan, memproses {len(halaman_sisa)} halaman sisa...")
+                    hasil_sisa, metrik_sisa = _proses_halaman_dengan_model(artefak, halaman_sisa, cache, versi, progress_callback)
+                    hasil_per_halaman.update(hasil_sisa)
+                    metrik_flan_t5 = {k: metrik_flan_t5[k] + metrik_sisa[k] for k in metrik_flan_t5}
+
+        # Halaman yang tidak pernah diproses model tetap dilaporkan agar urutan halaman utuh
+        detail_per_halaman = []
         semua_hasil_ekstraksi_dokumen = {}
-        for item in hasil_kontekstual_proyek:
-            page_num = item["halaman"]
-            analisis_mentah = item.get('analisis', {}).get('hasil_analisis_kontekstual', [])
-            
-            data_terstruktur = {}
-            if analisis_mentah:
-                entitas_halaman = _gabungkan_token_menjadi_entitas(analisis_mentah)
-                if entitas_halaman:
-                    data_terstruktur = tata_ulang_dengan_flan_t5(entitas_halaman)
-            
-            hasil_per_halaman.append({"halaman": page_num, "hasil_ekstraksi": data_terstruktur})
-            semua_hasil_ekstraksi_dokumen.update(data_terstruktur)
-
-        laporan_final["detail_per_halaman"] = hasil_per_halaman
+        for page_num in semua_halaman:
+            hasil_halaman = hasil_per_halaman.get(page_num) or {
+                "halaman": page_num,
+                "hasil_ekstraksi": {},
+                "flan_t5_dilewati": True,
+                "dilewati_praklasifikasi": True,
+                "sumber_kata": None,
+                "jumlah_jendela_layoutlmv3": 0
+            }
+            detail_per_halaman.append(hasil_halaman)
+            semua_hasil_ekstraksi_dokumen.update(hasil_halaman["hasil_ekstraksi"])
+
+        jumlah_generate = metrik_flan_t5["halaman_diproses"]
+        laporan_final["metrik_flan_t5"] = {
+            "strategi": konteks_extractor.FLAN_T5_STRATEGI,
+            "halaman_diproses": metrik_flan_t5["halaman_diproses"],
+            "halaman_dilewati": metrik_flan_t5["halaman_dilewati"],
+            "halaman_dari_cache": metrik_flan_t5["halaman_dari_cache"],
+            "waktu_detik": round(metrik_flan_t5["waktu_detik"], 3),
+            "tingkat_parse_json": metrik_flan_t5["jumlah_parse_json"] / jumlah_generate if jumlah_generate else None,
+        }
+        laporan_final["metrik_praklasifikasi"] = {
+            "aktif": AI_PRAKLASIFIKASI,
+            "tipe": praklasifikasi["tipe"],
+            "sumber": praklasifikasi["sumber"],
+            "halaman_total": len(semua_halaman),
+            "halaman_terpilih": len(praklasifikasi["halaman_terpilih"]),
+            # Halaman yang benar-benar melewati model (termasuk yang hasilnya dari cache)
+            "halaman_diproses_model": len(hasil_per_halaman),
+            "cadangan_penuh": bool(field_kosong_sebelum_cadangan),
+            "field_kosong_sebelum_cadangan": field_kosong_sebelum_cadangan,
+        }
+
+        laporan_final["detail_per_halaman"] = detail_per_halaman
+        # Dokumen dengan halaman yang OCR-nya gagal tidak disimpan di cache dokumen (lihat pipeline_proyek)
+        laporan_final["halaman_ocr_gagal"] = [h["halaman"] for h in detail_per_halaman if h.get("ocr_gagal")]
+        # Metrik biaya jendela geser: halaman padat butuh lebih dari satu forward pass
+        jumlah_jendela = [h["jumlah_jendela_layoutlmv3"] for h in detail_per_halaman]
+        laporan_final["metrik_layoutlmv3"] = {
+            "total_jendela": sum(jumlah_jendela),
+            "halaman_dengan_banyak_jendela": sum(1 for n in jumlah_jendela if n > 1),
+            "maks_jendela_per_halaman": max(jumlah_jendela, default=0),
+        }
+        # Berapa halaman yang katanya diambil dari lapisan teks PDF vs Tesseract
+        laporan_final["metrik_sumber_kata"] = {}
+        for h in detail_per_halaman:
+            if h.get("dilewati_praklasifikasi"):
+                continue
+            sumber = h.get("sumber_kata") or "tidak_ada"
+            laporan_final["metrik_sumber_kata"][sumber] = laporan_final["metrik_sumber_kata"].get(sumber, 0) + 1
 
         # Langkah 3: Deteksi Tipe Dokumen & Validasi Isian Data
         print("AI Engine: [3/3] Memulai validasi isian data...")
         tipe_dokumen = deteksi_tipe_dokumen_dari_hasil_ai(semua_hasil_ekstraksi_dokumen, nama_file_asli)
-        
+        # Judul di lapisan teks halaman 1 tetap petunjuk yang sah jika hasil AI tidak menyebut tipe
+        if tipe_dokumen == "UMUM" and praklasifikasi["tipe"]:
+            tipe_dokumen = praklasifikasi["tipe"]
+
         # Lakukan validasi untuk setiap halaman yang sudah diekstrak
         for hasil in laporan_final["detail_per_halaman"]:
             laporan_validasi = cek_validitas_isian_data(hasil["hasil_ekstraksi"], tipe_dokumen)
@@ -81,4 +271,4 @@ def run_ai_pipeline(path_pdf_str: str, nama_file_asli: str) -> dict:
     except Exception as e:
         print(f"--- AI Engine Error: Terjadi kesalahan fatal di pipeline ---")
         # Kirim ulang error agar bisa ditangkap oleh endpoint FastAPI
-        raise e
\ No newline at end of file
+        raise e
@@ -0,0 +1,197 @@
+# backend/antrian_job.py
+# Mode job asinkron: POST mengembalikan id job, status bisa di-polling, dan progres
+# per halaman dikirim lewat Server-Sent Events (SSE).
+
+import os
+import json
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# Jumlah job yang boleh berjalan bersamaan; job lain menunggu di antrian (FIFO)
+JOB_MAKS_BERSAMAAN = int(os.environ.get("JOB_MAKS_BERSAMAAN", "1"))
+# Jumlah job yang sudah selesai yang tetap disimpan di memori untuk di-polling
+JOB_MAKS_RIWAYAT = int(os.environ.get("JOB_MAKS_RIWAYAT", "200"))
+# Jumlah event yang disimpan per job untuk diputar ulang ke pelanggan SSE baru. Jika lewat,
+# event progres lama diringkas menjadi progres terakhir per (file, tahap); event status dan
+# file_mulai/file_selesai selalu disimpan. Pelanggan yang sudah terhubung tetap menerima semua event.
+JOB_MAKS_EVENT = int(os.environ.get("JOB_MAKS_EVENT", "1000"))
+
+STATUS_MENUNGGU = "MENUNGGU"
+STATUS_BERJALAN = "BERJALAN"
+STATUS_SELESAI = "SELESAI"
+STATUS_GAGAL = "GAGAL"
+
+
+class Job:
+    def __init__(self, id_job: str, daftar_file: List[str]):
+        self.id_job = id_job
+        self.daftar_file = daftar_file
+        self.status = STATUS_MENUNGGU
+        self.dibuat = datetime.now().isoformat(timespec="seconds")
+        self.mulai = None
+        self.selesai = None
+        self.hasil = None
+        self.error = None
+        self.progres_terakhir = None
+        self.events: List[dict] = []
+        self._urutan_berikut = 0
+        self._batas_ringkas = JOB_MAKS_EVENT
+        self._pelanggan: List[asyncio.Queue] = []
+
+    @property
+    def sudah_berakhir(self) -> bool:
+        return self.status in (STATUS_SELESAI, STATUS_GAGAL)
+
+    def ke_dict(self, posisi_antrian: Optional[int] = None) -> dict:
+        data = {
+            "id_job": self.id_job,
+            "status": self.status,
+            "daftar_file": self.daftar_file,
+            "dibuat": self.dibuat,
+            "mulai": self.mulai,
+            "selesai": self.selesai,
+            "progres_terakhir": self.progres_terakhir,
+            "jumlah_event": self._urutan_berikut,
+        }
+        if posisi_antrian is not None:
+            data["posisi_antrian"] = posisi_antrian
+        if self.hasil is not None:
+            data["hasil"] = self.hasil
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+    def _tambah_event(self, event: dict):
+        """Harus dipanggil dari thread event loop."""
+        event = {"urutan": self._urutan_berikut, **event}
+        self._urutan_berikut += 1
+        self.events.append(event)
+        if event.get("jenis") == "progres":
+            self.progres_terakhir = event
+        if len(self.events) > self._batas_ringkas:
+            self._ringkas_event()
+        for antrian in self._pelanggan:
+            antrian.put_nowait(event)
+
+    def _ringkas_event(self):
+        terakhir_per_kunci = {
+            (e.get("nama_file"), e.get("tahap")): e["urutan"] for e in self.events if e.get("jenis") == "progres"
+        }
+        self.events = [
+            e for e in self.events
+            if e.get("jenis") != "progres" or terakhir_per_kunci[(e.get("nama_file"), e.get("tahap"))] == e["urutan"]
+        ]
+        # Jika event non-progres saja sudah banyak, peringkasan berikutnya ditunda agar tidak terjadi di setiap event
+        self._batas_ringkas = max(JOB_MAKS_EVENT, 2 * len(self.events))
+
+
+class ManajerJob:
+    """Menyimpan job di memori dan menjalankannya dengan batas konkurensi."""
+
+    def __init__(self, maks_bersamaan: int = JOB_MAKS_BERSAMAAN, maks_riwayat: int = JOB_MAKS_RIWAYAT):
+        self.maks_bersamaan = max(1, maks_bersamaan)
+        self.maks_riwayat = maks_riwayat
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._antrian: List[str] = []
+        self._semaphore = None
+        self._loop = None
+        # Event loop hanya menyimpan weak reference ke task; referensi kuat disimpan di sini
+        # sampai task selesai agar job yang sedang berjalan tidak ikut dibersihkan GC
+        self._tugas: Set[asyncio.Task] = set()
+
+    def buat_job(self, daftar_file: List[str]) -> Job:
+        job = Job(str(uuid.uuid4()), daftar_file)
+        self._jobs[job.id_job] = job
+        self._bersihkan_riwayat()
+        return job
+
+    def ambil_job(self, id_job: str) -> Optional[Job]:
+        return self._jobs.get(id_job)
+
+    def posisi_antrian(self, job: Job) -> Optional[int]:
+        if job.status != STATUS_MENUNGGU or job.id_job not in self._antrian:
+            return None
+        return self._antrian.index(job.id_job) + 1
+
+    def jumlah_per_status(self) -> Dict[str, int]:
+        """Jumlah job yang menunggu dan yang sedang berjalan (untuk /metrics)."""
+        return {
+            STATUS_MENUNGGU: len(self._antrian),
+            STATUS_BERJALAN: sum(1 for job in list(self._jobs.values()) if job.status == STATUS_BERJALAN),
+        }
+
+    def kirim_event(self, job: Job, event: dict):
+        """Aman dipanggil dari thread mana pun (mis. progress_callback di thread worker)."""
+        self._loop.call_soon_threadsafe(job._tambah_event, event)
+
+    def jalankan(self, job: Job, fungsi_kerja: Callable[[Callable[[dict], None]], Awaitable[Any]]):
+        """
+        Menjadwalkan job. `fungsi_kerja` menerima callback kirim_event dan mengembalikan hasil job.
+        Harus dipanggil dari dalam event loop.
+        """
+        if self._semaphore is None:
+            self._loop = asyncio.get_running_loop()
+            self._semaphore = asyncio.Semaphore(self.maks_bersamaan)
+        self._antrian.append(job.id_job)
+        job._tambah_event({"jenis": "status", "status": job.status})
+        tugas = asyncio.create_task(self._runner(job, fungsi_kerja))
+        self._tugas.add(tugas)
+        tugas.add_done_callback(self._tugas.discard)
+        return tugas
+
+    async def _runner(self, job: Job, fungsi_kerja):
+        async with self._semaphore:
+            self._antrian.remove(job.id_job)
+            job.status = STATUS_BERJALAN
+            job.mulai = datetime.now().isoformat(timespec="seconds")
+            job._tambah_event({"jenis": "status", "status": job.status})
+            hasil, status_akhir, error = None, STATUS_GAGAL, "Job dibatalkan."
+            try:
+                hasil = await fungsi_kerja(lambda event: self.kirim_event(job, event))
+                status_akhir, error = STATUS_SELESAI, None
+            except Exception as e:
+                print(f"[ERROR] Job {job.id_job} gagal: {e}")
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                # Beri kesempatan event dari thread worker yang masih tertunda untuk masuk lebih dulu
+                await asyncio.sleep(0)
+                # Status akhir dan event statusnya dicatat dalam satu langkah (tanpa await di antaranya),
+                # sehingga pelanggan yang melihat job sudah berakhir pasti juga menerima event terakhirnya
+                job.hasil, job.error = hasil, error
+                job.selesai = datetime.now().isoformat(timespec="seconds")
+                job.status = status_akhir
+                job._tambah_event({"jenis": "status", "status": job.status, "error": job.error})
+
+    async def stream_event(self, job: Job, mulai_dari: int = 0) -> AsyncIterator[str]:
+        """Menghasilkan event job dalam format SSE: riwayat dulu, lalu event baru sampai job berakhir."""
+        antrian: asyncio.Queue = asyncio.Queue()
+        riwayat = [event for event in job.events if event["urutan"] >= mulai_dari]
+        job._pelanggan.append(antrian)
+        try:
+            for event in riwayat:
+                yield _format_sse(event)
+            terakhir = riwayat[-1]["urutan"] if riwayat else mulai_dari - 1
+            if job.sudah_berakhir and (not job.events or terakhir >= job.events[-1]["urutan"]):
+                return
+            while True:
+                event = await antrian.get()
+                if event["urutan"] <= terakhir:
+                    continue
+                yield _format_sse(event)
+                if event.get("jenis") == "status" and event.get("status") in (STATUS_SELESAI, STATUS_GAGAL):
+                    return
+        finally:
+            job._pelanggan.remove(antrian)
+
+    def _bersihkan_riwayat(self):
+        berakhir = [id_job for id_job, job in self._jobs.items() if job.sudah_berakhir]
+        for id_job in berakhir[:max(0, len(berakhir) - self.maks_riwayat)]:
+            del self._jobs[id_job]
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['urutan']}\nevent: {event.get('jenis', 'pesan')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
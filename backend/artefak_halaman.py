@@ -0,0 +1,228 @@
+# backend/artefak_halaman.py
+# Lapisan artefak per halaman: setiap halaman PDF dirender sekali dan di-OCR sekali
+# (pytesseract.image_to_data), lalu hasilnya dipakai bersama oleh tahap ekstraksi
+# (teks polos) dan tahap AI (kata + bounding box untuk LayoutLMv3). Halaman yang punya
+# lapisan teks digital (PDF hasil ekspor Word) tidak perlu di-OCR: kata dan kotaknya
+# diambil langsung dari PyMuPDF.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+from PIL import Image
+import pytesseract
+
+from cache_hasil import get_cache_hasil
+from metrik_layanan import DURASI_LANGKAH
+
+DPI_RENDER = 200
+BAHASA_OCR = "ind+eng"
+# Jumlah raster halaman yang disimpan di memori sekaligus (satu halaman A4 @200 DPI ~ 11 MB).
+# Data OCR (kecil) disimpan untuk semua halaman.
+ARTEFAK_MAKS_GAMBAR = int(os.environ.get("ARTEFAK_MAKS_GAMBAR", "4"))
+
+# Di Windows Tesseract biasanya tidak ada di PATH; lokasinya juga bisa diatur lewat TESSERACT_CMD
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD") or (r'C:\Program Files\Tesseract-OCR\tesseract.exe' if os.name == "nt" else None)
+if TESSERACT_CMD:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+# Sumber kata untuk LayoutLMv3: "hibrida" = lapisan teks PDF jika ada, Tesseract untuk halaman
+# hasil scan; "ocr" = selalu Tesseract (perilaku lama)
+SUMBER_KATA = os.environ.get("SUMBER_KATA", "hibrida").lower()
+# Lapisan teks dianggap layak jika berisi minimal sekian kata dan hampir tanpa karakter
+# pengganti (U+FFFD muncul jika font PDF tidak punya peta Unicode)
+KATA_NATIVE_MINIMUM = int(os.environ.get("KATA_NATIVE_MINIMUM", "3"))
+RASIO_KATA_RUSAK_MAKS = 0.1
+
+SUMBER_TEKS_PDF = "teks_pdf"
+SUMBER_TESSERACT = "tesseract"
+
+
+def render_halaman(page: fitz.Page, dpi: int = DPI_RENDER) -> Image.Image:
+    with DURASI_LANGKAH.waktu(langkah="render"):
+        pix = page.get_pixmap(dpi=dpi)
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+
+def ocr_ke_data(image: Image.Image, bahasa: str = BAHASA_OCR) -> dict:
+    """
+    Menjalankan Tesseract satu kali dan menyimpan setiap kata beserta kotak (piksel),
+    confidence, dan nomor blok/paragraf/baris agar teks polos bisa disusun ulang.
+    """
+    with DURASI_LANGKAH.waktu(langkah="tesseract"):
+        ocr = pytesseract.image_to_data(image, lang=bahasa, output_type=pytesseract.Output.DICT)
+    kata = []
+    for i in range(len(ocr["text"])):
+        teks = ocr["text"][i]
+        if not teks.strip():
+            continue
+        x, y, w, h = ocr["left"][i], ocr["top"][i], ocr["width"][i], ocr["height"][i]
+        kata.append({
+            "teks": teks,
+            "kotak": [x, y, x + w, y + h],
+            "conf": float(ocr["conf"][i]),
+            "baris": [ocr["block_num"][i], ocr["par_num"][i], ocr["line_num"][i]],
+        })
+    lebar, tinggi = image.size
+    return {"lebar": lebar, "tinggi": tinggi, "kata": kata}
+
+
+def kata_dari_lapisan_teks(page: fitz.Page) -> Optional[dict]:
+    """
+    Kata dan kotak dari lapisan teks PDF dalam format yang sama dengan ocr_ke_data
+    (satuan point, bukan piksel). Mengembalikan None jika lapisan teksnya kosong atau rusak,
+    sehingga pemanggil kembali ke Tesseract.
+    """
+    daftar_kata = page.get_text("words", sort=True)
+    if len(daftar_kata) < KATA_NATIVE_MINIMUM:
+        return None
+    if sum("\ufffd" in w[4] for w in daftar_kata) > RASIO_KATA_RUSAK_MAKS * len(daftar_kata):
+        return None
+    # Koordinat kata mengikuti halaman sebelum rotasi; gambar render mengikuti page.rect (sesudah rotasi)
+    matriks = page.rotation_matrix
+    kata = []
+    for x0, y0, x1, y1, teks, blok, baris, _ in daftar_kata:
+        kotak = fitz.Rect(x0, y0, x1, y1) * matriks
+        kata.append({
+            "teks": teks,
+            "kotak": [kotak.x0, kotak.y0, kotak.x1, kotak.y1],
+            "conf": 100.0,
+            "baris": [blok, 0, baris],
+        })
+    return {"lebar": page.rect.width, "tinggi": page.rect.height, "kata": kata, "sumber": SUMBER_TEKS_PDF}
+
+
+def teks_dari_data_ocr(data_ocr: dict) -> str:
+    """Menyusun teks polos (mirip image_to_string) dari daftar kata hasil image_to_data."""
+    baris_teks, blok_sebelumnya, baris_sebelumnya, kata_baris = [], None, None, []
+    for kata in data_ocr.get("kata", []):
+        blok, par, baris = kata["baris"]
+        if (blok, par, baris) != baris_sebelumnya and kata_baris:
+            baris_teks.append(" ".join(kata_baris))
+            kata_baris = []
+        if blok_sebelumnya is not None and (blok, par) != blok_sebelumnya:
+            baris_teks.append("")
+        kata_baris.append(kata["teks"])
+        baris_sebelumnya, blok_sebelumnya = (blok, par, baris), (blok, par)
+    if kata_baris:
+        baris_teks.append(" ".join(kata_baris))
+    return "\n".join(baris_teks) + ("\n" if baris_teks else "")
+
+
+def kata_dan_kotak_untuk_model(data_ocr: dict, conf_minimum: float = 0) -> Tuple[List[str], List[List[int]]]:
+    """Mengambil kata dan kotak yang dinormalisasi ke skala 0-1000 (format input LayoutLMv3)."""
+    lebar, tinggi = data_ocr["lebar"], data_ocr["tinggi"]
+    words, boxes = [], []
+    for kata in data_ocr.get("kata", []):
+        if kata["conf"] <= conf_minimum:
+            continue
+        x1, y1, x2, y2 = kata["kotak"]
+        words.append(kata["teks"])
+        # Kotak dari lapisan teks bisa sedikit keluar dari halaman; model menolak nilai di luar 0-1000
+        boxes.append([
+            min(1000, max(0, int(x1 / lebar * 1000))), min(1000, max(0, int(y1 / tinggi * 1000))),
+            min(1000, max(0, int(x2 / lebar * 1000))), min(1000, max(0, int(y2 / tinggi * 1000))),
+        ])
+    return words, boxes
+
+
+class ArtefakDokumen:
+    """
+    Artefak render/OCR untuk satu PDF. Halaman dirender dan di-OCR secara lazy, paling
+    banyak sekali per halaman. `data_ocr_awal` ({nomor_halaman: data_ocr}) bisa diisi dari
+    tahap sebelumnya yang berjalan di proses lain, sehingga Tesseract tidak dijalankan ulang.
+    """
+
+    def __init__(self, path_pdf: str, dpi: int = DPI_RENDER, data_ocr_awal: Optional[Dict[int, dict]] = None):
+        self.path_pdf = path_pdf
+        self.dpi = dpi
+        self.doc = fitz.open(path_pdf)
+        self._gambar: "OrderedDict[int, Image.Image]" = OrderedDict()
+        self._data_ocr: Dict[int, dict] = {int(k): v for k, v in (data_ocr_awal or {}).items()}
+        self._data_kata_native: Dict[int, Optional[dict]] = {}
+        self._hash: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.tutup()
+
+    def tutup(self):
+        self._gambar.clear()
+        self.doc.close()
+
+    def halaman(self, nomor: int) -> fitz.Page:
+        """`nomor` dimulai dari 1, sama seperti field 'halaman' di hasil ekstraksi."""
+        return self.doc.load_page(nomor - 1)
+
+    def gambar(self, nomor: int) -> Image.Image:
+        with self._lock:
+            if nomor in self._gambar:
+                self._gambar.move_to_end(nomor)
+                return self._gambar[nomor]
+            image = render_halaman(self.halaman(nomor), self.dpi)
+            self._gambar[nomor] = image
+            while len(self._gambar) > max(1, ARTEFAK_MAKS_GAMBAR):
+                self._gambar.popitem(last=False)
+            return image
+
+    def hash_halaman(self, nomor: int) -> str:
+        """
+        SHA-256 isi halaman tanpa merender: content stream, ukuran/rotasi halaman, dan
+        stream gambar/form serta objek font yang dipakai. Halaman yang sama di PDF lain
+        (mis. hasil revisi yang hanya mengubah satu halaman) menghasilkan hash yang sama.
+        """
+        if nomor not in self._hash:
+            page = self.halaman(nomor)
+            h = hashlib.sha256()
+            h.update(f"{tuple(page.rect)}|{page.rotation}|{self.dpi}".encode())
+            h.update(page.read_contents())
+            # Gambar dan form XObject: isi stream mentahnya; font: objek kamusnya saja
+            for xref in sorted({img[0] for img in page.get_images(full=True)} | {xo[0] for xo in page.get_xobjects()}):
+                if xref > 0 and self.doc.xref_is_stream(xref):
+                    h.update(self.doc.xref_stream_raw(xref))
+            for font in page.get_fonts(full=True):
+                if font[0] > 0:
+                    h.update(self.doc.xref_object(font[0], compressed=True).encode())
+            self._hash[nomor] = h.hexdigest()
+        return self._hash[nomor]
+
+    def data_ocr(self, nomor: int) -> dict:
+        if nomor not in self._data_ocr:
+            cache = get_cache_hasil()
+            kunci = f"{self.hash_halaman(nomor)}:{BAHASA_OCR}" if cache else None
+            data = cache.ambil_ocr_halaman(kunci) if cache else None
+            if data is None:
+                data = ocr_ke_data(self.gambar(nomor))
+                if cache:
+                    cache.simpan_ocr_halaman(kunci, data)
+            self._data_ocr[nomor] = data
+        return self._data_ocr[nomor]
+
+    def data_kata(self, nomor: int) -> dict:
+        """
+        Kata + kotak untuk LayoutLMv3. Dengan SUMBER_KATA=hibrida, halaman digital memakai
+        lapisan teks PDF (milidetik) dan Tesseract hanya dijalankan untuk halaman scan.
+        Field "sumber" mencatat asal kata halaman ini.
+        """
+        if SUMBER_KATA == "hibrida":
+            if nomor not in self._data_kata_native:
+                self._data_kata_native[nomor] = kata_dari_lapisan_teks(self.halaman(nomor))
+            if self._data_kata_native[nomor] is not None:
+                return self._data_kata_native[nomor]
+        return {**self.data_ocr(nomor), "sumber": SUMBER_TESSERACT}
+
+    def teks_ocr(self, nomor: int) -> str:
+        return teks_dari_data_ocr(self.data_ocr(nomor))
+
+    def ekspor_ocr(self) -> Dict[int, dict]:
+        """Data OCR yang sudah dihitung, untuk diteruskan ke tahap berikutnya."""
+        return dict(self._data_ocr)
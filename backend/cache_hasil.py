@@ -0,0 +1,224 @@
+# backend/cache_hasil.py
+# Cache hasil berbasis isi (content-addressed) di SQLite, dipakai bersama oleh proses
+# utama dan proses worker pool CPU:
+#   - "dokumen"    : SHA-256 byte PDF + versi model -> hasil run_ai_pipeline + ringkasan ekstraksi
+#   - "halaman_ocr": hash isi halaman -> data OCR (tidak bergantung pada model)
+#   - "halaman_ai" : hash isi halaman + versi model -> hasil LayoutLMv3/FLAN-T5 halaman itu
+# Ukuran total dibatasi; entri yang paling lama tidak dipakai dibuang lebih dulu (LRU).
+# Cache bersifat "fail open": jika SQLite gagal (terkunci, disk penuh), operasi dianggap miss
+# atau tidak disimpan, dan permintaan tetap berjalan tanpa cache.
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+CACHE_AKTIF = os.environ.get("CACHE_AKTIF", "1") == "1"
+PATH_CACHE = Path(os.environ.get("CACHE_PATH", "data/sistem_validasi/cache_hasil.sqlite3"))
+CACHE_MAKS_MB = float(os.environ.get("CACHE_MAKS_MB", "512"))
+# Penghitung hit/miss dan waktu pakai (LRU) dikumpulkan di memori dan ditulis sekaligus setelah
+# sekian pembacaan atau sekian detik, agar cache hit tidak perlu transaksi tulis
+CACHE_FLUSH_JUMLAH = int(os.environ.get("CACHE_FLUSH_JUMLAH", "64"))
+CACHE_FLUSH_DETIK = float(os.environ.get("CACHE_FLUSH_DETIK", "5"))
+
+TINGKAT_CACHE = ("dokumen", "halaman_ocr", "halaman_ai")
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def hitung_sha256_file(path: str, ukuran_blok: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for blok in iter(lambda: f.read(ukuran_blok), b""):
+            h.update(blok)
+    return h.hexdigest()
+
+
+class CacheHasil:
+    """
+    Satu koneksi SQLite dibuka per operasi sehingga aman dipakai dari banyak thread dan
+    proses sekaligus (mode WAL). Nilai disimpan sebagai JSON.
+    Penghitung hit/miss juga disimpan di database agar mencakup proses worker (dengan jeda
+    hingga CACHE_FLUSH_JUMLAH/CACHE_FLUSH_DETIK; sisa yang belum ditulis saat worker berhenti
+    hilang, jadi angkanya perkiraan). Ukuran total entri disimpan di tabel meta dan diperbarui
+    dalam transaksi yang sama dengan simpan/buang, sehingga tidak perlu SUM atas seluruh tabel.
+    """
+
+    def __init__(self, path: Path = PATH_CACHE, maks_mb: float = CACHE_MAKS_MB):
+        self.path = Path(path)
+        self.maks_byte = int(maks_mb * 1024 * 1024)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._koneksi() as kon:
+            kon.execute("PRAGMA journal_mode=WAL")
+            kon.execute("""
+                CREATE TABLE IF NOT EXISTS entri (
+                    tingkat TEXT NOT NULL,
+                    kunci TEXT NOT NULL,
+                    nilai TEXT NOT NULL,
+                    ukuran INTEGER NOT NULL,
+                    terakhir_dipakai REAL NOT NULL,
+                    PRIMARY KEY (tingkat, kunci)
+                )
+            """)
+            kon.execute("CREATE INDEX IF NOT EXISTS idx_entri_lru ON entri (terakhir_dipakai)")
+            kon.execute("CREATE TABLE IF NOT EXISTS statistik (tingkat TEXT PRIMARY KEY, hit INTEGER NOT NULL, miss INTEGER NOT NULL)")
+            kon.executemany("INSERT OR IGNORE INTO statistik VALUES (?, 0, 0)", [(t,) for t in TINGKAT_CACHE])
+            kon.execute("CREATE TABLE IF NOT EXISTS meta (nama TEXT PRIMARY KEY, nilai INTEGER NOT NULL)")
+            # Database dari versi sebelum ada tabel meta: total dihitung sekali di sini
+            if kon.execute("SELECT 1 FROM meta WHERE nama = 'total_ukuran'").fetchone() is None:
+                kon.execute("INSERT INTO meta SELECT 'total_ukuran', COALESCE(SUM(ukuran), 0) FROM entri")
+        self._lock = threading.Lock()
+        self._statistik_tertunda: Dict[tuple, int] = {}
+        self._pakai_tertunda: Dict[tuple, float] = {}
+        self._jumlah_tertunda = 0
+        self._flush_terakhir = time.monotonic()
+
+    def _koneksi(self) -> sqlite3.Connection:
+        kon = sqlite3.connect(self.path, timeout=30)
+        kon.execute("PRAGMA synchronous=NORMAL")
+        return _KoneksiSekali(kon)
+
+    def ambil(self, tingkat: str, kunci: str) -> Optional[Any]:
+        try:
+            with self._koneksi() as kon:
+                baris = kon.execute("SELECT nilai FROM entri WHERE tingkat = ? AND kunci = ?", (tingkat, kunci)).fetchone()
+        except sqlite3.OperationalError as e:
+            print(f"[PERINGATAN] Cache {tingkat} tidak bisa dibaca, dianggap miss: {e}")
+            baris = None
+        self._catat_pemakaian(tingkat, kunci, baris is not None)
+        return json.loads(baris[0]) if baris else None
+
+    def _catat_pemakaian(self, tingkat: str, kunci: str, hit: bool):
+        with self._lock:
+            kolom = "hit" if hit else "miss"
+            self._statistik_tertunda[(tingkat, kolom)] = self._statistik_tertunda.get((tingkat, kolom), 0) + 1
+            if hit:
+                self._pakai_tertunda[(tingkat, kunci)] = time.time()
+            self._jumlah_tertunda += 1
+            perlu_flush = (
+                self._jumlah_tertunda >= CACHE_FLUSH_JUMLAH
+                or time.monotonic() - self._flush_terakhir >= CACHE_FLUSH_DETIK
+            )
+        if perlu_flush:
+            self.flush()
+
+    def flush(self):
+        """Menulis penghitung hit/miss dan waktu pakai yang masih tertunda dalam satu transaksi."""
+        with self._lock:
+            statistik, pakai = self._statistik_tertunda, self._pakai_tertunda
+            self._statistik_tertunda, self._pakai_tertunda, self._jumlah_tertunda = {}, {}, 0
+            self._flush_terakhir = time.monotonic()
+        if not statistik and not pakai:
+            return
+        try:
+            with self._koneksi() as kon:
+                for (tingkat, kolom), jumlah in statistik.items():
+                    kon.execute(f"UPDATE statistik SET {kolom} = {kolom} + ? WHERE tingkat = ?", (jumlah, tingkat))
+                kon.executemany(
+                    "UPDATE entri SET terakhir_dipakai = ? WHERE tingkat = ? AND kunci = ?",
+                    [(waktu, tingkat, kunci) for (tingkat, kunci), waktu in pakai.items()]
+                )
+        except sqlite3.OperationalError as e:
+            print(f"[PERINGATAN] Statistik/LRU cache tidak tersimpan: {e}")
+
+    def simpan(self, tingkat: str, kunci: str, nilai: Any):
+        teks = json.dumps(nilai, ensure_ascii=False)
+        ukuran = len(teks.encode("utf-8"))
+        try:
+            with self._koneksi() as kon:
+                # Kunci tulis diambil di awal agar ukuran lama yang dibaca tetap berlaku sampai commit
+                kon.execute("BEGIN IMMEDIATE")
+                lama = kon.execute("SELECT ukuran FROM entri WHERE tingkat = ? AND kunci = ?", (tingkat, kunci)).fetchone()
+                kon.execute("INSERT OR REPLACE INTO entri VALUES (?, ?, ?, ?, ?)", (tingkat, kunci, teks, ukuran, time.time()))
+                kon.execute(
+                    "UPDATE meta SET nilai = nilai + ? WHERE nama = 'total_ukuran'", (ukuran - (lama[0] if lama else 0),)
+                )
+                self._buang_lru(kon)
+        except sqlite3.OperationalError as e:
+            print(f"[PERINGATAN] Cache {tingkat} tidak bisa disimpan, dilewati: {e}")
+
+    def _buang_lru(self, kon: sqlite3.Connection):
+        total = kon.execute("SELECT nilai FROM meta WHERE nama = 'total_ukuran'").fetchone()[0]
+        if total <= self.maks_byte:
+            return
+        dibuang = []
+        for tingkat, kunci, ukuran in kon.execute("SELECT tingkat, kunci, ukuran FROM entri ORDER BY terakhir_dipakai"):
+            if total <= self.maks_byte:
+                break
+            dibuang.append((tingkat, kunci))
+            total -= ukuran
+        kon.executemany("DELETE FROM entri WHERE tingkat = ? AND kunci = ?", dibuang)
+        kon.execute("UPDATE meta SET nilai = ? WHERE nama = 'total_ukuran'", (total,))
+        print(f"[CACHE] {len(dibuang)} entri lama dibuang (batas {self.maks_byte // (1024 * 1024)} MB).")
+
+    def statistik(self) -> Dict[str, Any]:
+        self.flush()
+        with self._koneksi() as kon:
+            per_tingkat = {
+                tingkat: {"hit": hit, "miss": miss, "rasio_hit": hit / (hit + miss) if hit + miss else None}
+                for tingkat, hit, miss in kon.execute("SELECT tingkat, hit, miss FROM statistik")
+            }
+            for tingkat, jumlah, ukuran in kon.execute("SELECT tingkat, COUNT(*), SUM(ukuran) FROM entri GROUP BY tingkat"):
+                per_tingkat.setdefault(tingkat, {}).update({"jumlah_entri": jumlah, "ukuran_byte": ukuran})
+        return {"path": str(self.path), "maks_byte": self.maks_byte, "tingkat": per_tingkat}
+
+    # --- Pembungkus per tingkat ---
+
+    def ambil_dokumen(self, sha256_pdf: str, versi_model: str) -> Optional[dict]:
+        return self.ambil("dokumen", f"{sha256_pdf}:{versi_model}")
+
+    def simpan_dokumen(self, sha256_pdf: str, versi_model: str, hasil_ai: dict, ringkasan_ekstraksi: dict):
+        self.simpan("dokumen", f"{sha256_pdf}:{versi_model}", {"hasil_ai": hasil_ai, "ringkasan_ekstraksi": ringkasan_ekstraksi})
+
+    def ambil_ocr_halaman(self, hash_halaman: str) -> Optional[dict]:
+        return self.ambil("halaman_ocr", hash_halaman)
+
+    def simpan_ocr_halaman(self, hash_halaman: str, data_ocr: dict):
+        self.simpan("halaman_ocr", hash_halaman, data_ocr)
+
+    def ambil_ai_halaman(self, hash_halaman: str, versi_model: str) -> Optional[dict]:
+        return self.ambil("halaman_ai", f"{hash_halaman}:{versi_model}")
+
+    def simpan_ai_halaman(self, hash_halaman: str, versi_model: str, hasil: dict):
+        self.simpan("halaman_ai", f"{hash_halaman}:{versi_model}", hasil)
+
+
+class _KoneksiSekali:
+    """Context manager: commit (atau rollback) lalu menutup koneksi."""
+
+    def __init__(self, kon: sqlite3.Connection):
+        self.kon = kon
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.kon
+
+    def __exit__(self, jenis_error, *exc):
+        try:
+            if jenis_error is None:
+                self.kon.commit()
+            else:
+                self.kon.rollback()
+        finally:
+            self.kon.close()
+
+
+def get_cache_hasil() -> Optional[CacheHasil]:
+    """Getter singleton; None jika cache dimatikan (CACHE_AKTIF=0) atau gagal dibuka."""
+    global _CACHE, CACHE_AKTIF
+    if not CACHE_AKTIF:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                _CACHE = CacheHasil()
+            except sqlite3.Error as e:
+                print(f"[PERINGATAN] Cache hasil tidak bisa dibuka, cache dimatikan: {e}")
+                CACHE_AKTIF = False
+                return None
+        return _CACHE
@@ -0,0 +1,359 @@
+# backend/cek_benchmark.py
+# Benchmark per tahap di atas korpus laporan sintetis (BAUT/BACT) yang dibuat dengan PyMuPDF:
+# halaman teks digital, halaman hasil scan (gambar tanpa lapisan teks), dan lampiran foto
+# dengan overlay timestamp. Setiap tahap diukur terpisah (detik, halaman/detik, gambar/detik,
+# puncak RSS) dan hasilnya ditulis ke JSON agar bisa dibandingkan antar commit.
+# Mode model "stub" memakai LayoutLMv3/T5 kecil yang diinisialisasi acak, jadi bisa
+# dijalankan offline tanpa bobot dari Hub (angkanya mengukur pipeline, bukan model asli).
+#
+# Pemakaian:
+#   python cek_benchmark.py --output bench.json
+#   python cek_benchmark.py --dokumen 4 --halaman-digital 6 --halaman-scan 2 --foto 12 --output bench.json
+#   python cek_benchmark.py --output bench_baru.json --bandingkan bench_lama.json
+#   python cek_benchmark.py --model asli --output bench_asli.json
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import fitz
+import numpy as np
+
+from metrik_memori import PemantauRSSPuncak
+
+# --- Korpus sintetis ---
+
+_ISIAN_FIELD = {
+    "PROYEK": "PENGADAAN DAN PEMASANGAN FTTH {n}",
+    "KONTRAK": "K.TEL.{n:04d}/HK.810/2024",
+    "WITEL": "BANDUNG",
+    "DISTRICT": "DISTRICT {n}",
+    "LOKASI": "STO CIJAWURA ODP-{n:03d}",
+    "PELAKSANA": "PT MITRA SINTETIS {n}",
+    "NO_BAUT": "BAUT/{n:04d}/2024",
+    "TANGGAL": "12 Maret 2024",
+    "SP": "SP-{n:05d}",
+    "S_PERMOHONAN": "PERMOHONAN UJI TERIMA NO {n}",
+    "HARI": "Selasa",
+    "BULAN": "Maret",
+    "TAHUN": "2024",
+}
+_JUDUL = {"BAUT": "BERITA ACARA UJI TERIMA", "BACT": "BERITA ACARA COMMISSIONING TEST"}
+
+
+def _tulis_halaman_field(page: fitz.Page, tipe: str, n: int, rng: random.Random):
+    from validasi_konten import ATURAN_VALIDASI
+    page.insert_text((60, 70), _JUDUL[tipe], fontsize=16)
+    y = 110
+    for field in ATURAN_VALIDASI[tipe]["field_wajib"]:
+        label = field.replace("_", " ")
+        page.insert_text((60, y), f"{label:<14}: {_ISIAN_FIELD[field].format(n=n)}", fontsize=10)
+        y += 18
+    # Paragraf pengisi agar jumlah token per halaman mendekati laporan sebenarnya
+    for _ in range(rng.randint(15, 25)):
+        kalimat = " ".join(rng.choice(["pekerjaan", "telah", "diuji", "sesuai", "spesifikasi", "teknis", "kabel", "tiang", "jaringan", "optik", "hasil", "pengukuran"]) for _ in range(12))
+        page.insert_text((60, y), kalimat, fontsize=9)
+        y += 13
+        if y > 780:
+            break
+
+
+def _buat_foto(rng: random.Random, lebar: int = 800, tinggi: int = 600) -> bytes:
+    """Foto lapangan tiruan: gradien + bentuk acak, dengan pita timestamp di bawah."""
+    np_rng = np.random.default_rng(rng.randrange(1 << 30))
+    gradien = np.linspace(40, 200, lebar, dtype=np.float32)[None, :, None]
+    img = np.clip(gradien + np_rng.normal(0, 12, (tinggi, lebar, 3)), 0, 255).astype(np.uint8)
+    for _ in range(6):
+        pusat = (int(np_rng.integers(0, lebar)), int(np_rng.integers(0, tinggi)))
+        cv2.circle(img, pusat, int(np_rng.integers(20, 120)), [int(c) for c in np_rng.integers(0, 255, 3)], -1)
+    cv2.rectangle(img, (0, tinggi - 70), (lebar, tinggi), (20, 20, 20), -1)
+    stempel = f"2024-03-{rng.randint(1, 28):02d} {rng.randint(7, 17):02d}:{rng.randint(0, 59):02d}  -6.9{rng.randint(100, 999)} 107.6{rng.randint(100, 999)}"
+    cv2.putText(img, stempel, (15, tinggi - 25), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def buat_pdf_sintetis(path_pdf: str, tipe: str, n: int, halaman_digital: int, halaman_scan: int, jumlah_foto: int, seed: int = 0) -> dict:
+    """Membuat satu laporan sintetis; mengembalikan ringkasan isi untuk konfigurasi benchmark."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(max(1, halaman_digital)):
+        _tulis_halaman_field(doc.new_page(), tipe, n, rng)
+    # Halaman scan: halaman digital yang dirasterisasi lalu ditempel sebagai gambar
+    for _ in range(halaman_scan):
+        sumber = fitz.open()
+        _tulis_halaman_field(sumber.new_page(), tipe, n, rng)
+        pix = sumber[0].get_pixmap(dpi=100)
+        page = doc.new_page()
+        page.insert_image(page.rect, pixmap=pix)
+        sumber.close()
+    # Lampiran foto, dua foto per halaman; sebagian foto sengaja dipakai ulang dari laporan lain (seed sama)
+    for i in range(0, jumlah_foto, 2):
+        page = doc.new_page()
+        page.insert_text((60, 50), "LAMPIRAN FOTO", fontsize=12)
+        for j, kotak in enumerate((fitz.Rect(60, 70, 540, 430), fitz.Rect(60, 450, 540, 810))):
+            if i + j >= jumlah_foto:
+                break
+            seed_foto = (i + j) if (i + j) % 4 == 0 else seed * 1000 + i + j
+            page.insert_image(kotak, stream=_buat_foto(random.Random(seed_foto)))
+    doc.save(path_pdf, garbage=3, deflate=True)
+    total = len(doc)
+    doc.close()
+    return {"path": path_pdf, "tipe": tipe, "halaman": total, "foto": jumlah_foto}
+
+
+# --- Model stub ---
+
+def buat_model_stub(folder: str):
+    """
+    LayoutLMv3 dan T5 kecil dengan bobot acak dan tokenizer byte-level (tanpa unduhan),
+    disimpan dengan nama subfolder yang sama seperti repo model asli sehingga bisa dimuat
+    lewat AI_DIR_MODEL_LOKAL.
+    """
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from tokenizers.processors import TemplateProcessing
+    from transformers import (
+        LayoutLMv3Config, LayoutLMv3ForTokenClassification, LayoutLMv3TokenizerFast,
+        LayoutLMv3ImageProcessor, LayoutLMv3Processor, T5Config, T5ForConditionalGeneration,
+        PreTrainedTokenizerFast,
+    )
+    from konteks_extractor import SUBFOLDER_LM, SUBFOLDER_T5
+    from validasi_konten import LABEL_FIELD_VALIDASI
+
+    # Peta byte -> karakter GPT-2, agar setiap byte punya token sendiri tanpa file merges
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs, tambahan = bs[:], 0
+    for b in range(256):
+        if b not in bs:
+            bs.append(b)
+            cs.append(256 + tambahan)
+            tambahan += 1
+    karakter = [chr(c) for c in cs]
+
+    folder_lm = os.path.join(folder, SUBFOLDER_LM)
+    os.makedirs(folder_lm, exist_ok=True)
+    vocab_lm = {t: i for i, t in enumerate(["<s>", "<pad>", "</s>", "<unk>", "<mask>"] + karakter)}
+    processor = LayoutLMv3Processor(
+        image_processor=LayoutLMv3ImageProcessor(apply_ocr=False),
+        tokenizer=LayoutLMv3TokenizerFast(vocab=vocab_lm, merges=[]),
+    )
+    label = ["O"] + [f"{p}-{f}" for f in sorted(LABEL_FIELD_VALIDASI) for p in ("B", "I")]
+    config_lm = LayoutLMv3Config(
+        vocab_size=len(vocab_lm), hidden_size=48, coordinate_size=8, shape_size=8, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64, max_position_embeddings=514, input_size=224, patch_size=16,
+        num_labels=len(label), id2label=dict(enumerate(label)), label2id={l: i for i, l in enumerate(label)},
+        pad_token_id=1, bos_token_id=0, eos_token_id=2,
+    )
+    LayoutLMv3ForTokenClassification(config_lm).save_pretrained(folder_lm)
+    processor.save_pretrained(folder_lm)
+
+    folder_t5 = os.path.join(folder, SUBFOLDER_T5)
+    os.makedirs(folder_t5, exist_ok=True)
+    vocab_t5 = {t: i for i, t in enumerate(["<pad>", "</s>", "<unk>"] + karakter)}
+    tokenizer = Tokenizer(models.BPE(vocab=vocab_t5, merges=[], unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.post_processor = TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>").save_pretrained(folder_t5)
+    config_t5 = T5Config(vocab_size=len(vocab_t5), d_model=32, d_kv=8, d_ff=64, num_layers=2, num_heads=2,
+                         decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    T5ForConditionalGeneration(config_t5).save_pretrained(folder_t5)
+
+
+# --- Pengukuran ---
+
+def _ukur(hasil: dict, nama: str, fungsi, halaman: int = 0, gambar: int = 0):
+    """Menjalankan `fungsi()` sekali; mencatat durasi, throughput, dan puncak RSS tahap ini."""
+    print(f"[benchmark] {nama}...")
+    with PemantauRSSPuncak() as pantau:
+        mulai = time.perf_counter()
+        keluaran = fungsi()
+        detik = time.perf_counter() - mulai
+    memori = pantau.ke_dict()
+    hasil[nama] = {
+        "detik": round(detik, 4),
+        "halaman": halaman,
+        "gambar": gambar,
+        "halaman_per_detik": round(halaman / detik, 2) if halaman and detik else None,
+        "gambar_per_detik": round(gambar / detik, 2) if gambar and detik else None,
+        "rss_puncak_mb": memori["rss_puncak_mb"],
+        "metode_rss": memori["metode"],
+    }
+    return keluaran
+
+
+def _tesseract_tersedia() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def _commit_git() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def jalankan_benchmark(args) -> dict:
+    folder_kerja = Path(args.folder_kerja or tempfile.mkdtemp(prefix="benchmark_"))
+    folder_kerja.mkdir(parents=True, exist_ok=True)
+    # Cache hasil dimatikan agar setiap tahap benar-benar dikerjakan
+    os.environ["CACHE_AKTIF"] = "0"
+    if args.model == "stub":
+        # Harus diset sebelum konteks_extractor pertama kali diimpor (dibaca saat impor)
+        folder_model = folder_kerja / "model_stub"
+        os.environ["AI_DIR_MODEL_LOKAL"] = str(folder_model)
+        buat_model_stub(str(folder_model))
+
+    from ekstraksi_pdf import ekstrak_aset_terstruktur, simpan_hasil_ke_disk, ekstrak_dan_simpan_streaming
+
+    korpus = [
+        buat_pdf_sintetis(str(folder_kerja / f"laporan_{i}_{tipe}.pdf"), tipe, i, args.halaman_digital, args.halaman_scan, args.foto, seed=i)
+        for i, tipe in enumerate(["BAUT", "BACT"] * ((args.dokumen + 1) // 2))
+    ][:args.dokumen]
+    total_halaman = sum(d["halaman"] for d in korpus)
+    tahap = {}
+
+    # Tahap 1: ekstraksi
+    hasil_mentah = _ukur(tahap, "ekstrak_aset_terstruktur", lambda: [ekstrak_aset_terstruktur(d["path"]) for d in korpus], halaman=total_halaman)
+    total_gambar = sum(len(h["konten_gambar"]) for hasil in hasil_mentah for h in hasil["hasil_per_halaman"])
+    tahap["ekstrak_aset_terstruktur"]["gambar"] = total_gambar
+    tahap["ekstrak_aset_terstruktur"]["gambar_per_detik"] = round(total_gambar / tahap["ekstrak_aset_terstruktur"]["detik"], 2)
+    ringkasan = _ukur(tahap, "simpan_hasil_ke_disk", lambda: [
+        simpan_hasil_ke_disk(hasil, str(folder_kerja / "sesi_lama" / Path(d["path"]).stem)) for d, hasil in zip(korpus, hasil_mentah)
+    ], halaman=total_halaman, gambar=total_gambar)
+    del hasil_mentah
+    _ukur(tahap, "ekstrak_dan_simpan_streaming", lambda: [
+        ekstrak_dan_simpan_streaming(d["path"], str(folder_kerja / "sesi_streaming" / Path(d["path"]).stem)) for d in korpus
+    ], halaman=total_halaman, gambar=total_gambar)
+
+    # Tahap 3: validasi foto terhadap indeks master sementara (dua kali: dokumen baru, lalu semua sudah tercatat)
+    from indeks_master import IndeksMaster
+    from validasi_foto import proses_validasi_dengan_petunjuk
+    indeks = IndeksMaster(folder_kerja / "indeks_master.sqlite3")
+    path_sesi = folder_kerja / "sesi_lama"
+    daftar_gambar = [
+        [str(path_sesi / p["path"]) for h in r["hasil_per_halaman"] for p in h["path_gambar"] if not p.get("dipakai_ulang")]
+        for r in ringkasan
+    ]
+    jumlah_foto_unik = sum(len(g) for g in daftar_gambar)
+    for nama in ("proses_validasi_dengan_petunjuk", "proses_validasi_dengan_petunjuk_ulang"):
+        _ukur(tahap, nama, lambda: [
+            proses_validasi_dengan_petunjuk(g, indeks, Path(d["path"]).name, str(path_sesi)) for d, g in zip(korpus, daftar_gambar)
+        ], gambar=jumlah_foto_unik)
+
+    # Tahap 2: model
+    token_per_dokumen = []
+    if not args.tanpa_ai:
+        from artefak_halaman import ArtefakDokumen
+        from konteks_extractor import get_models, siapkan_input_layoutlmv3, analisis_batch_dengan_layoutlmv3, tata_ulang_batch_dengan_flan_t5
+        from validasi_konten import _gabungkan_token_menjadi_entitas
+        _ukur(tahap, "muat_model", get_models)
+
+        def _layoutlmv3():
+            semua = []
+            for d in korpus:
+                with ArtefakDokumen(d["path"]) as artefak:
+                    halaman_dokumen = []
+                    for n in range(1, len(artefak) + 1):
+                        try:
+                            input_halaman = siapkan_input_layoutlmv3(artefak.gambar(n), artefak.data_kata(n))
+                        except Exception:
+                            input_halaman = None  # halaman scan tanpa Tesseract
+                        analisis = analisis_batch_dengan_layoutlmv3([input_halaman])[0] if input_halaman else {"hasil_analisis_kontekstual": []}
+                        halaman_dokumen.append({"halaman": n, "analisis": analisis})
+                    semua.append(halaman_dokumen)
+            return semua
+        token_per_dokumen = _ukur(tahap, "layoutlmv3", _layoutlmv3, halaman=total_halaman)
+
+        entitas = [
+            _gabungkan_token_menjadi_entitas(h["analisis"]["hasil_analisis_kontekstual"])
+            for dokumen in token_per_dokumen for h in dokumen if h["analisis"]["hasil_analisis_kontekstual"]
+        ]
+        entitas = [e[:args.maks_entitas] for e in entitas if e]
+        _ukur(tahap, "flan_t5", lambda: tata_ulang_batch_dengan_flan_t5(entitas), halaman=len(entitas))
+
+    # Cek kelengkapan: di atas token LayoutLMv3 (atau token tiruan dari lapisan teks jika AI dilewati)
+    from validasi_konten import cek_kelengkapan_dokumen, ATURAN_VALIDASI
+    if not token_per_dokumen:
+        token_per_dokumen = []
+        for d in korpus:
+            with fitz.open(d["path"]) as doc:
+                token_per_dokumen.append([
+                    {"halaman": n, "analisis": {"hasil_analisis_kontekstual": [{"token": " " + w[4]} for w in page.get_text("words")]}}
+                    for n, page in enumerate(doc, 1)
+                ])
+    aturan = {"frasa_wajib": sorted({f for a in ATURAN_VALIDASI.values() for f in a.get("frasa_petunjuk_halaman", []) + a.get("frasa_kunci_identifikasi", [])})}
+    ulang = max(1, args.ulang_kelengkapan)
+    _ukur(tahap, "cek_kelengkapan_dokumen", lambda: [
+        cek_kelengkapan_dokumen(dokumen, aturan) for _ in range(ulang) for dokumen in token_per_dokumen
+    ], halaman=total_halaman * ulang)
+
+    return {
+        "commit": _commit_git(),
+        "waktu": datetime.now().isoformat(timespec="seconds"),
+        "konfigurasi": {
+            "model": args.model,
+            "dokumen": len(korpus),
+            "halaman_total": total_halaman,
+            "halaman_digital_per_dokumen": args.halaman_digital,
+            "halaman_scan_per_dokumen": args.halaman_scan,
+            "foto_per_dokumen": args.foto,
+            "tesseract_tersedia": _tesseract_tersedia(),
+            "python": sys.version.split()[0],
+            "jumlah_cpu": os.cpu_count(),
+        },
+        "tahap": tahap,
+    }
+
+
+def cetak_perbandingan(baru: dict, lama: dict):
+    print(f"\n{'tahap':<40} {'lama (dtk)':>11} {'baru (dtk)':>11} {'rasio':>7}")
+    for nama, hasil in baru["tahap"].items():
+        sebelum = lama.get("tahap", {}).get(nama)
+        if not sebelum:
+            print(f"{nama:<40} {'-':>11} {hasil['detik']:>11}")
+            continue
+        rasio = hasil["detik"] / sebelum["detik"] if sebelum["detik"] else float("nan")
+        print(f"{nama:<40} {sebelum['detik']:>11} {hasil['detik']:>11} {rasio:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per tahap pada korpus laporan sintetis.")
+    parser.add_argument("--dokumen", type=int, default=2, help="Jumlah PDF sintetis (bergantian BAUT/BACT)")
+    parser.add_argument("--halaman-digital", type=int, default=3)
+    parser.add_argument("--halaman-scan", type=int, default=1)
+    parser.add_argument("--foto", type=int, default=6, help="Jumlah foto lampiran per dokumen")
+    parser.add_argument("--model", choices=["stub", "asli"], default="stub", help="stub = model kecil acak, offline")
+    parser.add_argument("--tanpa-ai", action="store_true", help="Lewati tahap LayoutLMv3/FLAN-T5 (tanpa torch)")
+    parser.add_argument("--maks-entitas", type=int, default=40, help="Batas entitas per halaman untuk FLAN-T5")
+    parser.add_argument("--ulang-kelengkapan", type=int, default=50, help="Pengulangan cek_kelengkapan_dokumen agar waktunya terukur")
+    parser.add_argument("--folder-kerja", default=None, help="Folder untuk PDF/aset sementara (default: folder temp baru)")
+    parser.add_argument("--output", default=None, help="Simpan hasil sebagai JSON")
+    parser.add_argument("--bandingkan", default=None, help="JSON hasil benchmark sebelumnya untuk dibandingkan")
+    args = parser.parse_args()
+
+    laporan = jalankan_benchmark(args)
+    print(f"\n{'tahap':<40} {'detik':>9} {'hlm/dtk':>9} {'gbr/dtk':>9} {'RSS MB':>8}")
+    for nama, hasil in laporan["tahap"].items():
+        print(f"{nama:<40} {hasil['detik']:>9} {str(hasil['halaman_per_detik'] or '-'):>9} "
+              f"{str(hasil['gambar_per_detik'] or '-'):>9} {str(hasil['rss_puncak_mb']):>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(laporan, f, indent=2)
+    if args.bandingkan:
+        with open(args.bandingkan, "r", encoding="utf-8") as f:
+            cetak_perbandingan(laporan, json.load(f))
@@ -0,0 +1,128 @@
+# backend/cek_paritas_model.py
+# Membandingkan model fp32 dengan mode CPU teroptimasi (int8, opsional torch.compile)
+# pada sekumpulan PDF sampel: seberapa banyak label/field yang berubah vs seberapa cepat.
+#
+# Pemakaian:
+#   python cek_paritas_model.py data/sampel_pdf --maks-halaman 20 --output paritas.json
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import konteks_extractor
+from konteks_extractor import (
+    get_models,
+    optimalkan_model_cpu,
+    siapkan_input_layoutlmv3,
+    analisis_batch_dengan_layoutlmv3,
+    tata_ulang_dengan_flan_t5,
+)
+from validasi_konten import _gabungkan_token_menjadi_entitas
+from artefak_halaman import ArtefakDokumen
+
+
+def _jalankan_varian(input_halaman, model_mata, model_otak) -> dict:
+    mulai = time.perf_counter()
+    analisis = analisis_batch_dengan_layoutlmv3([input_halaman], model=model_mata)[0]
+    waktu_mata = time.perf_counter() - mulai
+
+    mulai = time.perf_counter()
+    entitas = _gabungkan_token_menjadi_entitas(analisis["hasil_analisis_kontekstual"])
+    data_terstruktur = tata_ulang_dengan_flan_t5(entitas, model=model_otak) if entitas else {}
+    waktu_otak = time.perf_counter() - mulai
+
+    return {
+        "label": [t["label"] for t in analisis["hasil_analisis_kontekstual"]],
+        "field": data_terstruktur if isinstance(data_terstruktur, dict) else {},
+        "waktu_layoutlmv3": waktu_mata,
+        "waktu_flan_t5": waktu_otak,
+    }
+
+
+def _bandingkan_field(field_a: dict, field_b: dict) -> dict:
+    kunci = sorted(k for k in set(field_a) | set(field_b) if k not in ("error", "raw_output"))
+    berbeda = [k for k in kunci if str(field_a.get(k, "")).strip() != str(field_b.get(k, "")).strip()]
+    return {"jumlah_field": len(kunci), "field_berbeda": berbeda}
+
+
+def cek_paritas(folder_pdf: str, maks_halaman: int = 20, kompilasi: bool = False) -> dict:
+    # Pastikan model global dimuat dalam fp32 sebagai acuan
+    konteks_extractor.AI_MODE_INFERENSI = "fp32"
+    (model_mata_fp32, _), (model_otak_fp32, _) = get_models()
+    print("Menyiapkan varian int8...")
+    model_mata_int8 = optimalkan_model_cpu(model_mata_fp32, kompilasi=kompilasi)
+    model_otak_int8 = optimalkan_model_cpu(model_otak_fp32)
+
+    total = {"fp32": {"waktu_layoutlmv3": 0.0, "waktu_flan_t5": 0.0}, "int8": {"waktu_layoutlmv3": 0.0, "waktu_flan_t5": 0.0}}
+    jumlah_token, token_sama, jumlah_field, field_sama = 0, 0, 0, 0
+    detail = []
+    halaman_diproses = 0
+
+    for path_pdf in sorted(Path(folder_pdf).rglob("*.pdf")):
+        with ArtefakDokumen(str(path_pdf)) as artefak:
+            for halaman_ke in range(1, len(artefak) + 1):
+                if halaman_diproses >= maks_halaman:
+                    break
+                input_halaman = siapkan_input_layoutlmv3(artefak.gambar(halaman_ke), artefak.data_ocr(halaman_ke))
+                if input_halaman is None:
+                    continue
+                halaman_diproses += 1
+                print(f"  - {path_pdf.name} halaman {halaman_ke}")
+
+                hasil_fp32 = _jalankan_varian(input_halaman, model_mata_fp32, model_otak_fp32)
+                hasil_int8 = _jalankan_varian(input_halaman, model_mata_int8, model_otak_int8)
+                for varian, hasil in (("fp32", hasil_fp32), ("int8", hasil_int8)):
+                    total[varian]["waktu_layoutlmv3"] += hasil["waktu_layoutlmv3"]
+                    total[varian]["waktu_flan_t5"] += hasil["waktu_flan_t5"]
+
+                sama = sum(a == b for a, b in zip(hasil_fp32["label"], hasil_int8["label"]))
+                jumlah_token += len(hasil_fp32["label"])
+                token_sama += sama
+                perbandingan = _bandingkan_field(hasil_fp32["field"], hasil_int8["field"])
+                jumlah_field += perbandingan["jumlah_field"]
+                field_sama += perbandingan["jumlah_field"] - len(perbandingan["field_berbeda"])
+                detail.append({
+                    "file": path_pdf.name,
+                    "halaman": halaman_ke,
+                    "kesesuaian_label": sama / len(hasil_fp32["label"]) if hasil_fp32["label"] else 1.0,
+                    "field_berbeda": {k: [hasil_fp32["field"].get(k), hasil_int8["field"].get(k)] for k in perbandingan["field_berbeda"]},
+                })
+
+    def _percepatan(bagian):
+        return total["fp32"][bagian] / total["int8"][bagian] if total["int8"][bagian] else None
+
+    return {
+        "mode_pembanding": "cpu_int8" + ("+torch_compile" if kompilasi else ""),
+        "jumlah_halaman": halaman_diproses,
+        "kesesuaian_label_layoutlmv3": token_sama / jumlah_token if jumlah_token else None,
+        "kesesuaian_field_flan_t5": field_sama / jumlah_field if jumlah_field else None,
+        "waktu_detik": total,
+        "percepatan": {"layoutlmv3": _percepatan("waktu_layoutlmv3"), "flan_t5": _percepatan("waktu_flan_t5")},
+        "detail_per_halaman": detail,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cek paritas akurasi model fp32 vs CPU int8.")
+    parser.add_argument("folder_pdf", help="Folder berisi PDF sampel")
+    parser.add_argument("--maks-halaman", type=int, default=20)
+    parser.add_argument("--kompilasi", action="store_true", help="Bandingkan juga dengan torch.compile pada LayoutLMv3")
+    parser.add_argument("--output", default="paritas_model.json")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder_pdf):
+        sys.exit(f"Folder tidak ditemukan: {args.folder_pdf}")
+
+    laporan = cek_paritas(args.folder_pdf, args.maks_halaman, args.kompilasi)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(laporan, f, indent=4, ensure_ascii=False)
+
+    print("\n" + "=" * 50)
+    print(f"Halaman dibandingkan     : {laporan['jumlah_halaman']}")
+    print(f"Kesesuaian label (Mata)  : {laporan['kesesuaian_label_layoutlmv3']}")
+    print(f"Kesesuaian field (Otak)  : {laporan['kesesuaian_field_flan_t5']}")
+    print(f"Percepatan               : {laporan['percepatan']}")
+    print(f"Laporan lengkap disimpan di {args.output}")
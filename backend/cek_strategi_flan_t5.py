@@ -0,0 +1,100 @@
+# backend/cek_strategi_flan_t5.py
+# Membandingkan strategi dekoding FLAN-T5 (beam4 / beam2 / greedy, dengan atau tanpa
+# batas token per entitas) pada PDF sampel: latensi, tingkat parse JSON, dan berapa
+# field yang berbeda dari hasil beam4.
+#
+# Pemakaian:
+#   python cek_strategi_flan_t5.py data/sampel_pdf --maks-halaman 20 --output strategi.json
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import konteks_extractor
+from konteks_extractor import (
+    get_models,
+    siapkan_input_layoutlmv3,
+    analisis_batch_dengan_layoutlmv3,
+    tata_ulang_batch_dengan_flan_t5,
+    STRATEGI_DEKODE_FLAN_T5,
+)
+from validasi_konten import _gabungkan_token_menjadi_entitas, entitas_punya_label_field
+from artefak_halaman import ArtefakDokumen
+
+
+def _kumpulkan_entitas(folder_pdf: str, maks_halaman: int) -> list:
+    """LayoutLMv3 dijalankan sekali; semua strategi memakai entitas yang sama."""
+    daftar_entitas = []
+    for path_pdf in sorted(Path(folder_pdf).rglob("*.pdf")):
+        with ArtefakDokumen(str(path_pdf)) as artefak:
+            for halaman_ke in range(1, len(artefak) + 1):
+                if len(daftar_entitas) >= maks_halaman:
+                    return daftar_entitas
+                input_halaman = siapkan_input_layoutlmv3(artefak.gambar(halaman_ke), artefak.data_ocr(halaman_ke))
+                if input_halaman is None:
+                    continue
+                analisis = analisis_batch_dengan_layoutlmv3([input_halaman])[0]
+                entitas = _gabungkan_token_menjadi_entitas(analisis["hasil_analisis_kontekstual"])
+                if entitas_punya_label_field(entitas):
+                    daftar_entitas.append(entitas)
+    return daftar_entitas
+
+
+def cek_strategi(folder_pdf: str, maks_halaman: int = 20, token_per_entitas: int = 16) -> dict:
+    get_models()
+    daftar_entitas = _kumpulkan_entitas(folder_pdf, maks_halaman)
+    print(f"{len(daftar_entitas)} halaman berisi field akan dibandingkan.")
+
+    varian = [(nama, 0) for nama in STRATEGI_DEKODE_FLAN_T5] + [(nama, token_per_entitas) for nama in STRATEGI_DEKODE_FLAN_T5]
+    token_per_entitas_awal = konteks_extractor.FLAN_T5_TOKEN_PER_ENTITAS
+    hasil_acuan, laporan = None, {}
+    try:
+        for strategi, batas in varian:
+            konteks_extractor.FLAN_T5_TOKEN_PER_ENTITAS = batas
+            nama_varian = strategi + (f"+batas{batas}" if batas else "")
+            print(f"  - {nama_varian}")
+            mulai = time.perf_counter()
+            hasil = tata_ulang_batch_dengan_flan_t5(daftar_entitas, strategi=strategi) if daftar_entitas else []
+            waktu = time.perf_counter() - mulai
+            if hasil_acuan is None:
+                hasil_acuan = hasil
+
+            field_berbeda = sum(
+                str(a.get(k, "")).strip() != str(b.get(k, "")).strip()
+                for a, b in zip(hasil_acuan, hasil)
+                for k in (set(a) | set(b)) - {"error", "raw_output"}
+            )
+            laporan[nama_varian] = {
+                "waktu_detik": waktu,
+                "waktu_per_halaman": waktu / len(hasil) if hasil else None,
+                "tingkat_parse_json": sum("error" not in h for h in hasil) / len(hasil) if hasil else None,
+                "field_berbeda_dari_acuan": field_berbeda,
+            }
+    finally:
+        konteks_extractor.FLAN_T5_TOKEN_PER_ENTITAS = token_per_entitas_awal
+
+    return {"jumlah_halaman": len(daftar_entitas), "acuan": varian[0][0], "strategi": laporan}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bandingkan strategi dekoding FLAN-T5.")
+    parser.add_argument("folder_pdf", help="Folder berisi PDF sampel")
+    parser.add_argument("--maks-halaman", type=int, default=20)
+    parser.add_argument("--token-per-entitas", type=int, default=16, help="Batas token baru per entitas untuk varian +batas")
+    parser.add_argument("--output", default="strategi_flan_t5.json")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder_pdf):
+        sys.exit(f"Folder tidak ditemukan: {args.folder_pdf}")
+
+    laporan = cek_strategi(args.folder_pdf, args.maks_halaman, args.token_per_entitas)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(laporan, f, indent=4, ensure_ascii=False)
+
+    print("\n" + "=" * 50)
+    for nama, hasil in laporan["strategi"].items():
+        print(f"{nama:<16} {hasil['waktu_detik']:.2f} s  parse JSON: {hasil['tingkat_parse_json']}  beda: {hasil['field_berbeda_dari_acuan']}")
+    print(f"Laporan lengkap disimpan di {args.output}")
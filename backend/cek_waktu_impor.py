@@ -0,0 +1,86 @@
+# backend/cek_waktu_impor.py
+# Mengukur biaya cold start: waktu impor dan RSS setelah impor untuk modul-modul utama,
+# masing-masing di proses Python baru (agar tidak ada modul yang sudah ter-cache), serta
+# apakah torch/transformers ikut terimpor.
+#
+# Pemakaian:
+#   python cek_waktu_impor.py --ulang 3
+#   python cek_waktu_impor.py main ekstraksi_pdf --output impor.json
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+MODUL_DEFAULT = ["main", "pipeline_proyek", "penjadwal_batch", "ekstraksi_pdf", "validasi_foto", "ai_engine"]
+
+# Dijalankan di proses anak; mencetak satu baris JSON
+_SKRIP_UKUR = """
+import json, sys, time
+mulai = time.perf_counter()
+import {modul}
+waktu = time.perf_counter() - mulai
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(b.split()[1]) for b in f if b.startswith("VmRSS:"))
+except (OSError, StopIteration):
+    pass
+print(json.dumps({{
+    "waktu_detik": waktu,
+    "rss_mb": round(rss_kb / 1024, 1) if rss_kb else None,
+    "torch_terimpor": "torch" in sys.modules,
+    "transformers_terimpor": "transformers" in sys.modules,
+}}))
+"""
+
+
+def ukur_impor(modul: str, ulang: int, env: dict) -> dict:
+    # Beberapa modul membuat folder data/ relatif terhadap cwd saat diimpor; proses anak
+    # dijalankan di folder sementara dan menemukan modul backend lewat PYTHONPATH
+    env = {**env, "PYTHONPATH": os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH")]))}
+    hasil = []
+    for _ in range(ulang):
+        with tempfile.TemporaryDirectory() as folder_kerja:
+            proses = subprocess.run(
+                [sys.executable, "-c", _SKRIP_UKUR.format(modul=modul)],
+                cwd=folder_kerja, env=env, capture_output=True, text=True,
+            )
+        if proses.returncode != 0:
+            return {"modul": modul, "error": proses.stderr.strip().splitlines()[-1] if proses.stderr.strip() else "gagal"}
+        hasil.append(json.loads(proses.stdout.strip().splitlines()[-1]))
+    return {
+        "modul": modul,
+        "waktu_median_detik": round(statistics.median(h["waktu_detik"] for h in hasil), 3),
+        "rss_median_mb": statistics.median(h["rss_mb"] for h in hasil) if all(h["rss_mb"] for h in hasil) else None,
+        "torch_terimpor": hasil[0]["torch_terimpor"],
+        "transformers_terimpor": hasil[0]["transformers_terimpor"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ukur waktu impor dan RSS modul backend.")
+    parser.add_argument("modul", nargs="*", default=MODUL_DEFAULT, help="Nama modul (default: modul utama)")
+    parser.add_argument("--ulang", type=int, default=3, help="Jumlah pengulangan per modul (diambil median)")
+    parser.add_argument("--mode-layanan", default=None, help="Nilai MODE_LAYANAN untuk proses anak (mis. ekstraksi_saja)")
+    parser.add_argument("--output", default=None, help="Simpan hasil sebagai JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.mode_layanan:
+        env["MODE_LAYANAN"] = args.mode_layanan
+
+    laporan = [ukur_impor(m, max(1, args.ulang), env) for m in args.modul]
+    print(f"{'modul':<20} {'waktu (dtk)':>12} {'RSS (MB)':>10}  torch")
+    for baris in laporan:
+        if "error" in baris:
+            print(f"{baris['modul']:<20} GAGAL: {baris['error']}")
+            continue
+        print(f"{baris['modul']:<20} {baris['waktu_median_detik']:>12} {str(baris['rss_median_mb']):>10}  {'ya' if baris['torch_terimpor'] else 'tidak'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(laporan, f, indent=2)
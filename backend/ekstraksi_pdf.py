@@ -3,102 +3,288 @@
 import os
 import json
 import uuid
+import hashlib
 import re
 from pathlib import Path
 from datetime import datetime
 import fitz
-from typing import Callable
+from typing import Callable, Iterator, List
+
+from metrik_memori import PemantauRSSPuncak
 
 try:
-    from PIL import Image
-    import pytesseract
+    from artefak_halaman import ArtefakDokumen
     OCR_AVAILABLE = True
 except ImportError:
     OCR_AVAILABLE = False
 
+# Gambar dengan luas (lebar x tinggi piksel) di bawah ini dianggap dekorasi (ikon, garis,
+# bullet) dan tidak diekstrak. Bisa ditimpa per panggilan lewat opsi_filter["luas_piksel_minimum"].
+GAMBAR_LUAS_PIKSEL_MINIMUM = int(os.environ.get("GAMBAR_LUAS_PIKSEL_MINIMUM", "2500"))
+
+def _registri_gambar_baru(simpan_data: bool = False) -> dict:
+    """
+    Registri per dokumen: xref -> metadata gambar, dan hash isi yang sudah pernah muncul.
+    Dengan `simpan_data` (jalur in-memory), byte kemunculan pertama juga disimpan per hash isi
+    agar kemunculan berikutnya bisa menunjuk ke objek bytes yang sama.
+    """
+    return {"xref": {}, "kunci": set(), "data": {} if simpan_data else None, "difilter_kecil": 0}
+
+def _iter_gambar_halaman(doc: fitz.Document, image_list: list, registri: dict, luas_minimum: int) -> Iterator[dict]:
+    """
+    Gambar satu halaman di-decode satu per satu, hanya saat dibutuhkan. Logo, kop surat,
+    dan tanda tangan yang sama di setiap halaman hanya di-decode sekali (xref yang sama)
+    dan byte-nya hanya dikirim sekali (hash isi yang sama meski xref berbeda); kemunculan
+    berikutnya membawa "ulang": True. "data"-nya None, kecuali registri dibuat dengan
+    simpan_data=True: maka "data" adalah objek bytes kemunculan pertama (tanpa salinan).
+    """
+    data_per_kunci = registri["data"]
+    for img_info in image_list:
+        xref, lebar, tinggi = img_info[0], img_info[2], img_info[3]
+        if lebar * tinggi < luas_minimum:
+            registri["difilter_kecil"] += 1
+            continue
+        if xref in registri["xref"]:
+            meta = registri["xref"][xref]
+            yield { **meta, "data": data_per_kunci.get(meta["kunci"]) if data_per_kunci is not None else None, "ulang": True }
+            continue
+        base_image = doc.extract_image(xref)
+        meta = { "ext": base_image["ext"], "width": base_image["width"], "height": base_image["height"], "kunci": hashlib.sha256(base_image["image"]).hexdigest() }
+        registri["xref"][xref] = meta
+        ulang = meta["kunci"] in registri["kunci"]
+        registri["kunci"].add(meta["kunci"])
+        if data_per_kunci is not None:
+            data = data_per_kunci.setdefault(meta["kunci"], base_image["image"])
+        else:
+            data = None if ulang else base_image["image"]
+        yield { **meta, "data": data, "ulang": ulang }
+
+def iter_halaman_terstruktur(
+    doc: fitz.Document,
+    progress_callback: Callable[[int, int], None] = None,
+    artefak: "ArtefakDokumen" = None,
+    registri_gambar: dict = None,
+    rentang_halaman: range = None,
+    **opsi_filter
+) -> Iterator[dict]:
+    """
+    Menghasilkan data satu halaman setiap kali (teks + metode ekstraksi). "konten_gambar"
+    berupa iterator yang men-decode gambar satu per satu, sehingga pemanggil bisa
+    langsung menulis setiap gambar ke disk tanpa menahan seluruh dokumen di memori.
+    `rentang_halaman` (indeks 0-based) membatasi halaman yang diproses, untuk ekstraksi paralel.
+    `opsi_filter`: luas_piksel_minimum (default GAMBAR_LUAS_PIKSEL_MINIMUM).
+    """
+    registri_gambar = registri_gambar if registri_gambar is not None else _registri_gambar_baru()
+    luas_minimum = int(opsi_filter.get("luas_piksel_minimum", GAMBAR_LUAS_PIKSEL_MINIMUM))
+    daftar_halaman = rentang_halaman if rentang_halaman is not None else range(len(doc))
+    for posisi, page_num in enumerate(daftar_halaman, 1):
+        if progress_callback:
+            progress_callback(posisi, len(daftar_halaman))
+
+        page = doc.load_page(page_num)
+        halaman_ke = page_num + 1
+        
+        # Langkah 1: Selalu coba ekstrak teks digital dan objek gambar
+        page_text = page.get_text("text")
+        image_list = page.get_images(full=True)
+        
+        metode_ekstraksi = "Bawaan"
+        
+        # Langkah 2: Periksa apakah teks kosong, jika ya, lakukan OCR
+        if not page_text.strip() and OCR_AVAILABLE and artefak is not None:
+            metode_ekstraksi = "OCR"
+            try:
+                page_text = artefak.teks_ocr(halaman_ke)
+            except Exception:
+                metode_ekstraksi = "Gagal (Error OCR)"
+
+        yield { "halaman": halaman_ke, "konten_teks": page_text, "konten_gambar": _iter_gambar_halaman(doc, image_list, registri_gambar, luas_minimum), "metode_ekstraksi": metode_ekstraksi }
+
+def hitung_halaman_pdf(path_pdf: str) -> int:
+    with fitz.open(path_pdf) as doc:
+        return len(doc)
+
+def bagi_rentang_halaman(total_halaman: int, jumlah_worker: int, halaman_min_per_rentang: int = 1) -> List[range]:
+    """Membagi halaman menjadi paling banyak `jumlah_worker` rentang berurutan yang hampir sama panjang."""
+    jumlah = max(1, min(jumlah_worker, total_halaman // max(1, halaman_min_per_rentang)))
+    batas = [round(i * total_halaman / jumlah) for i in range(jumlah + 1)]
+    return [range(batas[i], batas[i + 1]) for i in range(jumlah) if batas[i] < batas[i + 1]]
+
+def _buat_id_proses() -> str:
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    unique_id = str(uuid.uuid4()).split('-')[0]
+    return f"{timestamp}-{unique_id}"
+
 def ekstrak_aset_terstruktur(
     path_pdf: str, 
     progress_callback: Callable[[int, int], None] = None,
+    artefak: "ArtefakDokumen" = None,
+    rentang_halaman: range = None,
     **opsi_filter
 ) -> dict | None:
+    """
+    Mengekstrak teks dan gambar per halaman ke memori (semua byte gambar ikut disimpan;
+    gambar yang berulang membawa "ulang": True dan "data" yang menunjuk ke bytes yang sama).
+    Jika `artefak` diberikan, render dan OCR halaman dipakai bersama dengan pemanggil
+    (mis. diteruskan ke pipeline AI). Untuk dokumen besar gunakan ekstrak_dan_simpan_streaming;
+    ekstraksi paralel per rentang halaman berjalan lewat pool CPU bersama (tahap_ekstraksi).
+    """
+
+    artefak_milik_sendiri = artefak is None and OCR_AVAILABLE
     try:
-        doc = fitz.open(path_pdf)
-        total_halaman = len(doc)
-        
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        unique_id = str(uuid.uuid4()).split('-')[0]
-        hasil_in_memory = { "id_proses": f"{timestamp}-{unique_id}", "sumber_pdf": os.path.basename(path_pdf), "hasil_per_halaman": [] }
+        if artefak_milik_sendiri:
+            artefak = ArtefakDokumen(path_pdf)
+        doc = artefak.doc if artefak is not None else fitz.open(path_pdf)
         
-        for page_num in range(total_halaman):
-            if progress_callback:
-                progress_callback(page_num + 1, total_halaman)
-
-            page = doc.load_page(page_num)
-            halaman_ke = page_num + 1
-            
-            # Langkah 1: Selalu coba ekstrak teks digital dan objek gambar
-            page_text = page.get_text("text")
-            image_list = page.get_images(full=True)
-            
-            metode_ekstraksi = "Bawaan"
-            
-            # Langkah 2: Periksa apakah teks kosong, jika ya, lakukan OCR
-            if not page_text.strip() and OCR_AVAILABLE:
-                metode_ekstraksi = "OCR"
-                try:
-                    pix = page.get_pixmap(dpi=200)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    page_text = pytesseract.image_to_string(img, lang='ind+eng')
-                except Exception:
-                    metode_ekstraksi = "Gagal (Error OCR)"
-
-            hasil_halaman = { "halaman": halaman_ke, "konten_teks": page_text, "konten_gambar": [], "metode_ekstraksi": metode_ekstraksi }
-
-            # Proses objek gambar yang sudah diekstrak
-            for img_info in image_list:
-                xref = img_info[0]
-                base_image = doc.extract_image(xref)
-                hasil_halaman["konten_gambar"].append({ "ext": base_image["ext"], "data": base_image["image"], "width": base_image["width"], "height": base_image["height"] })
-            
+        hasil_in_memory = { "id_proses": _buat_id_proses(), "sumber_pdf": os.path.basename(path_pdf), "hasil_per_halaman": [] }
+        registri = _registri_gambar_baru(simpan_data=True)
+        for hasil_halaman in iter_halaman_terstruktur(doc, progress_callback, artefak, registri, rentang_halaman, **opsi_filter):
+            hasil_halaman["konten_gambar"] = list(hasil_halaman["konten_gambar"])
             hasil_in_memory["hasil_per_halaman"].append(hasil_halaman)
+        hasil_in_memory["gambar_difilter_kecil"] = registri["difilter_kecil"]
         
-        doc.close()
         return hasil_in_memory
         
     except Exception as e:
         print(f"\n[ERROR] Terjadi error saat ekstraksi: {e}")
         return None
+    finally:
+        if artefak_milik_sendiri and artefak is not None:
+            artefak.tutup()
+        elif artefak is None and 'doc' in locals():
+            doc.close()
 
-def simpan_hasil_ke_disk(data_ekstraksi: dict, path_proyek: str) -> dict:
-    id_proses_file = data_ekstraksi["id_proses"]
-    os.makedirs(path_proyek, exist_ok=True)
+def simpan_halaman_ke_disk(data_halaman: dict, path_proyek: str, aset_tersimpan: dict = None) -> dict:
+    """
+    Menulis teks dan gambar satu halaman; "konten_gambar" boleh list atau iterator.
+    `aset_tersimpan` (hash isi -> entri path) dibagi antar halaman satu dokumen: gambar yang
+    sudah pernah ditulis tidak ditulis lagi, entri halaman ini menunjuk ke file yang sama.
+    """
+    aset_tersimpan = aset_tersimpan if aset_tersimpan is not None else {}
+    halaman_ke = data_halaman["halaman"]
+    folder_halaman = os.path.join(path_proyek, f"halaman_{halaman_ke}")
+    os.makedirs(folder_halaman, exist_ok=True)
     
-    hasil_dengan_path = { "id_proses": id_proses_file, "sumber_pdf": data_ekstraksi["sumber_pdf"], "hasil_per_halaman": [] }
+    path_halaman = { "halaman": halaman_ke, "path_teks": None, "path_gambar": [], "metode_ekstraksi": data_halaman["metode_ekstraksi"], "jumlah_gambar": 0 }
     
-    for data_halaman in data_ekstraksi["hasil_per_halaman"]:
-        halaman_ke = data_halaman["halaman"]
-        folder_halaman = os.path.join(path_proyek, f"halaman_{halaman_ke}")
-        os.makedirs(folder_halaman, exist_ok=True)
-        
-        path_halaman = { "halaman": halaman_ke, "path_teks": None, "path_gambar": [], "metode_ekstraksi": data_halaman["metode_ekstraksi"], "jumlah_gambar": len(data_halaman["konten_gambar"]) }
-        
-        if data_halaman["konten_teks"].strip():
-            path_teks_output = os.path.join(folder_halaman, "teks.txt")
-            with open(path_teks_output, "w", encoding="utf-8") as f:
-                f.write(data_halaman["konten_teks"])
-            path_halaman["path_teks"] = os.path.relpath(path_teks_output, Path(path_proyek).parent).replace("\\", "/")
-        
-        for idx, gambar in enumerate(data_halaman["konten_gambar"]):
-            nama_file_gambar = f"img_{idx}.{gambar['ext']}"
-            path_gambar_output = os.path.join(folder_halaman, nama_file_gambar)
-            with open(path_gambar_output, "wb") as f:
-                f.write(gambar['data'])
-            path_halaman["path_gambar"].append({ "path": os.path.relpath(path_gambar_output, Path(path_proyek).parent).replace("\\", "/"), "width": gambar["width"], "height": gambar["height"], "format": gambar["ext"] })
-        
-        hasil_dengan_path["hasil_per_halaman"].append(path_halaman)
+    if data_halaman["konten_teks"].strip():
+        path_teks_output = os.path.join(folder_halaman, "teks.txt")
+        with open(path_teks_output, "w", encoding="utf-8") as f:
+            f.write(data_halaman["konten_teks"])
+        path_halaman["path_teks"] = os.path.relpath(path_teks_output, Path(path_proyek).parent).replace("\\", "/")
+    
+    for idx, gambar in enumerate(data_halaman["konten_gambar"]):
+        kunci = gambar.get("kunci")
+        path_halaman["jumlah_gambar"] += 1
+        if kunci in aset_tersimpan:
+            path_halaman["path_gambar"].append({ **aset_tersimpan[kunci], "dipakai_ulang": True })
+            continue
+        nama_file_gambar = f"img_{idx}.{gambar['ext']}"
+        path_gambar_output = os.path.join(folder_halaman, nama_file_gambar)
+        with open(path_gambar_output, "wb") as f:
+            f.write(gambar['data'])
+        entri = { "path": os.path.relpath(path_gambar_output, Path(path_proyek).parent).replace("\\", "/"), "width": gambar["width"], "height": gambar["height"], "format": gambar["ext"], "sha256": kunci }
+        if kunci:
+            aset_tersimpan[kunci] = entri
+        path_halaman["path_gambar"].append(entri)
     
+    return path_halaman
+
+def _statistik_gambar(hasil_per_halaman: list, aset_tersimpan: dict, difilter_kecil: int) -> dict:
+    return {
+        "kemunculan": sum(h["jumlah_gambar"] for h in hasil_per_halaman),
+        "unik": len(aset_tersimpan),
+        "difilter_kecil": difilter_kecil,
+    }
+
+def _tulis_summary(hasil_dengan_path: dict, path_proyek: str):
     path_file_summary = os.path.join(path_proyek, "_summary.json")
     with open(path_file_summary, "w", encoding="utf-8") as f:
         json.dump(hasil_dengan_path, f, indent=4)
-        
-    return hasil_dengan_path
\ No newline at end of file
+
+def simpan_hasil_ke_disk(data_ekstraksi: dict, path_proyek: str) -> dict:
+    os.makedirs(path_proyek, exist_ok=True)
+    hasil_dengan_path = { "id_proses": data_ekstraksi["id_proses"], "sumber_pdf": data_ekstraksi["sumber_pdf"], "hasil_per_halaman": [] }
+    aset_tersimpan = {}
+    for data_halaman in data_ekstraksi["hasil_per_halaman"]:
+        hasil_dengan_path["hasil_per_halaman"].append(simpan_halaman_ke_disk(data_halaman, path_proyek, aset_tersimpan))
+    hasil_dengan_path["statistik_gambar"] = _statistik_gambar(hasil_dengan_path["hasil_per_halaman"], aset_tersimpan, data_ekstraksi.get("gambar_difilter_kecil", 0))
+    _tulis_summary(hasil_dengan_path, path_proyek)
+    return hasil_dengan_path
+
+def ekstrak_dan_simpan_streaming(
+    path_pdf: str,
+    path_proyek: str,
+    progress_callback: Callable[[int, int], None] = None,
+    artefak: "ArtefakDokumen" = None,
+    rentang_halaman: range = None,
+    **opsi_filter
+) -> dict:
+    """
+    Setara dengan ekstrak_aset_terstruktur + simpan_hasil_ke_disk, tetapi setiap halaman
+    langsung ditulis dan setiap gambar langsung disimpan begitu di-decode. Memori puncak
+    mengikuti gambar terbesar, bukan seluruh dokumen. Hasilnya ringkasan path yang sama,
+    ditambah "metrik_memori" (puncak RSS proses selama ekstraksi dokumen ini).
+    Dengan `rentang_halaman`, hanya sebagian halaman yang diproses dan _summary.json tidak
+    ditulis; hasil beberapa rentang disatukan dengan gabungkan_hasil_rentang.
+    """
+    artefak_milik_sendiri = artefak is None and OCR_AVAILABLE
+    with PemantauRSSPuncak() as pantau:
+        try:
+            if artefak_milik_sendiri:
+                artefak = ArtefakDokumen(path_pdf)
+            doc = artefak.doc if artefak is not None else fitz.open(path_pdf)
+            os.makedirs(path_proyek, exist_ok=True)
+
+            hasil_dengan_path = { "id_proses": _buat_id_proses(), "sumber_pdf": os.path.basename(path_pdf), "hasil_per_halaman": [] }
+            registri, aset_tersimpan = _registri_gambar_baru(), {}
+            for data_halaman in iter_halaman_terstruktur(doc, progress_callback, artefak, registri, rentang_halaman, **opsi_filter):
+                hasil_dengan_path["hasil_per_halaman"].append(simpan_halaman_ke_disk(data_halaman, path_proyek, aset_tersimpan))
+                # MuPDF menyimpan objek yang sudah di-decode di cache global (bisa ratusan MB);
+                # kosongkan setelah setiap halaman agar tidak menumpuk sepanjang dokumen.
+                fitz.TOOLS.store_shrink(100)
+        finally:
+            if artefak_milik_sendiri and artefak is not None:
+                artefak.tutup()
+            elif artefak is None and 'doc' in locals():
+                doc.close()
+
+    hasil_dengan_path["statistik_gambar"] = _statistik_gambar(hasil_dengan_path["hasil_per_halaman"], aset_tersimpan, registri["difilter_kecil"])
+    hasil_dengan_path["metrik_memori"] = pantau.ke_dict()
+    if rentang_halaman is None:
+        _tulis_summary(hasil_dengan_path, path_proyek)
+    return hasil_dengan_path
+
+def gabungkan_hasil_rentang(daftar_hasil: List[dict], path_proyek: str) -> dict:
+    """
+    Menyatukan hasil ekstrak_dan_simpan_streaming per rentang halaman (urut) menjadi satu
+    ringkasan dokumen. Gambar yang sama yang ditulis oleh dua rentang berbeda dijadikan satu:
+    salinan kedua dihapus dan entrinya menunjuk ke file pertama.
+    """
+    hasil_dengan_path = { "id_proses": daftar_hasil[0]["id_proses"], "sumber_pdf": daftar_hasil[0]["sumber_pdf"], "hasil_per_halaman": [] }
+    aset_tersimpan, difilter_kecil = {}, 0
+    folder_sesi = Path(path_proyek).parent
+    for hasil_rentang in daftar_hasil:
+        difilter_kecil += hasil_rentang["statistik_gambar"]["difilter_kecil"]
+        for path_halaman in hasil_rentang["hasil_per_halaman"]:
+            for i, entri in enumerate(path_halaman["path_gambar"]):
+                kunci = entri.get("sha256")
+                if kunci is None:
+                    continue
+                if kunci not in aset_tersimpan:
+                    aset_tersimpan[kunci] = entri
+                elif aset_tersimpan[kunci]["path"] != entri["path"]:
+                    if not entri.get("dipakai_ulang"):
+                        (folder_sesi / entri["path"]).unlink(missing_ok=True)
+                    path_halaman["path_gambar"][i] = { **aset_tersimpan[kunci], "dipakai_ulang": True }
+            hasil_dengan_path["hasil_per_halaman"].append(path_halaman)
+
+    hasil_dengan_path["statistik_gambar"] = _statistik_gambar(hasil_dengan_path["hasil_per_halaman"], aset_tersimpan, difilter_kecil)
+    metrik = [h["metrik_memori"] for h in daftar_hasil]
+    hasil_dengan_path["metrik_memori"] = {
+        **metrik[0],
+        "rss_puncak_mb": max((m["rss_puncak_mb"] for m in metrik if m["rss_puncak_mb"] is not None), default=None),
+        "pid": [m["pid"] for m in metrik],
+    }
+    _tulis_summary(hasil_dengan_path, path_proyek)
+    return hasil_dengan_path
@@ -0,0 +1,126 @@
+# backend/executor_ai.py
+# Executor inferensi in-process: menggantikan panggilan HTTP ke /internal/run_ai.
+# Modul ini satu-satunya pintu ke stack ML: ai_engine/konteks_extractor (torch, transformers)
+# baru diimpor saat pekerjaan AI pertama dijalankan atau model dimuat, sehingga proses yang
+# hanya melayani ekstraksi/validasi foto tidak pernah memuat torch.
+
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrik_layanan import DURASI_TAHAP
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# Jumlah pekerjaan AI yang boleh berjalan bersamaan. Model dimuat sekali dan dipakai
+# bersama oleh semua thread, jadi menaikkan angka ini tidak menggandakan memori model.
+AI_JUMLAH_WORKER = int(os.environ.get("AI_JUMLAH_WORKER", "1"))
+# Jumlah pekerjaan yang boleh menunggu di antrian di luar yang sedang berjalan.
+AI_MAKS_ANTRIAN = int(os.environ.get("AI_MAKS_ANTRIAN", "16"))
+
+
+class AntrianAIPenuhError(RuntimeError):
+    """Dilempar saat antrian executor AI sudah penuh dan pekerjaan baru ditolak."""
+
+
+def _jalankan_ai(path_pdf_str: str, nama_file_asli: str, progress_callback=None, data_ocr=None) -> dict:
+    from ai_engine import run_ai_pipeline
+    with DURASI_TAHAP.waktu(tahap="run_ai_pipeline"):
+        return run_ai_pipeline(path_pdf_str, nama_file_asli, progress_callback, data_ocr)
+
+
+def muat_model_ai():
+    """Memuat dan memanaskan model (dipanggil dari lifespan aplikasi)."""
+    from konteks_extractor import muat_dan_panaskan_model
+    muat_dan_panaskan_model()
+
+
+def status_model_ai() -> dict:
+    """Status model untuk /ready tanpa memicu impor torch jika stack ML belum pernah dimuat."""
+    konteks_extractor = sys.modules.get("konteks_extractor")
+    # Modul bisa sudah terdaftar tetapi masih diimpor oleh thread pemuat
+    status_model = getattr(konteks_extractor, "status_model", None)
+    if status_model is None:
+        status = "belum_dimuat" if konteks_extractor is None else "memuat"
+        return {"status": status, "waktu_muat_detik": None, "waktu_pemanasan_detik": None, "siap_pada": None, "error": None}
+    return status_model()
+
+
+def kedalaman_antrian_ai() -> dict:
+    """Pekerjaan di executor AI (berjalan + menunggu) dan halaman yang menunggu di batcher LayoutLMv3."""
+    konteks_extractor = sys.modules.get("konteks_extractor")
+    batcher = getattr(konteks_extractor, "_BATCHER_MATA", None)
+    return {
+        ("executor",): _EXECUTOR.jumlah_dalam_antrian if _EXECUTOR is not None else 0,
+        ("batch_layoutlmv3",): batcher.jumlah_menunggu if batcher is not None else 0,
+    }
+
+
+def versi_model_ai() -> str:
+    from konteks_extractor import versi_model
+    return versi_model()
+
+
+class ExecutorInferensi:
+    """
+    Pool thread terbatas yang menjalankan `run_ai_pipeline` di luar event loop.
+    Setiap pekerjaan mengembalikan `concurrent.futures.Future`.
+    """
+
+    def __init__(self, jumlah_worker: int = AI_JUMLAH_WORKER, maks_antrian: int = AI_MAKS_ANTRIAN):
+        self.jumlah_worker = max(1, jumlah_worker)
+        self.maks_antrian = max(0, maks_antrian)
+        self._pool = ThreadPoolExecutor(max_workers=self.jumlah_worker, thread_name_prefix="ai-worker")
+        # Slot = pekerjaan yang sedang berjalan + yang sedang menunggu
+        self._slot = threading.BoundedSemaphore(self.jumlah_worker + self.maks_antrian)
+        self._lock = threading.Lock()
+        self._jumlah_aktif = 0
+
+    def submit(self, path_pdf_str: str, nama_file_asli: str, progress_callback=None, data_ocr=None) -> Future:
+        if not self._slot.acquire(blocking=False):
+            raise AntrianAIPenuhError(
+                f"Antrian AI penuh ({self.jumlah_worker} berjalan + {self.maks_antrian} menunggu)."
+            )
+        with self._lock:
+            self._jumlah_aktif += 1
+        try:
+            future = self._pool.submit(_jalankan_ai, path_pdf_str, nama_file_asli, progress_callback, data_ocr)
+        except Exception:
+            self._selesai(None)
+            raise
+        future.add_done_callback(self._selesai)
+        return future
+
+    def _selesai(self, _future):
+        with self._lock:
+            self._jumlah_aktif -= 1
+        self._slot.release()
+
+    @property
+    def jumlah_dalam_antrian(self) -> int:
+        """Jumlah pekerjaan yang sedang berjalan maupun menunggu."""
+        with self._lock:
+            return self._jumlah_aktif
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def get_executor_ai() -> ExecutorInferensi:
+    """Getter singleton untuk executor AI (dibuat saat pertama kali dibutuhkan)."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            print(f"--- Executor AI dibuat: {AI_JUMLAH_WORKER} worker, antrian maks {AI_MAKS_ANTRIAN} ---")
+            _EXECUTOR = ExecutorInferensi()
+        return _EXECUTOR
+
+def shutdown_executor_ai():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False)
+            _EXECUTOR = None
@@ -0,0 +1,74 @@
+# backend/hash_persepsi.py
+# Hash perseptual 64-bit untuk foto lapangan: pHash (DCT) dan dHash (gradien).
+# Salinan yang dikompres ulang, di-resize, atau di-screenshot ulang menghasilkan hash
+# yang berbeda hanya beberapa bit, sehingga kemiripan diukur dengan jarak Hamming.
+
+from itertools import combinations
+from typing import Iterator, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+JUMLAH_BIT = 64
+# Hash dipecah menjadi 4 potongan 16-bit untuk pencarian multi-index (lihat indeks_master)
+JUMLAH_POTONGAN = 4
+BIT_PER_POTONGAN = JUMLAH_BIT // JUMLAH_POTONGAN
+
+
+def _bit_ke_int(bit: np.ndarray) -> int:
+    nilai = 0
+    for b in bit.flatten():
+        nilai = (nilai << 1) | int(b)
+    return nilai
+
+
+def phash(gray: np.ndarray) -> int:
+    """pHash: tanda koefisien DCT frekuensi rendah 8x8 terhadap mediannya."""
+    kecil = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(kecil)[:8, :8]
+    # Koefisien DC (kecerahan rata-rata) tidak ikut menentukan median
+    median = np.median(dct.flatten()[1:])
+    return _bit_ke_int(dct > median)
+
+
+def dhash(gray: np.ndarray) -> int:
+    """dHash: apakah setiap piksel lebih terang dari tetangga kanannya (grid 9x8)."""
+    kecil = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _bit_ke_int(kecil[:, 1:] > kecil[:, :-1])
+
+
+def hitung_hash_gambar(path_gambar: str) -> Tuple[int, int]:
+    """Mengembalikan (phash, dhash) sebagai integer tak bertanda 64-bit."""
+    with Image.open(path_gambar) as img:
+        gray = np.asarray(img.convert("L"))
+    return phash(gray), dhash(gray)
+
+
+def jarak_hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def potong_hash(nilai: int) -> List[int]:
+    """Memecah hash 64-bit menjadi JUMLAH_POTONGAN potongan (dari bit paling tinggi)."""
+    topeng = (1 << BIT_PER_POTONGAN) - 1
+    return [(nilai >> (BIT_PER_POTONGAN * (JUMLAH_POTONGAN - 1 - i))) & topeng for i in range(JUMLAH_POTONGAN)]
+
+
+def tetangga_potongan(potongan: int, radius: int) -> Iterator[int]:
+    """Semua nilai potongan yang berjarak Hamming <= radius dari `potongan`."""
+    for r in range(radius + 1):
+        for posisi in combinations(range(BIT_PER_POTONGAN), r):
+            nilai = potongan
+            for p in posisi:
+                nilai ^= 1 << p
+            yield nilai
+
+
+def ke_sqlite(nilai: int) -> int:
+    """SQLite INTEGER bertanda 64-bit; hash disimpan sebagai padanan bertandanya."""
+    return nilai - (1 << JUMLAH_BIT) if nilai >= 1 << (JUMLAH_BIT - 1) else nilai
+
+
+def dari_sqlite(nilai: int) -> int:
+    return nilai + (1 << JUMLAH_BIT) if nilai < 0 else nilai
@@ -0,0 +1,322 @@
+# backend/indeks_master.py
+# Indeks master foto (teks overlay -> petunjuk lokasi foto asli) di SQLite mode WAL.
+# Menggantikan master_index.json yang dibaca dan ditulis ulang utuh di setiap sesi:
+# pencarian memakai primary key, dan setiap foto baru dicatat dalam transaksi sendiri
+# sehingga dua sesi yang berjalan bersamaan tidak saling menimpa.
+# Selain teks overlay, setiap foto dicatat dengan hash perseptualnya (pHash/dHash) dan
+# dicari dengan multi-index hashing: pHash dipecah menjadi 4 potongan 16-bit yang masing-
+# masing diindeks. Jika jarak Hamming dua hash <= r, minimal satu potongan berjarak
+# <= r // 4 (prinsip sarang merpati), jadi cukup mencari tetangga kecil setiap potongan.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from hash_persepsi import (
+    JUMLAH_BIT,
+    JUMLAH_POTONGAN,
+    phash,
+    dhash,
+    jarak_hamming,
+    potong_hash,
+    tetangga_potongan,
+    ke_sqlite,
+    dari_sqlite,
+)
+
+PATH_INDEKS_MASTER = Path(os.environ.get("INDEKS_MASTER_PATH", "data/sistem_validasi/master_index.sqlite3"))
+# Format lama, hanya dibaca oleh migrasi
+PATH_INDEKS_MASTER_JSON = Path("data/sistem_validasi/master_index.json")
+# Folder sesi tempat foto entri lama dicari saat hash-nya dihitung setelah migrasi
+DIR_OUTPUT_EKSTRAKSI = Path("data/output_ekstraksi")
+
+_INDEKS = None
+_INDEKS_LOCK = threading.Lock()
+
+
+class IndeksMaster:
+    """
+    Dipakai proses_validasi_dengan_petunjuk lewat dua operasi atomik:
+    - `cocokkan_atau_catat_foto(...)`: pencarian foto mirip berdasarkan hash perseptual;
+    - `setdefault(sidik, petunjuk)`: indeks teks overlay, mengembalikan petunjuk yang
+      tersimpan (objek `petunjuk` itu sendiri jika baru dicatat).
+    """
+
+    def __init__(self, path: Path = PATH_INDEKS_MASTER):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._kon = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._kon:
+            self._kon.execute("PRAGMA journal_mode=WAL")
+            self._kon.execute("PRAGMA synchronous=NORMAL")
+            self._kon.execute("""
+                CREATE TABLE IF NOT EXISTS foto (
+                    sidik TEXT PRIMARY KEY,
+                    sesi_asli TEXT,
+                    proyek_asli TEXT,
+                    path_relatif_di_sesi TEXT,
+                    dicatat_pada REAL NOT NULL
+                )
+            """)
+            self._kon.execute("""
+                CREATE TABLE IF NOT EXISTS foto_hash (
+                    id INTEGER PRIMARY KEY,
+                    phash INTEGER NOT NULL,
+                    dhash INTEGER NOT NULL,
+                    sidik_ocr TEXT,
+                    sesi_asli TEXT,
+                    proyek_asli TEXT,
+                    path_relatif_di_sesi TEXT,
+                    dicatat_pada REAL NOT NULL
+                )
+            """)
+            self._kon.execute("""
+                CREATE TABLE IF NOT EXISTS foto_hash_potongan (
+                    bagian INTEGER NOT NULL,
+                    nilai INTEGER NOT NULL,
+                    id_foto INTEGER NOT NULL
+                )
+            """)
+            self._kon.execute("CREATE INDEX IF NOT EXISTS idx_potongan ON foto_hash_potongan (bagian, nilai)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._kon.execute("SELECT COUNT(*) FROM foto").fetchone()[0]
+
+    def __contains__(self, sidik: str) -> bool:
+        return self.get(sidik) is not None
+
+    def get(self, sidik: str, default=None) -> Optional[dict]:
+        with self._lock:
+            baris = self._kon.execute(
+                "SELECT sesi_asli, proyek_asli, path_relatif_di_sesi FROM foto WHERE sidik = ?", (sidik,)
+            ).fetchone()
+        return _ke_petunjuk(baris) if baris else default
+
+    def setdefault(self, sidik: str, petunjuk: dict) -> dict:
+        with self._lock, self._kon:
+            kursor = self._kon.execute(
+                "INSERT OR IGNORE INTO foto VALUES (?, ?, ?, ?, ?)",
+                (sidik, petunjuk.get("sesi_asli"), petunjuk.get("proyek_asli"), petunjuk.get("path_relatif_di_sesi"), time.time())
+            )
+            if kursor.rowcount == 1:
+                return petunjuk
+            baris = self._kon.execute(
+                "SELECT sesi_asli, proyek_asli, path_relatif_di_sesi FROM foto WHERE sidik = ?", (sidik,)
+            ).fetchone()
+        return _ke_petunjuk(baris)
+
+    def punya_hash(self, petunjuk: dict) -> bool:
+        """True jika foto dengan petunjuk ini sudah tercatat di indeks hash."""
+        with self._lock:
+            return self._kon.execute(
+                "SELECT 1 FROM foto_hash WHERE sesi_asli IS ? AND path_relatif_di_sesi IS ? LIMIT 1",
+                (petunjuk.get("sesi_asli"), petunjuk.get("path_relatif_di_sesi"))
+            ).fetchone() is not None
+
+    def cari_foto_mirip(self, phash: int, dhash: int, jarak_phash_maks: int, jarak_dhash_maks: int) -> List[dict]:
+        """Foto di arsip dengan jarak pHash dan dHash di bawah batas, terdekat lebih dulu."""
+        with self._lock:
+            return self._cari_foto_mirip(phash, dhash, jarak_phash_maks, jarak_dhash_maks)
+
+    def cocokkan_atau_catat_foto(
+        self, phash: int, dhash: int, petunjuk: dict, sidik_ocr: Optional[str],
+        jarak_phash_maks: int, jarak_dhash_maks: int
+    ) -> Optional[dict]:
+        """
+        Dalam satu transaksi tulis: cari foto termirip; jika tidak ada, catat foto ini.
+        Mengembalikan kecocokan terdekat, atau None jika foto baru dicatat.
+        Entri dengan petunjuk yang sama persis (sesi, proyek, path) adalah foto ini sendiri,
+        tercatat oleh run yang terputus lalu dilanjutkan; entri itu bukan duplikat dan foto
+        tidak dicatat dua kali.
+        """
+        with self._lock:
+            self._kon.execute("BEGIN IMMEDIATE")
+            try:
+                kecocokan = self._cari_foto_mirip(phash, dhash, jarak_phash_maks, jarak_dhash_maks)
+                sudah_tercatat = any(k["petunjuk"] == petunjuk for k in kecocokan)
+                kecocokan = [k for k in kecocokan if k["petunjuk"] != petunjuk]
+                if not kecocokan and not sudah_tercatat:
+                    self._catat_foto(phash, dhash, petunjuk, sidik_ocr)
+                self._kon.commit()
+            except Exception:
+                self._kon.rollback()
+                raise
+        return kecocokan[0] if kecocokan else None
+
+    def _cari_foto_mirip(self, phash: int, dhash: int, jarak_phash_maks: int, jarak_dhash_maks: int) -> List[dict]:
+        radius = max(0, jarak_phash_maks) // JUMLAH_POTONGAN
+        kandidat = set()
+        for bagian, potongan in enumerate(potong_hash(phash)):
+            nilai = list(tetangga_potongan(potongan, radius))
+            tanda = ",".join("?" * len(nilai))
+            kandidat.update(
+                id_foto for (id_foto,) in self._kon.execute(
+                    f"SELECT id_foto FROM foto_hash_potongan WHERE bagian = ? AND nilai IN ({tanda})", (bagian, *nilai)
+                )
+            )
+        if not kandidat:
+            return []
+
+        hasil = []
+        daftar_id = list(kandidat)
+        for mulai in range(0, len(daftar_id), 500):
+            potongan_id = daftar_id[mulai:mulai + 500]
+            for baris in self._kon.execute(
+                f"SELECT phash, dhash, sidik_ocr, sesi_asli, proyek_asli, path_relatif_di_sesi FROM foto_hash WHERE id IN ({','.join('?' * len(potongan_id))})",
+                potongan_id
+            ):
+                jarak_p = jarak_hamming(phash, dari_sqlite(baris[0]))
+                jarak_d = jarak_hamming(dhash, dari_sqlite(baris[1]))
+                if jarak_p <= jarak_phash_maks and jarak_d <= jarak_dhash_maks:
+                    hasil.append({
+                        "petunjuk": _ke_petunjuk(baris[3:]),
+                        "jarak_phash": jarak_p,
+                        "jarak_dhash": jarak_d,
+                        "kemiripan": round(1 - jarak_p / JUMLAH_BIT, 3),
+                        "sidik_ocr": baris[2],
+                    })
+        hasil.sort(key=lambda k: (k["jarak_phash"], k["jarak_dhash"]))
+        return hasil
+
+    def _catat_foto(self, phash: int, dhash: int, petunjuk: dict, sidik_ocr: Optional[str]):
+        kursor = self._kon.execute(
+            "INSERT INTO foto_hash (phash, dhash, sidik_ocr, sesi_asli, proyek_asli, path_relatif_di_sesi, dicatat_pada) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ke_sqlite(phash), ke_sqlite(dhash), sidik_ocr, petunjuk.get("sesi_asli"), petunjuk.get("proyek_asli"), petunjuk.get("path_relatif_di_sesi"), time.time())
+        )
+        self._kon.executemany(
+            "INSERT INTO foto_hash_potongan VALUES (?, ?, ?)",
+            [(bagian, potongan, kursor.lastrowid) for bagian, potongan in enumerate(potong_hash(phash))]
+        )
+
+    def isi_hash_dari_arsip(self, dir_output_ekstraksi: Path) -> Dict[str, int]:
+        """
+        Menghitung hash untuk entri lama (hasil migrasi JSON) yang belum punya hash, selama
+        file fotonya masih ada di `dir_output_ekstraksi/<sesi_asli>/<path_relatif_di_sesi>`.
+        Logo/tanda tangan (alasan_bukan_foto) tidak dicatat, sama seperti foto baru.
+        """
+        from validasi_foto import alasan_bukan_foto
+        with self._lock:
+            entri_lama = self._kon.execute("""
+                SELECT f.sidik, f.sesi_asli, f.proyek_asli, f.path_relatif_di_sesi FROM foto f
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM foto_hash h
+                    WHERE h.sesi_asli = f.sesi_asli AND h.path_relatif_di_sesi = f.path_relatif_di_sesi
+                )
+            """).fetchall()
+        jumlah = {"entri_tanpa_hash": len(entri_lama), "hash_dihitung": 0, "file_hilang": 0, "gagal_dibaca": 0, "bukan_foto": 0}
+        for sidik, sesi_asli, proyek_asli, path_relatif in entri_lama:
+            path_foto = Path(dir_output_ekstraksi) / (sesi_asli or "") / (path_relatif or "")
+            if not path_foto.is_file():
+                jumlah["file_hilang"] += 1
+                continue
+            try:
+                with Image.open(path_foto) as img:
+                    gray = np.asarray(img.convert("L"))
+            except (OSError, Image.UnidentifiedImageError, ValueError):
+                # File terpotong/bukan gambar di arsip tidak boleh menghentikan seluruh pengisian
+                jumlah["gagal_dibaca"] += 1
+                continue
+            if alasan_bukan_foto(gray):
+                jumlah["bukan_foto"] += 1
+                continue
+            with self._lock, self._kon:
+                self._catat_foto(phash(gray), dhash(gray), _ke_petunjuk((sesi_asli, proyek_asli, path_relatif)), sidik)
+            jumlah["hash_dihitung"] += 1
+        return jumlah
+
+    def impor(self, data: Iterable[Tuple[str, dict]]) -> int:
+        """Menyisipkan banyak entri dalam satu transaksi; entri yang sudah ada dibiarkan. Mengembalikan jumlah yang baru."""
+        sekarang = time.time()
+        with self._lock, self._kon:
+            sebelum = self._kon.total_changes
+            self._kon.executemany(
+                "INSERT OR IGNORE INTO foto VALUES (?, ?, ?, ?, ?)",
+                ((sidik, p.get("sesi_asli"), p.get("proyek_asli"), p.get("path_relatif_di_sesi"), sekarang) for sidik, p in data)
+            )
+            return self._kon.total_changes - sebelum
+
+    def tutup(self):
+        with self._lock:
+            self._kon.close()
+
+
+def _ke_petunjuk(baris) -> dict:
+    sesi_asli, proyek_asli, path_relatif = baris
+    return {"sesi_asli": sesi_asli, "proyek_asli": proyek_asli, "path_relatif_di_sesi": path_relatif}
+
+
+def migrasi_dari_json(indeks: IndeksMaster, path_json: Path = PATH_INDEKS_MASTER_JSON) -> Dict[str, int]:
+    with open(path_json, "r", encoding="utf-8") as f:
+        data_lama = json.load(f)
+    jumlah_baru = indeks.impor(data_lama.items())
+    return {"entri_json": len(data_lama), "entri_baru": jumlah_baru, "total_indeks": len(indeks)}
+
+
+def get_indeks_master() -> IndeksMaster:
+    """
+    Getter singleton. Saat indeks SQLite masih kosong dan master_index.json lama ada,
+    isinya diimpor otomatis sekali (satu transaksi). Memblokir, jadi dari kode async
+    panggil lewat run_in_executor. Hash perseptual entri lama diisi oleh siapkan_indeks_master.
+    """
+    global _INDEKS
+    with _INDEKS_LOCK:
+        if _INDEKS is None:
+            indeks = IndeksMaster()
+            try:
+                if len(indeks) == 0 and PATH_INDEKS_MASTER_JSON.exists():
+                    hasil = migrasi_dari_json(indeks)
+                    print(f"--- Indeks master JSON diimpor ke SQLite: {hasil} ---")
+            except Exception:
+                indeks.tutup()
+                raise
+            # Baru dipasang setelah migrasi berhasil, sehingga kegagalan dicoba lagi pada panggilan berikutnya
+            _INDEKS = indeks
+        return _INDEKS
+
+
+def siapkan_indeks_master() -> Optional[Dict[str, int]]:
+    """
+    Dipanggil di latar belakang saat aplikasi start: membuka (dan memigrasi) indeks, lalu
+    menghitung hash perseptual entri lama dari foto yang masih ada di DIR_OUTPUT_EKSTRAKSI
+    (tanpa hash, entri hanya bisa cocok lewat teks overlay). Entri yang sudah punya hash
+    dilewati, jadi pengisian yang terhenti dilanjutkan pada start berikutnya.
+    """
+    try:
+        hasil = get_indeks_master().isi_hash_dari_arsip(DIR_OUTPUT_EKSTRAKSI)
+    except Exception as e:
+        print(f"[ERROR] Gagal menyiapkan indeks master: {e}")
+        return None
+    if hasil["entri_tanpa_hash"]:
+        print(f"--- Hash perseptual entri lama: {hasil} ---")
+    return hasil
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    parser = argparse.ArgumentParser(description="Migrasi indeks master foto ke SQLite.")
+    parser.add_argument("path_json", nargs="?", default=str(PATH_INDEKS_MASTER_JSON), help="master_index.json lama")
+    parser.add_argument("path_sqlite", nargs="?", default=str(PATH_INDEKS_MASTER))
+    parser.add_argument("--hitung-hash", metavar="DIR_OUTPUT_EKSTRAKSI",
+                        help="Hitung hash perseptual entri lama dari foto di folder ini (mis. data/output_ekstraksi)")
+    args = parser.parse_args()
+
+    indeks = IndeksMaster(Path(args.path_sqlite))
+    if Path(args.path_json).exists():
+        print(f"Mengimpor {args.path_json} ke {args.path_sqlite}...")
+        print(migrasi_dari_json(indeks, Path(args.path_json)))
+    elif not args.hitung_hash:
+        sys.exit(f"File JSON tidak ditemukan: {args.path_json}")
+    if args.hitung_hash:
+        print(f"Menghitung hash perseptual dari {args.hitung_hash}...")
+        print(indeks.isi_hash_dari_arsip(Path(args.hitung_hash)))
+    indeks.tutup()
@@ -0,0 +1,59 @@
+# backend/inferensi_batch.py
+# Penggabung batch dinamis: mengumpulkan permintaan inferensi dari banyak halaman
+# (dan dari beberapa dokumen yang diproses bersamaan) menjadi satu forward pass.
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class PenggabungBatch:
+    """
+    Satu thread latar belakang mengambil item dari antrian dan memanggil
+    `fungsi_batch(list_item) -> list_hasil` dengan paling banyak `ukuran_batch` item.
+    Batch dikirim saat penuh atau setelah `maks_tunggu_ms` sejak item pertama masuk.
+    Karena hanya thread ini yang memanggil model, akses ke model otomatis berurutan.
+    """
+
+    def __init__(self, fungsi_batch: Callable[[List[Any]], List[Any]], ukuran_batch: int = 8, maks_tunggu_ms: float = 20, nama: str = "batch"):
+        self.fungsi_batch = fungsi_batch
+        self.ukuran_batch = max(1, ukuran_batch)
+        self.maks_tunggu = max(0.0, maks_tunggu_ms) / 1000
+        self.nama = nama
+        self._antrian: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name=f"penggabung-{nama}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self._antrian.put((item, future))
+        return future
+
+    @property
+    def jumlah_menunggu(self) -> int:
+        return self._antrian.qsize()
+
+    def _loop(self):
+        while True:
+            batch = [self._antrian.get()]
+            batas_waktu = time.monotonic() + self.maks_tunggu
+            while len(batch) < self.ukuran_batch:
+                sisa = batas_waktu - time.monotonic()
+                try:
+                    batch.append(self._antrian.get(timeout=sisa) if sisa > 0 else self._antrian.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                daftar_hasil = self.fungsi_batch([item for item, _ in batch])
+                for (_, future), hasil in zip(batch, daftar_hasil):
+                    future.set_result(hasil)
+            except Exception as e:
+                print(f"[ERROR] Batch {self.nama} ({len(batch)} item) gagal: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
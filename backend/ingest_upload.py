@@ -0,0 +1,204 @@
+# backend/ingest_upload.py
+# Penerimaan upload PDF secara streaming: body multipart/form-data di-parse per potongan
+# (python-multipart) dan setiap file langsung ditulis ke lokasi akhirnya di INPUT_PDF_DIR.
+# SHA-256 dihitung sambil menulis, dan batas ukuran/jenis file diperiksa di tengah aliran,
+# sehingga upload yang tidak valid dihentikan tanpa menunggu seluruh body diterima.
+# Memori puncak hanya sebesar satu potongan body, berapa pun ukuran filenya.
+
+import os
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# Sama dengan batas di frontend; sekarang juga ditegakkan di server
+UPLOAD_MAKS_MB_PER_FILE = float(os.environ.get("UPLOAD_MAKS_MB_PER_FILE", "200"))
+UPLOAD_MAKS_JUMLAH_FILE = int(os.environ.get("UPLOAD_MAKS_JUMLAH_FILE", "50"))
+NAMA_FIELD_FILE = "files"
+
+# Spesifikasi PDF mengizinkan header "%PDF-" berada di mana saja dalam 1024 byte pertama
+_PANJANG_CEK_HEADER_PDF = 1024
+_HEADER_PDF = b"%PDF-"
+
+# Isi OpenAPI untuk endpoint yang memakai ingest ini (FastAPI tidak bisa membacanya dari
+# signature karena body dibaca langsung dari Request)
+SKEMA_OPENAPI_UPLOAD = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {NAMA_FIELD_FILE: {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                    "required": [NAMA_FIELD_FILE],
+                }
+            }
+        },
+    }
+}
+
+
+class UploadDitolakError(Exception):
+    """Upload tidak valid; `kode_status` adalah kode HTTP yang sesuai (400/413/415)."""
+
+    def __init__(self, pesan: str, kode_status: int = 400):
+        super().__init__(pesan)
+        self.kode_status = kode_status
+
+
+class FileTerunggah:
+    """
+    Satu file PDF yang sedang/sudah ditulis ke disk. `nama_file` adalah nama asli dari klien,
+    `nama_proyek` nama berawalan indeks yang unik dalam satu upload (dipakai untuk folder proyek).
+    """
+
+    def __init__(self, path_akhir: Path, nama_file: str, nama_proyek: str):
+        self.path_akhir = path_akhir
+        self.path_sementara = path_akhir.with_name(path_akhir.name + ".part")
+        self.nama_file = nama_file
+        self.nama_proyek = nama_proyek
+        self.ukuran = 0
+        self._sha256 = hashlib.sha256()
+        self._awal = b""
+        self._berkas = open(self.path_sementara, "wb")
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    def tulis(self, data: bytes, batas_byte: float):
+        self.ukuran += len(data)
+        if self.ukuran > batas_byte:
+            raise UploadDitolakError(
+                f"Ukuran file '{self.nama_file}' melebihi batas {UPLOAD_MAKS_MB_PER_FILE:g} MB.", kode_status=413
+            )
+        if len(self._awal) < _PANJANG_CEK_HEADER_PDF:
+            self._awal += data[:_PANJANG_CEK_HEADER_PDF - len(self._awal)]
+            if len(self._awal) >= _PANJANG_CEK_HEADER_PDF:
+                self._cek_header_pdf()
+        self._sha256.update(data)
+        self._berkas.write(data)
+
+    def _cek_header_pdf(self):
+        if _HEADER_PDF not in self._awal:
+            raise UploadDitolakError(f"File '{self.nama_file}' bukan PDF.", kode_status=415)
+
+    def selesai(self):
+        self._berkas.close()
+        self._cek_header_pdf()
+        os.replace(self.path_sementara, self.path_akhir)
+
+    def buang(self):
+        self._berkas.close()
+        for path in (self.path_sementara, self.path_akhir):
+            if path.exists():
+                os.remove(path)
+
+
+class _PenerimaMultipart:
+    """Callback python-multipart: mengarahkan data setiap part file ke FileTerunggah-nya."""
+
+    def __init__(self, folder_tujuan: Path, awalan_nama: str):
+        self.folder_tujuan = folder_tujuan
+        self.awalan_nama = awalan_nama
+        self.batas_byte = UPLOAD_MAKS_MB_PER_FILE * 1024 * 1024
+        self.daftar_file: List[FileTerunggah] = []
+        self._file_aktif: Optional[FileTerunggah] = None
+        self._header_field, self._header_nilai, self._header = b"", b"", {}
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_mulai,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_nilai_data,
+            "on_header_end": self._header_selesai,
+            "on_headers_finished": self._semua_header_selesai,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_selesai,
+        }
+
+    def masih_menulis(self) -> bool:
+        """True jika ada part file yang sudah dimulai tetapi belum diakhiri (body terpotong)."""
+        return self._file_aktif is not None
+
+    def _part_mulai(self):
+        self._file_aktif, self._header = None, {}
+
+    def _header_field_data(self, data: bytes, awal: int, akhir: int):
+        self._header_field += data[awal:akhir]
+
+    def _header_nilai_data(self, data: bytes, awal: int, akhir: int):
+        self._header_nilai += data[awal:akhir]
+
+    def _header_selesai(self):
+        self._header[self._header_field.lower()] = self._header_nilai
+        self._header_field, self._header_nilai = b"", b""
+
+    def _semua_header_selesai(self):
+        _, opsi = parse_options_header(self._header.get(b"content-disposition"))
+        nama_field = opsi.get(b"name", b"").decode("utf-8", "replace")
+        nama_file = opsi.get(b"filename")
+        # Field selain file (atau tanpa nama file) diabaikan
+        if nama_field != NAMA_FIELD_FILE or not nama_file:
+            return
+        if len(self.daftar_file) >= UPLOAD_MAKS_JUMLAH_FILE:
+            raise UploadDitolakError(f"Maksimal {UPLOAD_MAKS_JUMLAH_FILE} file per upload.", kode_status=413)
+        # Hanya nama dasarnya yang dipakai agar tidak bisa menulis di luar folder tujuan
+        nama_file = Path(nama_file.decode("utf-8", "replace").replace("\\", "/")).name
+        if not nama_file:
+            raise UploadDitolakError("Nama file kosong.")
+        # Indeks ikut di nama agar dua file bernama sama dalam satu batch tidak saling menimpa,
+        # baik PDF-nya di sini maupun folder proyeknya di output sesi
+        nama_proyek = f"{len(self.daftar_file)}_{nama_file}"
+        path_akhir = self.folder_tujuan / f"{self.awalan_nama}_{nama_proyek}"
+        self._file_aktif = FileTerunggah(path_akhir, nama_file, nama_proyek)
+        self.daftar_file.append(self._file_aktif)
+
+    def _part_data(self, data: bytes, awal: int, akhir: int):
+        if self._file_aktif is not None:
+            self._file_aktif.tulis(data[awal:akhir], self.batas_byte)
+
+    def _part_selesai(self):
+        if self._file_aktif is not None:
+            self._file_aktif.selesai()
+            self._file_aktif = None
+
+
+async def terima_upload_pdf(request: Request, folder_tujuan: Path, awalan_nama: str) -> List[FileTerunggah]:
+    """
+    Membaca body multipart dari `request` per potongan dan menulis setiap file field
+    NAMA_FIELD_FILE ke `folder_tujuan`. Jika ada yang tidak valid, semua file dari request
+    ini dihapus lalu UploadDitolakError dilempar.
+    """
+    jenis_konten, opsi = parse_options_header(request.headers.get("content-type"))
+    if jenis_konten != b"multipart/form-data" or b"boundary" not in opsi:
+        raise UploadDitolakError("Body harus multipart/form-data.", kode_status=415)
+
+    # Content-Length yang jelas terlalu besar ditolak sebelum satu byte pun dibaca
+    panjang = request.headers.get("content-length")
+    if panjang and panjang.isdigit() and int(panjang) > UPLOAD_MAKS_JUMLAH_FILE * UPLOAD_MAKS_MB_PER_FILE * 1024 * 1024 + 1024 * 1024:
+        raise UploadDitolakError("Ukuran upload melebihi batas.", kode_status=413)
+
+    penerima = _PenerimaMultipart(folder_tujuan, awalan_nama)
+    parser = MultipartParser(opsi[b"boundary"], penerima.callbacks())
+    try:
+        async for potongan in request.stream():
+            # Penulisan ke disk terjadi di dalam callback parser; dijalankan di thread agar event loop tidak tertahan
+            await run_in_threadpool(parser.write, potongan)
+        parser.finalize()
+        if penerima.masih_menulis():
+            raise UploadDitolakError("Body multipart terpotong.")
+    except Exception as e:
+        for file in penerima.daftar_file:
+            file.buang()
+        if isinstance(e, UploadDitolakError):
+            raise
+        raise UploadDitolakError(f"Body multipart tidak valid: {e}") from e
+
+    if not penerima.daftar_file:
+        raise UploadDitolakError(f"Tidak ada file pada field '{NAMA_FIELD_FILE}'.")
+    return penerima.daftar_file
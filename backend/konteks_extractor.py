@@ -1,196 +1,260 @@
 # backend/konteks_extractor.py
+import os
+import time
+import hashlib
 import torch
+import threading
 from PIL import Image
-import pytesseract
 import json
 from json_repair import repair_json
 from transformers import (
     LayoutLMv3Processor,
     LayoutLMv3ForTokenClassification,
     AutoTokenizer,
-    AutoModelForSeq2SeqLM
+    AutoModelForSeq2SeqLM,
+    BertTokenizer,
+    EncoderDecoderModel
 )
 
+import artefak_halaman
+from artefak_halaman import ocr_ke_data, kata_dan_kotak_untuk_model
+from inferensi_batch import PenggabungBatch
+from metrik_layanan import DURASI_LANGKAH, PERBAIKAN_JSON
+
+# --- Konfigurasi batching LayoutLMv3 (bisa diubah lewat environment variable) ---
+# Batas halaman per batch sekaligus batas jendela (urutan 512 token) per forward pass
+LAYOUTLM_UKURAN_BATCH = int(os.environ.get("LAYOUTLM_UKURAN_BATCH", "8"))
+LAYOUTLM_MAKS_TUNGGU_MS = float(os.environ.get("LAYOUTLM_MAKS_TUNGGU_MS", "20"))
+# Mode jendela geser untuk halaman > 512 token, dan jumlah token tumpang tindih antar jendela
+LAYOUTLM_MODE_JENDELA = os.environ.get("LAYOUTLM_MODE_JENDELA", "1") == "1"
+LAYOUTLM_STRIDE = int(os.environ.get("LAYOUTLM_STRIDE", "128"))
+
+# --- Mode inferensi CPU teroptimasi (opt-in) ---
+# "fp32" = bobot asli; "cpu_int8" = kuantisasi dinamis int8 pada semua lapisan Linear
+AI_MODE_INFERENSI = os.environ.get("AI_MODE_INFERENSI", "fp32")
+# Jalankan torch.compile pada encoder LayoutLMv3 (hanya berlaku untuk mode cpu_int8)
+AI_TORCH_COMPILE = os.environ.get("AI_TORCH_COMPILE", "0") == "1"
+# Jumlah thread intra-op torch; 0 = biarkan default torch
+AI_JUMLAH_THREAD = int(os.environ.get("AI_JUMLAH_THREAD", "0"))
+
+# --- Dekoding FLAN-T5 ---
+# Strategi dekoding yang tersedia; "beam4" sama dengan perilaku awal
+STRATEGI_DEKODE_FLAN_T5 = {
+    "beam4": {"num_beams": 4, "early_stopping": True},
+    "beam2": {"num_beams": 2, "early_stopping": True},
+    "greedy": {"num_beams": 1},
+}
+FLAN_T5_STRATEGI = os.environ.get("FLAN_T5_STRATEGI", "beam4")
+# Jumlah halaman yang di-generate dalam satu panggilan generate()
+FLAN_T5_UKURAN_BATCH = int(os.environ.get("FLAN_T5_UKURAN_BATCH", "8"))
+# Batas token baru = dasar + per_entitas * jumlah entitas (maks 512); 0 = max_length 512 seperti semula
+FLAN_T5_TOKEN_DASAR = int(os.environ.get("FLAN_T5_TOKEN_DASAR", "32"))
+FLAN_T5_TOKEN_PER_ENTITAS = int(os.environ.get("FLAN_T5_TOKEN_PER_ENTITAS", "0"))
+
+# --- Sumber model dan siklus hidup ---
+MODEL_ID = "habibiws/sistem-validasi-laporan2-models"
+SUBFOLDER_LM = "layoutlmv3-finetuned-laporan-100%209-data-100e-koreksi"
+SUBFOLDER_T5 = "flan-t5-finetuned-penataan"
+# Folder lokal berisi kedua subfolder di atas (hasil download/snapshot repo model); jika diisi,
+# Hub tidak dihubungi sama sekali
+AI_DIR_MODEL_LOKAL = os.environ.get("AI_DIR_MODEL_LOKAL", "")
+# 1 = hanya memakai cache HF yang sudah ada di disk (tanpa jaringan)
+AI_MODE_OFFLINE = os.environ.get("AI_MODE_OFFLINE", "0") == "1"
+# Bobot fp32 disalin sekali ke file di folder ini lalu di-mmap, sehingga beberapa worker
+# uvicorn berbagi halaman memori yang sama (page cache) alih-alih masing-masing memegang salinan
+AI_BOBOT_MMAP = os.environ.get("AI_BOBOT_MMAP", "0") == "1"
+AI_DIR_BOBOT_MMAP = os.environ.get("AI_DIR_BOBOT_MMAP", os.path.join("data", "sistem_validasi", "bobot_mmap"))
+
 MODEL_MATA, PROCESSOR_MATA = None, None
 MODEL_OTAK, TOKENIZER_OTAK = None, None
+# Mencegah beberapa worker executor AI memuat model yang sama secara bersamaan
+_LOCK_MUAT_MODEL = threading.Lock()
+_BATCHER_MATA = None
+
+# Status pemuatan untuk endpoint /ready
+_STATUS_MODEL = {"status": "belum_dimuat", "waktu_muat_detik": None, "waktu_pemanasan_detik": None, "siap_pada": None, "error": None}
+
+# Model 'Otak' versi lama (IndoBERT), hanya dipakai oleh tata_ulang_dengan_indobert_lokal
+BRAIN_MODEL, BRAIN_TOKENIZER = None, None
+
+def _contoh_input_layoutlmv3(model) -> dict:
+    """Input dummy kecil (8 token, gambar sesuai config) untuk memicu kompilasi LayoutLMv3."""
+    ukuran = getattr(model.config, "input_size", 224)
+    return {
+        "input_ids": torch.zeros((1, 8), dtype=torch.long),
+        "attention_mask": torch.ones((1, 8), dtype=torch.long),
+        "bbox": torch.zeros((1, 8, 4), dtype=torch.long),
+        "pixel_values": torch.zeros((1, 3, ukuran, ukuran)),
+    }
+
+def optimalkan_model_cpu(model, kompilasi: bool = False):
+    """
+    Mengembalikan salinan model dengan kuantisasi dinamis int8 pada lapisan Linear
+    (bobot int8, aktivasi dikuantisasi saat runtime). Hanya untuk CPU.
+    Jika `kompilasi` (hanya untuk LayoutLMv3), model juga dibungkus torch.compile. Kompilasi
+    baru terjadi pada forward pertama, jadi satu forward dummy dijalankan di sini; jika
+    gagal, model int8 tanpa kompilasi yang dikembalikan.
+    """
+    # Bias posisi relatif LayoutLMv3 (rel_pos_*) dibaca lewat `.weight` secara langsung,
+    # bukan dipanggil sebagai lapisan, jadi harus tetap fp32.
+    lapisan_int8 = {
+        nama: torch.ao.quantization.default_dynamic_qconfig
+        for nama, modul in model.named_modules()
+        if isinstance(modul, torch.nn.Linear) and "rel_pos" not in nama
+    }
+    model_int8 = torch.ao.quantization.quantize_dynamic(model, lapisan_int8, dtype=torch.qint8)
+    model_int8.eval()
+    if kompilasi:
+        try:
+            model_kompilasi = torch.compile(model_int8, dynamic=True)
+            with torch.inference_mode():
+                model_kompilasi(**_contoh_input_layoutlmv3(model_int8))
+            return model_kompilasi
+        except Exception as e:
+            print(f"[PERINGATAN] torch.compile gagal, memakai model int8 tanpa kompilasi: {e}")
+    return model_int8
+
+def _argumen_sumber_model(subfolder: str) -> tuple:
+    """(path_atau_id, kwargs) untuk from_pretrained sesuai AI_DIR_MODEL_LOKAL / AI_MODE_OFFLINE."""
+    if AI_DIR_MODEL_LOKAL:
+        return os.path.join(AI_DIR_MODEL_LOKAL, subfolder), {"local_files_only": True}
+    return MODEL_ID, {"subfolder": subfolder, "local_files_only": AI_MODE_OFFLINE}
+
+_SUFIKS_FILE_BOBOT = (".safetensors", ".bin", ".pt", ".pth", ".ckpt")
+
+def _identitas_model(model) -> str:
+    """
+    Revisi model yang dimuat: commit Hub jika ada. Model dari folder lokal (mis. AI_DIR_MODEL_LOKAL)
+    tidak punya commit, jadi path foldernya ditambah sidik waktu ubah + ukuran file bobotnya;
+    bobot yang diganti di folder yang sama menghasilkan identitas baru.
+    """
+    commit = getattr(model.config, '_commit_hash', None)
+    if commit:
+        return commit
+    path = getattr(model.config, 'name_or_path', '?')
+    if os.path.isdir(path):
+        daftar_bobot = []
+        for nama_file in sorted(os.listdir(path)):
+            if nama_file.endswith(_SUFIKS_FILE_BOBOT):
+                info = os.stat(os.path.join(path, nama_file))
+                daftar_bobot.append(f"{nama_file}:{info.st_mtime_ns}:{info.st_size}")
+        path = f"{path}#{hashlib.sha256('|'.join(daftar_bobot).encode()).hexdigest()[:16]}"
+    return path
+
+def pakai_bobot_mmap(model, nama: str):
+    """
+    Mengganti parameter model dengan tensor yang di-mmap dari file di AI_DIR_BOBOT_MMAP
+    (dibuat sekali jika belum ada). Bobot hanya dibaca saat inferensi, jadi halaman file
+    tetap dibagi oleh semua proses yang memuat model yang sama.
+    """
+    identitas = f"{_identitas_model(model)}|{torch.__version__}"
+    path_bobot = os.path.join(AI_DIR_BOBOT_MMAP, f"{nama}-{hashlib.sha256(identitas.encode()).hexdigest()[:16]}.pt")
+    if not os.path.exists(path_bobot):
+        os.makedirs(AI_DIR_BOBOT_MMAP, exist_ok=True)
+        # Ditulis ke file sementara lalu di-rename: worker lain yang start bersamaan tidak
+        # pernah membaca file setengah jadi
+        path_sementara = f"{path_bobot}.{os.getpid()}.tmp"
+        torch.save(model.state_dict(), path_sementara)
+        os.replace(path_sementara, path_bobot)
+    state_dict = torch.load(path_bobot, mmap=True, weights_only=True, map_location="cpu")
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+    return model
 
 def load_models():
     global MODEL_MATA, PROCESSOR_MATA, MODEL_OTAK, TOKENIZER_OTAK
-    
+
     # Deteksi device (GPU jika tersedia di Codespaces berbayar, atau CPU)
     DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"--- Menggunakan device: {DEVICE} ---")
+    if AI_JUMLAH_THREAD > 0:
+        torch.set_num_threads(AI_JUMLAH_THREAD)
+    mode_int8 = AI_MODE_INFERENSI == "cpu_int8" and DEVICE.type == "cpu"
 
     if MODEL_MATA is None:
         print("Memuat model 'Mata' (LayoutLMv3)...")
-        MODEL_ID_LM = "habibiws/sistem-validasi-laporan2-models"
-        SUBFOLDER_LM = "layoutlmv3-finetuned-laporan-100%209-data-100e-koreksi"
-        PROCESSOR_MATA = LayoutLMv3Processor.from_pretrained(MODEL_ID_LM, subfolder=SUBFOLDER_LM)
-        MODEL_MATA = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_ID_LM, subfolder=SUBFOLDER_LM).to(DEVICE)
-        print(f"Model 'Mata' berhasil dimuat ke {DEVICE}.")
-    
+        sumber, kwargs = _argumen_sumber_model(SUBFOLDER_LM)
+        PROCESSOR_MATA = LayoutLMv3Processor.from_pretrained(sumber, **kwargs)
+        MODEL_MATA = LayoutLMv3ForTokenClassification.from_pretrained(sumber, **kwargs).to(DEVICE).eval()
+        if AI_BOBOT_MMAP and DEVICE.type == "cpu" and not mode_int8:
+            MODEL_MATA = pakai_bobot_mmap(MODEL_MATA, "layoutlmv3")
+        if mode_int8:
+            MODEL_MATA = optimalkan_model_cpu(MODEL_MATA, kompilasi=AI_TORCH_COMPILE)
+        print(f"Model 'Mata' berhasil dimuat ke {DEVICE} (mode: {'cpu_int8' if mode_int8 else 'fp32'}).")
+
     if MODEL_OTAK is None:
         print("Memuat model 'Otak' (FLAN-T5)...")
-        MODEL_ID_T5 = "habibiws/sistem-validasi-laporan2-models"
-        SUBFOLDER_T5 = "flan-t5-finetuned-penataan"
-        TOKENIZER_OTAK = AutoTokenizer.from_pretrained(MODEL_ID_T5, subfolder=SUBFOLDER_T5)
-        MODEL_OTAK = AutoModelForSeq2SeqLM.from_pretrained(MODEL_ID_T5, subfolder=SUBFOLDER_T5).to(DEVICE)
-        print(f"Model 'Otak' berhasil dimuat ke {DEVICE}.")
+        sumber, kwargs = _argumen_sumber_model(SUBFOLDER_T5)
+        TOKENIZER_OTAK = AutoTokenizer.from_pretrained(sumber, **kwargs)
+        MODEL_OTAK = AutoModelForSeq2SeqLM.from_pretrained(sumber, **kwargs).to(DEVICE).eval()
+        if AI_BOBOT_MMAP and DEVICE.type == "cpu" and not mode_int8:
+            MODEL_OTAK = pakai_bobot_mmap(MODEL_OTAK, "flan_t5")
+        if mode_int8:
+            # generate() tidak dikompilasi: panjang decoding berubah-ubah dan memicu rekompilasi
+            MODEL_OTAK = optimalkan_model_cpu(MODEL_OTAK)
+        print(f"Model 'Otak' berhasil dimuat ke {DEVICE} (mode: {'cpu_int8' if mode_int8 else 'fp32'}).")
 
 def get_models():
     if MODEL_MATA is None or MODEL_OTAK is None:
-        load_models()
+        with _LOCK_MUAT_MODEL:
+            load_models()
     return (MODEL_MATA, PROCESSOR_MATA), (MODEL_OTAK, TOKENIZER_OTAK)
 
-# ... (Salin semua fungsi helper dari `app.py` terakhir kita ke sini)
-# yaitu: analisis_halaman_dengan_layoutlmv3, _gabungkan_token_menjadi_entitas, tata_ulang_dengan_flan_t5
-
-def analisis_halaman_dengan_layoutlmv3(image: Image.Image) -> list:
-    """Menggunakan Manual OCR dan LayoutLMv3 untuk mengekstrak token dan label."""
+def _pemanasan_model():
+    """Satu forward pass kecil per model agar kernel/alokasi pertama tidak dibayar oleh upload pertama."""
+    data_dummy = {"lebar": 1000, "tinggi": 1000, "kata": [{"teks": "pemanasan", "kotak": [100, 100, 300, 150], "conf": 100.0, "baris": [1, 1, 1]}]}
+    input_halaman = siapkan_input_layoutlmv3(Image.new("RGB", (224, 224), "white"), data_dummy)
+    analisis_batch_dengan_layoutlmv3([input_halaman])
+    _, (model_otak, tokenizer_otak) = get_models()
+    encoding = tokenizer_otak([_teks_input_flan_t5([{"text": "pemanasan", "box": [100, 100, 300, 150]}])], return_tensors="pt").to(model_otak.device)
+    with torch.inference_mode():
+        model_otak.generate(**encoding, max_new_tokens=4)
+
+def muat_dan_panaskan_model():
+    """Dipanggil saat startup aplikasi: memuat kedua model lalu menjalankan pemanasan."""
+    _STATUS_MODEL.update(status="memuat", error=None)
     try:
-        ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-        words, boxes = [], []
-        for i in range(len(ocr_data["text"])):
-            if int(ocr_data["conf"][i]) > 0 and ocr_data["text"][i].strip():
-                words.append(ocr_data["text"][i])
-                (x, y, w, h) = (ocr_data["left"][i], ocr_data["top"][i], ocr_data["width"][i], ocr_data["height"][i])
-                img_width, img_height = image.size
-                boxes.append([int(x / img_width * 1000), int(y / img_height * 1000), int((x + w) / img_width * 1000), int((y + h) / img_height * 1000)])
+        mulai = time.perf_counter()
+        get_models()
+        _STATUS_MODEL["waktu_muat_detik"] = round(time.perf_counter() - mulai, 2)
+        mulai = time.perf_counter()
+        _pemanasan_model()
+        _STATUS_MODEL["waktu_pemanasan_detik"] = round(time.perf_counter() - mulai, 2)
+        _STATUS_MODEL.update(status="siap", siap_pada=time.time())
+        print(f"--- Model siap (muat {_STATUS_MODEL['waktu_muat_detik']} dtk, pemanasan {_STATUS_MODEL['waktu_pemanasan_detik']} dtk) ---")
     except Exception as e:
-        print(f"OCR Gagal: {e}")
-        return []
-
-    if not words:
-        return []
-
-    # Persiapkan input untuk model
-    encoding = PROCESSOR_MATA.tokenizer(text=words, boxes=boxes, truncation=True, padding="max_length", max_length=512, return_tensors="pt")
-    pixel_values = PROCESSOR_MATA.image_processor(image, return_tensors="pt").pixel_values
-    encoding["pixel_values"] = pixel_values
-
-    # Pindahkan data input (tensor) ke device yang sama dengan model
-    encoding = {k: v.to(DEVICE) for k, v in encoding.items()}
-
-    with torch.no_grad():
-        outputs = MODEL_MATA(**encoding)
-
-    predictions = outputs.logits.argmax(-1).squeeze().tolist()
-    tokens = PROCESSOR_MATA.tokenizer.convert_ids_to_tokens(encoding["input_ids"].squeeze().tolist())
-    token_boxes = encoding["bbox"].squeeze().tolist()
-    
-    # Handle kasus ketika output hanya satu nilai, bukan list
-    if not isinstance(predictions, list):
-        predictions = [predictions]
-    if token_boxes and not isinstance(token_boxes[0], list):
-        token_boxes = [token_boxes]
-
-    final_tokens = []
-    for token, box, pred_id in zip(tokens, token_boxes, predictions):
-        if token in [PROCESSOR_MATA.tokenizer.cls_token, PROCESSOR_MATA.tokenizer.sep_token, PROCESSOR_MATA.tokenizer.pad_token] or not box:
-            continue
-        final_tokens.append({"token": token, "label": MODEL_MATA.config.id2label[pred_id], "box": [int(coord) for coord in box]})
-
-    return final_tokens
-
-def _gabungkan_token_menjadi_entitas(hasil_analisis_kontekstual: list) -> list:
-    """Menggabungkan token yang berdekatan dengan label yang sama menjadi entitas tunggal."""
-    if not hasil_analisis_kontekstual:
-        return []
-    
-    entitas_dict = {}
-    for token_data in hasil_analisis_kontekstual:
-        key = (tuple(token_data["box"]), token_data["label"])
-        if key not in entitas_dict:
-            entitas_dict[key] = []
-        entitas_dict[key].append(token_data["token"])
-        
-    entitas_final = []
-    for (box, label), tokens in entitas_dict.items():
-        teks_lengkap = "".join(tokens).replace("Ġ", " ").strip()
-        if teks_lengkap:
-            entitas_final.append({"text": teks_lengkap, "box": list(box), "label": label})
-            
-    # Urutkan entitas berdasarkan posisi Y dan X
-    entitas_final.sort(key=lambda e: (e["box"][1], e["box"][0]))
-    return entitas_final
-
-def tata_ulang_dengan_flan_t5(final_entities: list) -> dict:
-    """Menggunakan FLAN-T5 untuk menata ulang entitas menjadi struktur JSON."""
-    if not final_entities:
-        return {"error": "Tidak ada entitas untuk diproses."}
-
-    prefix = "Translate from Indonesian to JSON: "
-    input_lines = [f"teks: \"{entity['text']}\" box: {entity['box']}" for entity in final_entities]
-    input_text = prefix + "\n".join(input_lines)
-    
-    inputs = TOKENIZER_OTAK(input_text, max_length=512, truncation=True, return_tensors="pt")
-    
-    # Pindahkan input_ids ke device yang sama dengan model
-    input_ids = inputs.input_ids.to(DEVICE)
-    
-    output_ids = MODEL_OTAK.generate(input_ids, max_length=512, num_beams=4, early_stopping=True)
-    predicted_json_string = TOKENIZER_OTAK.decode(output_ids[0], skip_special_tokens=True)
-    
-    # Perbaiki format JSON yang mungkin tidak sempurna
-    potential_json = f"{{{predicted_json_string}}}"
-    try:
-        return json.loads(potential_json)
-    except json.JSONDecodeError:
-        try:
-            return json.loads(repair_json(potential_json))
-        except Exception:
-            return {"error": "Gagal menghasilkan JSON valid.", "raw_output": predicted_json_string}
-        
-
-
-# backend/konteks_extractor.py (Versi FINAL)
-
-import torch
-import pytesseract
-from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont
-
-# --- PERBAIKAN FINAL: Atur Path Tesseract Secara Eksplisit ---
-# Salin blok kode yang sama dari skrip test_ocr.py
-try:
-    # GANTI PATH INI jika lokasi instalasi Tesseract Anda berbeda
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    print("[INFO] Path Tesseract diatur secara manual untuk aplikasi.")
-except Exception:
-    print("[INFO] Gagal mengatur path Tesseract (mungkin bukan di Windows).")
-    pass
-# -----------------------------------------------------------------
-
-# Impor yang dibutuhkan untuk kedua model
-from transformers import (
-    LayoutLMv3Processor,
-    LayoutLMv3ForTokenClassification,
-    BertTokenizer,
-    EncoderDecoderModel,
-    BertConfig,
-    EncoderDecoderConfig
-)
+        _STATUS_MODEL.update(status="gagal", error=str(e))
+        print(f"[ERROR] Gagal memuat model saat startup: {e}")
 
-# --- Variabel Global untuk Model ---
-MODEL = None
-PROCESSOR = None
-BRAIN_MODEL = None
-BRAIN_TOKENIZER = None
+def status_model() -> dict:
+    # Model juga bisa sudah dimuat secara lazy oleh pipeline tanpa lewat startup
+    if _STATUS_MODEL["status"] == "belum_dimuat" and MODEL_MATA is not None and MODEL_OTAK is not None:
+        return {**_STATUS_MODEL, "status": "siap"}
+    return dict(_STATUS_MODEL)
 
-# --- Fungsi Pemuatan (Loaders) ---
-
-def load_model():
-    global MODEL, PROCESSOR
-    if MODEL is None:
-        # Ganti dengan nama repo model Anda di Hub
-        MODEL_ID = "habibiws/sistem-validasi-laporan2-models"
-        # Tentukan subfolder tempat model spesifik ini berada
-        MODEL_SUBFOLDER = "layoutlmv3-finetuned-laporan-100%209-data-100e-koreksi"
+def versi_model() -> str:
+    """
+    Identitas semua hal yang memengaruhi hasil AI: revisi tiap subfolder model yang dimuat
+    (commit Hub, atau sidik file bobot untuk folder lokal), mode inferensi, dan pengaturan jendela/dekoding. Dipakai sebagai bagian
+    kunci cache hasil, sehingga mengganti model atau pengaturan otomatis membuat miss.
+    """
+    (model_mata, _), (model_otak, _) = get_models()
+    bagian = [
+        f"{nama}@{_identitas_model(model)}"
+        for nama, model in (("layoutlmv3", model_mata), ("flan_t5", model_otak))
+    ]
+    bagian += [
+        AI_MODE_INFERENSI,
+        f"jendela={int(LAYOUTLM_MODE_JENDELA)}:{LAYOUTLM_STRIDE}",
+        f"dekode={FLAN_T5_STRATEGI}:{FLAN_T5_TOKEN_DASAR}:{FLAN_T5_TOKEN_PER_ENTITAS}",
+        f"kata={artefak_halaman.SUMBER_KATA}",
+    ]
+    return "|".join(bagian)
 
-        print(f"Mengunduh/memuat model 'Mata' dari Hub: {MODEL_ID}/{MODEL_SUBFOLDER}...")
-        PROCESSOR = LayoutLMv3Processor.from_pretrained(MODEL_ID, subfolder=MODEL_SUBFOLDER)
-        MODEL = LayoutLMv3ForTokenClassification.from_pretrained(MODEL_ID, subfolder=MODEL_SUBFOLDER)
-        print("Model 'Mata' AI berhasil dimuat.")
+def get_layoutlm_model_and_processor():
+    """Getter yang aman untuk model LayoutLM."""
+    (model, processor), _ = get_models()
+    return model, processor
 
 def load_brain_model():
     global BRAIN_MODEL, BRAIN_TOKENIZER
@@ -203,115 +267,222 @@ def load_brain_model():
         BRAIN_MODEL = EncoderDecoderModel.from_pretrained(MODEL_ID, subfolder=MODEL_SUBFOLDER)
         print("Model 'Otak' AI berhasil dimuat.")
 
-def get_layoutlm_model_and_processor():
-    """Getter yang aman untuk model LayoutLM."""
-    if MODEL is None or PROCESSOR is None:
-        load_model()
-    return MODEL, PROCESSOR
-
 def get_indobert_model_and_tokenizer():
     """Getter yang aman untuk model IndoBERT."""
     if BRAIN_MODEL is None or BRAIN_TOKENIZER is None:
         load_brain_model()
     return BRAIN_MODEL, BRAIN_TOKENIZER
 
-# --- Fungsi Utilitas & Analisis (Tidak Berubah) ---
-
-# Di dalam backend/konteks_extractor.py
-
-# Di dalam backend/konteks_extractor.py
-
-# Di dalam backend/konteks_extractor.py
-
-# Di dalam backend/konteks_extractor.py
-
-def analisis_halaman_dengan_layoutlmv3(image: Image.Image) -> dict:
+def siapkan_input_layoutlmv3(image: Image.Image, data_ocr: dict = None) -> dict:
     """
-    Menganalisis gambar halaman menggunakan LayoutLMv3.
-    Versi "Manual OCR" untuk bypass masalah processor.
+    Menyiapkan input LayoutLMv3 untuk satu halaman tanpa padding: satu atau beberapa
+    jendela hasil tokenisasi (list) beserta word_ids-nya, dan pixel_values halaman.
+    Mengembalikan None jika OCR gagal atau halaman tidak berisi kata.
+    `data_ocr` (dari ArtefakDokumen) dipakai jika sudah ada, agar Tesseract tidak
+    dijalankan ulang untuk halaman yang sudah di-OCR di tahap ekstraksi.
+
+    Dengan LAYOUTLM_MODE_JENDELA aktif, halaman yang lebih panjang dari 512 token dipecah
+    menjadi jendela yang saling tumpang tindih sebanyak LAYOUTLM_STRIDE token, sehingga
+    kata di bagian bawah halaman padat tidak terpotong diam-diam.
     """
-    model, processor = get_layoutlm_model_and_processor()
-    
-    print("   - Langkah 1/2: Menjalankan OCR manual dengan Pytesseract...")
-    
-    # --- PERBAIKAN FINAL: LAKUKAN OCR SECARA MANUAL ---
-    # Kita panggil pytesseract langsung, yang sudah terbukti bekerja.
-    # 'image_to_data' memberikan kita teks beserta koordinat bounding box-nya.
-    try:
-        ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-        
-        words = []
-        boxes = []
-        # Proses output dari pytesseract untuk mendapatkan 'words' dan 'boxes'
-        for i in range(len(ocr_data["text"])):
-            # Hanya ambil kata yang memiliki confidence score dan bukan string kosong
-            if int(ocr_data["conf"][i]) > 0 and ocr_data["text"][i].strip():
-                words.append(ocr_data["text"][i])
-                
-                # Konversi format box dari (left, top, width, height) ke (x1, y1, x2, y2)
-                # dan normalisasi ke skala 1000
-                (x, y, w, h) = (ocr_data["left"][i], ocr_data["top"][i], ocr_data["width"][i], ocr_data["height"][i])
-                img_width, img_height = image.size
-                
-                x1 = int(x / img_width * 1000)
-                y1 = int(y / img_height * 1000)
-                x2 = int((x + w) / img_width * 1000)
-                y2 = int((y + h) / img_height * 1000)
-                boxes.append([x1, y1, x2, y2])
+    _, processor = get_layoutlm_model_and_processor()
 
+    try:
+        if data_ocr is None:
+            data_ocr = ocr_ke_data(image)
+        words, boxes = kata_dan_kotak_untuk_model(data_ocr)
     except Exception as e:
         print(f"[ERROR FATAL] Pytesseract manual gagal. Error: {e}")
-        return {"hasil_analisis_kontekstual": []}
+        return None
 
     if not words:
-        print("   - Peringatan: OCR manual tidak menemukan teks apa pun di halaman ini.")
-        return {"hasil_analisis_kontekstual": []}
-    # ----------------------------------------------------
+        return None
 
-    print(f"   - Langkah 2/2: Menjalankan tokenisasi dan prediksi label...")
-    # Sekarang kita berikan hasil OCR manual kita ke tokenizer
     encoding = processor.tokenizer(
         text=words,
         boxes=boxes,
-        truncation=True,        # <-- TAMBAHKAN INI
-        padding="max_length",   # <-- TAMBAHKAN INI JUGA UNTUK KONSISTENSI
-        max_length=512,         # <-- DAN TENTUKAN BATASNYA
-        return_tensors="pt"
+        truncation=True,
+        max_length=512,
+        stride=LAYOUTLM_STRIDE if LAYOUTLM_MODE_JENDELA else 0,
+        return_overflowing_tokens=LAYOUTLM_MODE_JENDELA,
     )
-    
-    pixel_values = processor.image_processor(image, return_tensors="pt").pixel_values
-    encoding["pixel_values"] = pixel_values
-    
-    device = model.device
-    encoding = {k: v.to(device) for k, v in encoding.items()}
-
-    with torch.no_grad():
-        outputs = model(**encoding)
-
-    logits = outputs.logits
-    predictions = logits.argmax(-1).squeeze().tolist()
-    
-    tokens = processor.tokenizer.convert_ids_to_tokens(encoding["input_ids"].squeeze().tolist())
-    token_boxes = encoding["bbox"].squeeze().tolist()
-
-    if not isinstance(predictions, list): predictions = [predictions]
-    if token_boxes and not isinstance(token_boxes[0], list): token_boxes = [token_boxes]
+    kunci_model = ("input_ids", "attention_mask", "bbox")
+    if LAYOUTLM_MODE_JENDELA:
+        jendela = [{k: encoding[k][i] for k in kunci_model} for i in range(len(encoding["input_ids"]))]
+        word_ids = [encoding.word_ids(i) for i in range(len(jendela))]
+    else:
+        jendela = [{k: encoding[k] for k in kunci_model}]
+        word_ids = [encoding.word_ids()]
+        if len(set(w for w in word_ids[0] if w is not None)) < len(words):
+            print(f"   - Peringatan: halaman terpotong di 512 token ({len(words)} kata), aktifkan LAYOUTLM_MODE_JENDELA.")
+
+    return {
+        "jendela": jendela,
+        "word_ids": word_ids,
+        "pixel_values": processor.image_processor(image, return_tensors="pt").pixel_values,
+    }
+
+def _gabungkan_prediksi_jendela(word_ids: list, daftar_token: list) -> list:
+    """
+    Menggabungkan prediksi beberapa jendela menjadi satu daftar token per halaman.
+    Aturan area tumpang tindih: setiap kata diambil dari jendela yang memuat seluruh
+    sub-token kata tersebut dan yang posisinya paling jauh dari tepi jendela (konteks
+    kiri-kanan paling lengkap); jika seimbang, jendela yang lebih awal dipakai.
+    """
+    if len(daftar_token) == 1:
+        return [token for _, token in daftar_token[0]]
+
+    pilihan = {}  # kata -> (jumlah sub-token, jarak ke tepi, -indeks jendela)
+    for idx_jendela, ids in enumerate(word_ids):
+        panjang = len(ids)
+        posisi_per_kata = {}
+        for pos, word_id in enumerate(ids):
+            if word_id is not None:
+                posisi_per_kata.setdefault(word_id, []).append(pos)
+        for word_id, posisi in posisi_per_kata.items():
+            jarak_tepi = min(min(p, panjang - 1 - p) for p in posisi)
+            skor = (len(posisi), jarak_tepi, -idx_jendela)
+            if word_id not in pilihan or skor > pilihan[word_id]:
+                pilihan[word_id] = skor
 
     final_tokens = []
-    for token, box, pred_id in zip(tokens, token_boxes, predictions):
-        if token in [processor.tokenizer.cls_token, processor.tokenizer.sep_token, processor.tokenizer.pad_token] or not box:
-            continue
-        
-        final_tokens.append({
-            "token": token,
-            "label": model.config.id2label[pred_id],
-            "box": [int(coord) for coord in box]
+    for word_id in sorted(pilihan):
+        idx_jendela = -pilihan[word_id][2]
+        final_tokens.extend(token for wid, token in daftar_token[idx_jendela] if wid == word_id)
+    return final_tokens
+
+def analisis_batch_dengan_layoutlmv3(daftar_input: list, model=None) -> list:
+    """
+    Menjalankan LayoutLMv3 untuk beberapa halaman (hasil siapkan_input_layoutlmv3). Semua jendela
+    dari semua halaman digabung lalu dipotong per LAYOUTLM_UKURAN_BATCH jendela untuk setiap
+    forward pass: halaman padat bisa menghasilkan banyak jendela, jadi batasnya dihitung per
+    jendela, bukan per halaman. Padding hanya sampai urutan terpanjang di dalam potongan.
+    `model` bisa diisi untuk membandingkan varian model (mis. fp32 vs int8).
+    """
+    model_global, processor = get_layoutlm_model_and_processor()
+    model = model if model is not None else model_global
+    tokenizer = processor.tokenizer
+
+    semua_jendela = [(jendela, item["pixel_values"]) for item in daftar_input for jendela in item["jendela"]]
+    ukuran_potongan = max(1, LAYOUTLM_UKURAN_BATCH)
+    input_ids, token_boxes, predictions = [], [], []
+    for awal in range(0, len(semua_jendela), ukuran_potongan):
+        potongan = semua_jendela[awal:awal + ukuran_potongan]
+        encoding = tokenizer.pad([jendela for jendela, _ in potongan], padding="longest", return_tensors="pt")
+        encoding["pixel_values"] = torch.cat([pixel_values for _, pixel_values in potongan])
+        encoding = {k: v.to(model.device) for k, v in encoding.items()}
+
+        with torch.inference_mode(), DURASI_LANGKAH.waktu(langkah="layoutlmv3_forward"):
+            predictions.extend(model(**encoding).logits.argmax(-1).tolist())
+        input_ids.extend(encoding["input_ids"].tolist())
+        token_boxes.extend(encoding["bbox"].tolist())
+
+    hasil, indeks = [], 0
+    for item in daftar_input:
+        daftar_token = []
+        for word_ids in item["word_ids"]:
+            ids, boxes, preds = input_ids[indeks], token_boxes[indeks], predictions[indeks]
+            tokens = tokenizer.convert_ids_to_tokens(ids)
+            # word_id None = token khusus (cls/sep); posisi di luar word_ids = padding
+            daftar_token.append([
+                (word_id, {"token": token, "label": model.config.id2label[pred_id], "box": [int(coord) for coord in box]})
+                for word_id, token, box, pred_id in zip(word_ids, tokens, boxes, preds)
+                if word_id is not None
+            ])
+            indeks += 1
+        hasil.append({
+            "hasil_analisis_kontekstual": _gabungkan_prediksi_jendela(item["word_ids"], daftar_token),
+            "jumlah_jendela": len(item["jendela"]),
         })
+    return hasil
+
+def get_batcher_layoutlmv3() -> PenggabungBatch:
+    """Getter singleton penggabung batch LayoutLMv3 (dipakai bersama oleh semua worker AI)."""
+    global _BATCHER_MATA
+    with _LOCK_MUAT_MODEL:
+        if _BATCHER_MATA is None:
+            _BATCHER_MATA = PenggabungBatch(
+                analisis_batch_dengan_layoutlmv3,
+                ukuran_batch=LAYOUTLM_UKURAN_BATCH,
+                maks_tunggu_ms=LAYOUTLM_MAKS_TUNGGU_MS,
+                nama="layoutlmv3",
+            )
+        return _BATCHER_MATA
+
+def analisis_halaman_dengan_layoutlmv3(image: Image.Image, data_ocr: dict = None) -> dict:
+    """Menganalisis satu gambar halaman menggunakan LayoutLMv3 dengan "Manual OCR"."""
+    input_halaman = siapkan_input_layoutlmv3(image, data_ocr)
+    if input_halaman is None:
+        print("   - Peringatan: OCR manual tidak menemukan teks apa pun di halaman ini.")
+        return {"hasil_analisis_kontekstual": []}
+    return get_batcher_layoutlmv3().submit(input_halaman).result()
 
-    print(f"   - Ekstraksi selesai, {len(final_tokens)} token ditemukan.")
-    
-    return {"hasil_analisis_kontekstual": final_tokens}
+def _teks_input_flan_t5(final_entities: list) -> str:
+    prefix = "Translate from Indonesian to JSON: "
+    input_lines = [f"teks: \"{entity['text']}\" box: {entity['box']}" for entity in final_entities]
+    return prefix + "\n".join(input_lines)
 
-def visualisasikan_hasil_analisis(image: Image.Image, hasil_analisis: dict) -> Image.Image:
-    # ... (fungsi ini tidak perlu diubah)
-    pass # Placeholder, asumsikan kode lengkap sudah ada di file Anda
\ No newline at end of file
+def _batas_token_keluaran(jumlah_entitas: int) -> int:
+    if FLAN_T5_TOKEN_PER_ENTITAS <= 0:
+        return 512
+    return min(512, FLAN_T5_TOKEN_DASAR + FLAN_T5_TOKEN_PER_ENTITAS * jumlah_entitas)
+
+def parse_keluaran_flan_t5(predicted_json_string: str) -> dict:
+    """Mengubah teks keluaran FLAN-T5 menjadi dict; selalu mengembalikan dict."""
+    # Perbaiki format JSON yang mungkin tidak sempurna
+    potential_json = f"{{{predicted_json_string}}}"
+    try:
+        hasil = json.loads(potential_json)
+    except json.JSONDecodeError:
+        mulai = time.perf_counter()
+        try:
+            hasil = json.loads(repair_json(potential_json))
+        except Exception:
+            hasil = None
+        DURASI_LANGKAH.amati(time.perf_counter() - mulai, langkah="perbaikan_json")
+        PERBAIKAN_JSON.tambah(hasil="berhasil" if isinstance(hasil, dict) else "gagal")
+    if not isinstance(hasil, dict):
+        return {"error": "Gagal menghasilkan JSON valid.", "raw_output": predicted_json_string}
+    return hasil
+
+def tata_ulang_batch_dengan_flan_t5(daftar_entitas: list, model=None, strategi: str = None) -> list:
+    """
+    Menata ulang entitas beberapa halaman sekaligus. Halaman diurutkan menurut panjang
+    input lalu dipotong per FLAN_T5_UKURAN_BATCH agar padding di tiap batch minimal;
+    hasil dikembalikan sesuai urutan `daftar_entitas`.
+    """
+    model = model if model is not None else MODEL_OTAK
+    opsi_dekode = STRATEGI_DEKODE_FLAN_T5[strategi or FLAN_T5_STRATEGI]
+    hasil = [None] * len(daftar_entitas)
+
+    antrian = []
+    for indeks, entitas in enumerate(daftar_entitas):
+        if entitas:
+            antrian.append((indeks, _teks_input_flan_t5(entitas), len(entitas)))
+        else:
+            hasil[indeks] = {"error": "Tidak ada entitas untuk diproses."}
+    antrian.sort(key=lambda item: len(item[1]))
+
+    for mulai in range(0, len(antrian), max(1, FLAN_T5_UKURAN_BATCH)):
+        batch = antrian[mulai:mulai + max(1, FLAN_T5_UKURAN_BATCH)]
+        # T5 adalah encoder-decoder: padding kanan pada encoder aman selama attention_mask
+        # ikut dikirim, dan decoder selalu mulai dari token awal yang sama untuk semua baris.
+        inputs = TOKENIZER_OTAK(
+            [teks for _, teks, _ in batch], max_length=512, truncation=True,
+            padding="longest", return_tensors="pt"
+        ).to(model.device)
+        batas_token = max(_batas_token_keluaran(jumlah) for _, _, jumlah in batch)
+        opsi_panjang = {"max_new_tokens": batas_token} if batas_token < 512 else {"max_length": 512}
+
+        with torch.inference_mode(), DURASI_LANGKAH.waktu(langkah="flan_t5_generate"):
+            output_ids = model.generate(
+                input_ids=inputs.input_ids, attention_mask=inputs.attention_mask,
+                **opsi_panjang, **opsi_dekode
+            )
+        for (indeks, _, _), teks_keluaran in zip(batch, TOKENIZER_OTAK.batch_decode(output_ids, skip_special_tokens=True)):
+            hasil[indeks] = parse_keluaran_flan_t5(teks_keluaran)
+    return hasil
+
+def tata_ulang_dengan_flan_t5(final_entities: list, model=None) -> dict:
+    """Menggunakan FLAN-T5 untuk menata ulang entitas menjadi struktur JSON."""
+    return tata_ulang_batch_dengan_flan_t5([final_entities], model=model)[0]
@@ -1,32 +1,56 @@
 # backend/main.py (Versi FINAL Lengkap untuk Codespaces)
 
 import os
-import shutil
 import json
 import glob
 import sys
 import uuid
-import httpx
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import List
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-
-# Impor untuk tugas-tugas dasar (non-AI)
-from ekstraksi_pdf import ekstrak_aset_terstruktur, simpan_hasil_ke_disk
-from validasi_foto import proses_validasi_dengan_petunjuk
-
-# Impor dari engine AI kita
-from ai_engine import run_ai_pipeline
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+# Alur pemrosesan sesi (ekstraksi -> AI -> validasi foto)
+from pipeline_proyek import proses_sesi, INPUT_PDF_DIR, OUTPUT_EKSTRAKSI_DIR, MODE_LAYANAN, MODE_EKSTRAKSI_SAJA
+
+# Executor AI in-process & manajer job asinkron
+# torch/transformers baru diimpor oleh executor AI saat model dimuat, bukan saat modul ini diimpor
+from executor_ai import shutdown_executor_ai, muat_model_ai, status_model_ai, kedalaman_antrian_ai
+from penjadwal_batch import shutdown_pool_cpu
+from antrian_job import ManajerJob
+from cache_hasil import get_cache_hasil
+from indeks_master import siapkan_indeks_master
+from ingest_upload import terima_upload_pdf, UploadDitolakError, SKEMA_OPENAPI_UPLOAD
+from metrik_layanan import DURASI_TAHAP, daftarkan_gauge, render_teks_prometheus
+from profil_permintaan import SesiProfil, span_jejak, PROFIL_DIIZINKAN
+
+# 1 = model dimuat dan dipanaskan saat aplikasi start (di latar belakang; pantau lewat /ready),
+# 0 = dimuat saat upload pertama seperti semula. Tidak berlaku untuk MODE_LAYANAN=ekstraksi_saja.
+AI_MUAT_SAAT_STARTUP = os.environ.get("AI_MUAT_SAAT_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Migrasi indeks master lama dan pengisian hash fotonya bisa lama; dijalankan di thread
+    # agar tidak menahan event loop (permintaan pertama tetap bisa langsung diproses)
+    asyncio.get_running_loop().run_in_executor(None, siapkan_indeks_master)
+    if AI_MUAT_SAAT_STARTUP and not MODE_EKSTRAKSI_SAJA:
+        # Tidak ditunggu: server sudah bisa menjawab /ready (503) selama model dimuat
+        asyncio.get_running_loop().run_in_executor(None, muat_model_ai)
+    yield
+    shutdown_executor_ai()
+    shutdown_pool_cpu()
 
 # --- Konfigurasi Aplikasi FastAPI ---
 app = FastAPI(
     title="Sistem Validasi Laporan Otomatis",
     version="5.0.0-codespaces-stable",
-    description="API dengan arsitektur self-calling yang dioptimalkan untuk Codespaces.",
+    description="API dengan executor AI in-process yang dioptimalkan untuk Codespaces.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -37,134 +61,170 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- Pengaturan Path & Variabel Global ---
-DATA_DIR = Path("data")
-INPUT_PDF_DIR = DATA_DIR / "input_pdf"
-OUTPUT_EKSTRAKSI_DIR = DATA_DIR / "output_ekstraksi"
-SISTEM_VALIDASI_DIR = DATA_DIR / "sistem_validasi"
-PATH_MASTER_INDEX = SISTEM_VALIDASI_DIR / "master_index.json"
+# --- Variabel Global ---
+EKSTENSI_GAMBAR = ["jpg", "jpeg", "png", "bmp"]
 
-INPUT_PDF_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUT_EKSTRAKSI_DIR.mkdir(parents=True, exist_ok=True)
-SISTEM_VALIDASI_DIR.mkdir(parents=True, exist_ok=True)
+manajer_job = ManajerJob()
 
-EKSTENSI_GAMBAR = ["jpg", "jpeg", "png", "bmp"]
+# --- Metrik yang dibaca saat /metrics di-scrape ---
+STATUS_MODEL_DIKENAL = ("belum_dimuat", "memuat", "siap", "gagal")
+
+def _metrik_status_model() -> dict:
+    status = status_model_ai()["status"]
+    return {(s,): int(s == status) for s in STATUS_MODEL_DIKENAL}
 
-# --- Model Data untuk Endpoint AI ---
-class AIRequest(BaseModel):
-    pdf_path: str
-    original_filename: str
+def _metrik_cache() -> dict:
+    cache = get_cache_hasil()
+    if cache is None:
+        return None
+    return {
+        (tingkat, hasil): data.get(hasil, 0)
+        for tingkat, data in cache.statistik()["tingkat"].items() for hasil in ("hit", "miss")
+    }
+
+daftarkan_gauge("validasi_job", "Jumlah job asinkron per status (MENUNGGU, BERJALAN).",
+                lambda: {(status,): n for status, n in manajer_job.jumlah_per_status().items()}, label=("status",))
+daftarkan_gauge("validasi_antrian_ai", "Kedalaman antrian AI: pekerjaan di executor dan halaman yang menunggu batch LayoutLMv3.",
+                kedalaman_antrian_ai, label=("antrian",))
+daftarkan_gauge("validasi_model_status", "Status pemuatan model AI (1 untuk status saat ini).", _metrik_status_model, label=("status",))
+daftarkan_gauge("validasi_cache_total", "Hit/miss cache hasil per tingkat (mencakup proses worker).",
+                _metrik_cache, label=("tingkat", "hasil"), jenis="counter")
 
 # --- Fungsi Helper ---
 def buat_id_sesi():
     return datetime.now().strftime("%Y%m%d-%H%M%S") + "_" + str(uuid.uuid4())[:8]
 
+def _profil_diminta(request: Request) -> bool:
+    """Profil per permintaan: header `X-Profil: 1` atau query `?profil=1`."""
+    if not PROFIL_DIIZINKAN:
+        return False
+    nilai = request.headers.get("x-profil") or request.query_params.get("profil") or ""
+    return nilai.lower() in ("1", "true", "ya")
+
+async def _tulis_profil(profil: SesiProfil, id_sesi: str, daftar_pdf: List[Tuple[Path, str]], nama_folder_per_file: Dict[str, str]) -> dict:
+    daftar_proyek = [(nama, nama_folder_per_file.get(str(path), nama)) for path, nama in daftar_pdf]
+    return await run_in_threadpool(profil.selesai_dan_tulis, OUTPUT_EKSTRAKSI_DIR / id_sesi, daftar_proyek)
+
+async def _simpan_upload_ke_disk(id_sesi: str, request: Request) -> Tuple[List[Tuple[Path, str]], Dict[str, str], Dict[str, str]]:
+    """
+    Body upload ditulis langsung ke INPUT_PDF_DIR sambil di-hash (sekali tulis per byte).
+    Mengembalikan daftar (path, nama file asli), SHA-256 per path, dan nama folder proyek per
+    path (nama file berawalan indeks, agar file bernama sama dalam satu upload tidak berbagi folder).
+    """
+    try:
+        with DURASI_TAHAP.waktu(tahap="upload"):
+            daftar_file = await terima_upload_pdf(request, INPUT_PDF_DIR, id_sesi)
+    except UploadDitolakError as e:
+        raise HTTPException(status_code=e.kode_status, detail=str(e))
+    daftar_pdf = [(file.path_akhir, file.nama_file) for file in daftar_file]
+    sha256_per_file = {str(file.path_akhir): file.sha256 for file in daftar_file}
+    nama_folder_per_file = {str(file.path_akhir): file.nama_proyek for file in daftar_file}
+    return daftar_pdf, sha256_per_file, nama_folder_per_file
+
 # --- Endpoint-Endpoint API ---
 
 @app.get("/", tags=["Status"])
 async def root():
-    return {"message": "API Validasi Laporan Aktif (Arsitektur Self-Calling)."}
-
-@app.post("/internal/run_ai", tags=["Internal"], include_in_schema=False)
-async def run_ai_endpoint(request: AIRequest):
+    return {"message": "API Validasi Laporan Aktif (Executor AI In-Process)."}
+
+@app.get("/ready", tags=["Status"])
+async def kesiapan():
+    """Status pemuatan model; 200 jika model sudah dimuat dan dipanaskan, 503 jika belum."""
+    if MODE_EKSTRAKSI_SAJA:
+        return {"status": "tidak_dipakai", "mode_layanan": MODE_LAYANAN}
+    status = status_model_ai()
+    return JSONResponse(status_code=200 if status["status"] == "siap" else 503, content={**status, "mode_layanan": MODE_LAYANAN})
+
+@app.get("/metrics", tags=["Status"], response_class=PlainTextResponse)
+async def metrik_prometheus():
+    """Metrik dalam format teks Prometheus: latensi per tahap/langkah, counter, dan gauge antrian."""
+    # Beberapa gauge membaca SQLite (statistik cache), jadi dirender di luar event loop
+    teks = await run_in_threadpool(render_teks_prometheus)
+    return PlainTextResponse(teks, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/upload_and_validate", tags=["Proses Utama"], openapi_extra=SKEMA_OPENAPI_UPLOAD)
+async def upload_and_validate_multiple_pdfs(request: Request):
+    """
+    Dengan header `X-Profil: 1` atau `?profil=1`, permintaan ini diprofil: folded stacks dan
+    jejak span ditulis ke folder sesi dan lokasinya dilaporkan di field "profil".
+    """
+    id_sesi = buat_id_sesi()
+    profil = SesiProfil().mulai() if _profil_diminta(request) else None
+    daftar_pdf, nama_folder_per_file = [], {}
     try:
-        hasil_ai = run_ai_pipeline(request.pdf_path, request.original_filename)
-        return JSONResponse(status_code=200, content=hasil_ai)
-    except Exception as e:
-        print(f"[ERROR di AI Endpoint] {e}")
-        raise HTTPException(status_code=500, detail=f"AI pipeline failed: {str(e)}")
-
-@app.post("/upload_and_validate", tags=["Proses Utama"])
-async def upload_and_validate_multiple_pdfs(request: Request, files: List[UploadFile] = File(...)):
+        with span_jejak(profil and profil.jejak, "upload"):
+            daftar_pdf, sha256_per_file, nama_folder_per_file = await _simpan_upload_ke_disk(id_sesi, request)
+        laporan_sesi_keseluruhan = await proses_sesi(
+            id_sesi, daftar_pdf, sha256_per_file=sha256_per_file, perekam=profil and profil.jejak,
+            nama_folder_per_file=nama_folder_per_file
+        )
+    finally:
+        # Permintaan yang gagal justru yang paling perlu diprofil, jadi profil tetap ditulis
+        info_profil = await _tulis_profil(profil, id_sesi, daftar_pdf, nama_folder_per_file) if profil else None
+    if info_profil:
+        laporan_sesi_keseluruhan["profil"] = {"folder_sesi": id_sesi, **info_profil}
+    return JSONResponse(status_code=200, content=laporan_sesi_keseluruhan)
+
+# --- Mode Job Asinkron ---
+
+@app.post("/jobs", tags=["Job Asinkron"], status_code=202, openapi_extra=SKEMA_OPENAPI_UPLOAD)
+async def buat_job_validasi(request: Request):
+    """Menyimpan file lalu langsung mengembalikan id job; pemrosesan berjalan di latar belakang."""
     id_sesi = buat_id_sesi()
-    path_sesi_output = OUTPUT_EKSTRAKSI_DIR / id_sesi
-    
-    # --- BLOK CERDAS UNTUK MENDETEKSI URL CODESPACE ---
-    codespace_name = os.environ.get("CODESPACE_NAME")
-    forwarding_domain = os.environ.get("GITHUB_CODESPACES_PORT_FORWARDING_DOMAIN")
-    
-    if codespace_name and forwarding_domain:
-        # Kita berada di dalam Codespace, bangun URL publiknya untuk port 8000
-        base_url = f"https://{codespace_name}-8000.{forwarding_domain}"
+    daftar_pdf, sha256_per_file, nama_folder_per_file = await _simpan_upload_ke_disk(id_sesi, request)
+    job = manajer_job.buat_job([nama_file for _, nama_file in daftar_pdf])
+    if _profil_diminta(request):
+        async def fungsi_kerja(kirim_event):
+            # Profil dimulai saat job benar-benar berjalan, bukan selama menunggu di antrian
+            profil = SesiProfil().mulai()
+            try:
+                hasil = await proses_sesi(
+                    id_sesi, daftar_pdf, kirim_event, sha256_per_file, perekam=profil.jejak,
+                    nama_folder_per_file=nama_folder_per_file
+                )
+            finally:
+                info_profil = await _tulis_profil(profil, id_sesi, daftar_pdf, nama_folder_per_file)
+            return {**hasil, "profil": {"folder_sesi": id_sesi, **info_profil}}
     else:
-        # Jika tidak, gunakan URL dari request (untuk saat dijalankan di lokal/GCP)
-        base_url = str(request.base_url).rstrip('/')
-    
-    internal_ai_url = f"{base_url}/internal/run_ai"
-    # ----------------------------------------------------
-
-    laporan_sesi_keseluruhan = {"id_sesi": id_sesi, "proyek_yang_diproses": []}
-    indeks_master = {}
-    if PATH_MASTER_INDEX.exists():
-        with open(PATH_MASTER_INDEX, "r", encoding="utf-8") as f:
-            indeks_master = json.load(f)
-
-    for idx, file in enumerate(files, 1):
-        nama_proyek_folder = Path(file.filename).stem
-        path_proyek_output = path_sesi_output / nama_proyek_folder
-        temp_pdf_path = INPUT_PDF_DIR / f"{id_sesi}_{file.filename}"
-
-        print(f"\n--- Memproses Proyek {idx}/{len(files)}: {file.filename} ---")
-        
-        try:
-            with open(temp_pdf_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            laporan_proyek_final = {}
-
-            print("[Tahap 1/3] Memulai ekstraksi aset dasar...")
-            data_mentah = ekstrak_aset_terstruktur(str(temp_pdf_path))
-            if not data_mentah: raise Exception("Ekstraksi aset dasar gagal.")
-            hasil_ekstraksi = simpan_hasil_ke_disk(data_mentah, str(path_proyek_output))
-            laporan_proyek_final["hasil_ekstraksi_dasar"] = hasil_ekstraksi
-            print("[Tahap 1/3] Ekstraksi aset dasar selesai.")
-
-            print(f"[Tahap 2/3] Memanggil endpoint AI internal di: {internal_ai_url}...")
-            ai_payload = {"pdf_path": str(temp_pdf_path.resolve()), "original_filename": file.filename}
-            
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                response = await client.post(internal_ai_url, json=ai_payload)
-                response.raise_for_status()
-                hasil_ai = response.json()
-            
-            laporan_proyek_final["hasil_pemrosesan_ai"] = hasil_ai
-            print("[Tahap 2/3] Endpoint AI selesai.")
-
-            print("[Tahap 3/3] Memulai validasi duplikasi foto...")
-            list_gambar_absolut = [str(Path(p["path"]).resolve()) for h in hasil_ekstraksi.get("hasil_per_halaman", []) for p in h.get("path_gambar", [])]
-            
-            hasil_validasi_foto = proses_validasi_dengan_petunjuk(list_gambar_proyek=list_gambar_absolut, indeks_master=indeks_master, nama_proyek=file.filename, path_sesi=str(path_sesi_output))
-            laporan_proyek_final["validasi_duplikasi_foto"] = hasil_validasi_foto
-            print(f"[Tahap 3/3] Validasi foto selesai.")
-            
-            path_laporan_proyek = path_proyek_output / "laporan_validasi_proyek.json"
-            with open(path_laporan_proyek, "w", encoding="utf-8") as f:
-                json.dump(laporan_proyek_final, f, indent=4, ensure_ascii=False)
-            
-            laporan_sesi_keseluruhan["proyek_yang_diproses"].append({
-                "nama_file": file.filename,
-                "status_keseluruhan": "BERHASIL" # Asumsi berhasil jika tidak ada error
-            })
-
-        except httpx.HTTPStatusError as e:
-            print(f"\n[ERROR FATAL] Panggilan ke endpoint AI internal gagal: {e.response.status_code}\n   - Detail: {e.response.text}")
-            laporan_sesi_keseluruhan["proyek_yang_diproses"].append({"nama_file": file.filename, "status_keseluruhan": "ERROR_ENDPOINT_AI"})
-            continue
-        except Exception as e:
-            print(f"\n[ERROR] Gagal memproses {file.filename}: {e}")
-            laporan_sesi_keseluruhan["proyek_yang_diproses"].append({"nama_file": file.filename, "status_keseluruhan": f"ERROR_{type(e).__name__}"})
-            continue
-        finally:
-            if temp_pdf_path.exists():
-                os.remove(temp_pdf_path)
-
-    path_laporan_sesi = path_sesi_output / "laporan_sesi_keseluruhan.json"
-    with open(path_laporan_sesi, "w", encoding="utf-8") as f:
-        json.dump(laporan_sesi_keseluruhan, f, indent=4, ensure_ascii=False)
-    
-    with open(PATH_MASTER_INDEX, "w", encoding="utf-8") as f:
-        json.dump(indeks_master, f, indent=4, ensure_ascii=False)
-    
-    print("\n" + "="*50 + "\nSesi keseluruhan selesai.\n" + "="*50 + "\n")
-
-    return JSONResponse(status_code=200, content=laporan_sesi_keseluruhan)
\ No newline at end of file
+        fungsi_kerja = lambda kirim_event: proses_sesi(
+            id_sesi, daftar_pdf, kirim_event, sha256_per_file, nama_folder_per_file=nama_folder_per_file
+        )
+    manajer_job.jalankan(job, fungsi_kerja)
+    return {
+        "id_job": job.id_job,
+        "id_sesi": id_sesi,
+        "status": job.status,
+        "posisi_antrian": manajer_job.posisi_antrian(job),
+        "url_status": f"/jobs/{job.id_job}",
+        "url_event": f"/jobs/{job.id_job}/events",
+    }
+
+def _ambil_job_atau_404(id_job: str):
+    job = manajer_job.ambil_job(id_job)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {id_job} tidak ditemukan.")
+    return job
+
+@app.get("/jobs/{id_job}", tags=["Job Asinkron"])
+async def status_job(id_job: str):
+    job = _ambil_job_atau_404(id_job)
+    return job.ke_dict(posisi_antrian=manajer_job.posisi_antrian(job))
+
+@app.get("/jobs/{id_job}/events", tags=["Job Asinkron"])
+async def stream_event_job(id_job: str, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events: status job dan progres per halaman/gambar."""
+    job = _ambil_job_atau_404(id_job)
+    mulai_dari = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        manajer_job.stream_event(job, mulai_dari),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/cache/statistik", tags=["Status"])
+async def statistik_cache():
+    """Hit/miss dan ukuran cache hasil per tingkat (dokumen, OCR halaman, AI halaman)."""
+    cache = get_cache_hasil()
+    if cache is None:
+        return {"aktif": False}
+    return {"aktif": True, **await run_in_threadpool(cache.statistik)}
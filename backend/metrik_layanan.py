@@ -0,0 +1,233 @@
+# backend/metrik_layanan.py
+# Metrik layanan dalam format teks Prometheus (endpoint /metrics), tanpa dependensi tambahan.
+# Semua metrik didefinisikan di sini agar proses induk dan proses worker pool CPU (spawn)
+# memakai nama yang sama: worker mencatat di registri lokalnya, lalu selisihnya dikirim ke
+# induk lewat saluran progres (lihat penjadwal_batch) dan digabungkan dengan gabungkan_delta.
+# Mencatat satu nilai hanya berupa beberapa operasi dict di bawah lock, jadi aman dipakai
+# di loop per halaman.
+
+import os
+import math
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# 0 = semua pencatatan menjadi no-op (endpoint /metrics tetap ada, nilainya tidak bertambah)
+METRIK_AKTIF = os.environ.get("METRIK_AKTIF", "1") == "1"
+
+BUCKET_TAHAP_DETIK = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BUCKET_LANGKAH_DETIK = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_REGISTRI: Dict[str, "_Metrik"] = {}
+
+
+def _escape_label(nilai) -> str:
+    return str(nilai).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_label(nama_label: Tuple[str, ...], nilai_label: Tuple[str, ...], le: float = None) -> str:
+    bagian = [f'{n}="{_escape_label(v)}"' for n, v in zip(nama_label, nilai_label)]
+    if le is not None:
+        bagian.append(f'le="{_format_angka(le)}"')
+    return "{" + ",".join(bagian) + "}" if bagian else ""
+
+
+def _format_angka(nilai: float) -> str:
+    if math.isinf(nilai):
+        return "+Inf" if nilai > 0 else "-Inf"
+    return repr(float(nilai)) if not float(nilai).is_integer() else str(int(nilai))
+
+
+class _Metrik:
+    jenis = "untyped"
+
+    def __init__(self, nama: str, bantuan: str, label: Iterable[str] = ()):
+        self.nama = nama
+        self.bantuan = bantuan
+        self.label = tuple(label)
+        self._nilai: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _REGISTRI[nama] = self
+
+    def _kunci(self, label: dict) -> Tuple[str, ...]:
+        return tuple(label.get(n, "") for n in self.label)
+
+    def baris_teks(self) -> List[str]:
+        raise NotImplementedError
+
+    def ambil_delta(self) -> dict:
+        """Nilai yang terkumpul sejak pemanggilan terakhir, lalu registri lokal dikosongkan."""
+        with self._lock:
+            nilai, self._nilai = self._nilai, {}
+        return nilai
+
+
+class Counter(_Metrik):
+    jenis = "counter"
+
+    def tambah(self, jumlah: float = 1, **label):
+        if not METRIK_AKTIF:
+            return
+        kunci = self._kunci(label)
+        with self._lock:
+            self._nilai[kunci] = self._nilai.get(kunci, 0) + jumlah
+
+    def gabungkan(self, delta: dict):
+        with self._lock:
+            for kunci, jumlah in delta.items():
+                self._nilai[kunci] = self._nilai.get(kunci, 0) + jumlah
+
+    def baris_teks(self) -> List[str]:
+        with self._lock:
+            salinan = dict(self._nilai)
+        return [f"{self.nama}{_format_label(self.label, k)} {_format_angka(v)}" for k, v in sorted(salinan.items())]
+
+
+class Histogram(_Metrik):
+    jenis = "histogram"
+
+    def __init__(self, nama: str, bantuan: str, label: Iterable[str] = (), batas: Iterable[float] = BUCKET_LANGKAH_DETIK):
+        super().__init__(nama, bantuan, label)
+        self.batas = tuple(sorted(batas))
+
+    def amati(self, nilai: float, **label):
+        if not METRIK_AKTIF:
+            return
+        kunci = self._kunci(label)
+        # Bucket disimpan tidak kumulatif ([jumlah per bucket..., +Inf], total, cacah) dan
+        # baru dijumlahkan saat dirender
+        indeks = bisect_left(self.batas, nilai)
+        with self._lock:
+            data = self._nilai.get(kunci)
+            if data is None:
+                data = self._nilai[kunci] = [[0] * (len(self.batas) + 1), 0.0, 0]
+            data[0][indeks] += 1
+            data[1] += nilai
+            data[2] += 1
+
+    def waktu(self, **label) -> "_Stopwatch":
+        """Context manager: `with HISTOGRAM.waktu(langkah="render"): ...`"""
+        return _Stopwatch(self, label)
+
+    def gabungkan(self, delta: dict):
+        with self._lock:
+            for kunci, (bucket, total, cacah) in delta.items():
+                data = self._nilai.get(kunci)
+                if data is None:
+                    data = self._nilai[kunci] = [[0] * (len(self.batas) + 1), 0.0, 0]
+                data[0] = [a + b for a, b in zip(data[0], bucket)]
+                data[1] += total
+                data[2] += cacah
+
+    def baris_teks(self) -> List[str]:
+        with self._lock:
+            salinan = {k: (list(v[0]), v[1], v[2]) for k, v in self._nilai.items()}
+        baris = []
+        for kunci, (bucket, total, cacah) in sorted(salinan.items()):
+            kumulatif = 0
+            for batas, jumlah in zip(self.batas + (math.inf,), bucket):
+                kumulatif += jumlah
+                baris.append(f"{self.nama}_bucket{_format_label(self.label, kunci, le=batas)} {kumulatif}")
+            baris.append(f"{self.nama}_sum{_format_label(self.label, kunci)} {_format_angka(total)}")
+            baris.append(f"{self.nama}_count{_format_label(self.label, kunci)} {cacah}")
+        return baris
+
+
+class _Stopwatch:
+    __slots__ = ("histogram", "label", "mulai")
+
+    def __init__(self, histogram: Histogram, label: dict):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.mulai = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.amati(time.perf_counter() - self.mulai, **self.label)
+
+
+class MetrikFungsi(_Metrik):
+    """
+    Nilai dibaca saat scrape dari `fungsi()` (angka, atau dict {tuple nilai label: angka}),
+    sehingga tidak ada biaya apa pun di jalur pemrosesan. Dipakai untuk gauge antrian/status
+    dan counter yang sumber datanya sudah ada di tempat lain (mis. statistik cache).
+    """
+
+    def __init__(self, nama: str, bantuan: str, fungsi: Callable[[], object], label: Iterable[str] = (), jenis: str = "gauge"):
+        super().__init__(nama, bantuan, label)
+        self.fungsi = fungsi
+        self.jenis = jenis
+
+    def baris_teks(self) -> List[str]:
+        try:
+            nilai = self.fungsi()
+        except Exception as e:
+            print(f"[PERINGATAN] Metrik {self.nama} gagal dibaca: {e}")
+            return []
+        if nilai is None:
+            return []
+        if not isinstance(nilai, dict):
+            nilai = {(): nilai}
+        return [f"{self.nama}{_format_label(self.label, k)} {_format_angka(v)}" for k, v in sorted(nilai.items())]
+
+    def ambil_delta(self) -> dict:
+        return {}
+
+
+def daftarkan_gauge(nama: str, bantuan: str, fungsi: Callable[[], object], label: Iterable[str] = (), jenis: str = "gauge") -> MetrikFungsi:
+    return MetrikFungsi(nama, bantuan, fungsi, label, jenis)
+
+
+def ambil_delta() -> dict:
+    """Dipanggil di proses worker: {nama_metrik: delta} yang belum dikirim ke induk."""
+    hasil = {}
+    for nama, metrik in list(_REGISTRI.items()):
+        delta = metrik.ambil_delta()
+        if delta:
+            hasil[nama] = delta
+    return hasil
+
+
+def gabungkan_delta(delta: dict):
+    """Dipanggil di proses induk untuk delta dari worker."""
+    for nama, nilai in delta.items():
+        metrik = _REGISTRI.get(nama)
+        if metrik is not None and hasattr(metrik, "gabungkan"):
+            metrik.gabungkan(nilai)
+
+
+def render_teks_prometheus() -> str:
+    """Seluruh registri dalam format eksposisi teks Prometheus 0.0.4."""
+    baris = []
+    for metrik in list(_REGISTRI.values()):
+        baris.append(f"# HELP {metrik.nama} {metrik.bantuan}")
+        baris.append(f"# TYPE {metrik.nama} {metrik.jenis}")
+        baris.extend(metrik.baris_teks())
+    return "\n".join(baris) + "\n"
+
+
+# --- Definisi metrik ---
+
+DURASI_TAHAP = Histogram(
+    "validasi_tahap_durasi_detik",
+    "Durasi per tahap per file: upload, ekstraksi, ai (termasuk menunggu executor), run_ai_pipeline, ocr_foto, validasi_foto.",
+    label=("tahap",), batas=BUCKET_TAHAP_DETIK,
+)
+DURASI_LANGKAH = Histogram(
+    "validasi_langkah_durasi_detik",
+    "Durasi langkah di loop halaman/gambar: render, tesseract, ocr_foto dan cari_indeks per halaman/foto; "
+    "layoutlmv3_forward dan flan_t5_generate per batch; perbaikan_json per keluaran yang harus diperbaiki.",
+    label=("langkah",), batas=BUCKET_LANGKAH_DETIK,
+)
+HALAMAN = Counter("validasi_halaman_total", "Jumlah halaman yang diproses, per tahap (ekstraksi, ai).", label=("tahap",))
+GAMBAR = Counter("validasi_gambar_total", "Jumlah gambar yang diekstrak dari PDF (unik per dokumen).")
+FOTO_DUPLIKAT = Counter("validasi_foto_duplikat_total", "Jumlah foto yang cocok dengan foto lain di indeks master.")
+PERBAIKAN_JSON = Counter(
+    "validasi_perbaikan_json_total",
+    "Keluaran FLAN-T5 yang bukan JSON valid dan harus lewat json_repair, per hasil (berhasil, gagal).",
+    label=("hasil",),
+)
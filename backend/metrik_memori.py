@@ -0,0 +1,70 @@
+# backend/metrik_memori.py
+# Mengukur puncak RSS (resident set size) proses selama satu blok kode, mis. ekstraksi
+# satu dokumen di proses worker. Proses worker memproses banyak dokumen berturut-turut,
+# jadi puncak seumur proses (ru_maxrss) tidak cukup: di Linux penanda puncak (VmHWM)
+# di-reset lewat /proc/self/clear_refs sebelum blok dimulai.
+
+import os
+import sys
+
+_PATH_STATUS = "/proc/self/status"
+_PATH_CLEAR_REFS = "/proc/self/clear_refs"
+
+
+def _baca_status_kb(kunci: str):
+    try:
+        with open(_PATH_STATUS, "r") as f:
+            for baris in f:
+                if baris.startswith(kunci + ":"):
+                    return int(baris.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_puncak() -> bool:
+    try:
+        with open(_PATH_CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _ru_maxrss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    nilai = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS melaporkan byte, Linux kilobyte
+    return nilai // 1024 if sys.platform == "darwin" else nilai
+
+
+class PemantauRSSPuncak:
+    """
+    Context manager:
+        with PemantauRSSPuncak() as pantau:
+            ...
+        pantau.ke_dict()  # {"rss_awal_mb", "rss_puncak_mb", "metode"}
+    "metode" = "vmhwm" jika puncak benar-benar per blok, "ru_maxrss" jika yang tersedia
+    hanya puncak seumur proses (batas atas), atau None jika tidak bisa diukur.
+    """
+
+    def __enter__(self):
+        self.metode = "vmhwm" if _reset_puncak() else None
+        self.rss_awal_kb = _baca_status_kb("VmRSS")
+        self.rss_puncak_kb = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.metode == "vmhwm":
+            self.rss_puncak_kb = _baca_status_kb("VmHWM")
+        if self.rss_puncak_kb is None:
+            self.rss_puncak_kb = _ru_maxrss_kb()
+            self.metode = "ru_maxrss" if self.rss_puncak_kb is not None else None
+
+    def ke_dict(self) -> dict:
+        def _mb(kb):
+            return round(kb / 1024, 1) if kb is not None else None
+        return {"rss_awal_mb": _mb(self.rss_awal_kb), "rss_puncak_mb": _mb(self.rss_puncak_kb), "metode": self.metode, "pid": os.getpid()}
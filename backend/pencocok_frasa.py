@@ -0,0 +1,107 @@
+# backend/pencocok_frasa.py
+# Pencocok banyak frasa sekaligus (automaton Aho-Corasick) untuk aturan validasi.
+# Frasa dan teks dinormalisasi dengan cara yang sama seperti cek_kelengkapan_dokumen
+# semula: huruf kecil, hanya a-z dan 0-9 (spasi/tanda baca dibuang), sehingga pemecahan
+# token oleh tokenizer tidak memengaruhi hasil. Teks bisa diumpankan sepotong-sepotong
+# (per token, per halaman) tanpa pernah menyusun seluruh teks dokumen.
+
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_POLA_BUKAN_ALFANUMERIK = re.compile(r"[^a-z0-9]")
+
+
+def normalisasi_teks(teks: str) -> str:
+    return _POLA_BUKAN_ALFANUMERIK.sub("", teks.lower())
+
+
+class PencocokFrasa:
+    """
+    Automaton dibangun sekali untuk satu daftar frasa; pencarian linear terhadap panjang teks,
+    berapa pun jumlah frasanya. Pemakaian:
+        pencocok = get_pencocok_frasa(("UJI TERIMA", "BAUT"))
+        pemindai = pencocok.pemindai()
+        pemindai.umpan("Berita Acara Uji", halaman=1)
+        pemindai.umpan("Terima", halaman=1)
+        pemindai.lokasi  # {"UJI TERIMA": [1]}
+    """
+
+    def __init__(self, daftar_frasa: Iterable[str]):
+        self.daftar_frasa: List[str] = list(dict.fromkeys(daftar_frasa))
+        # Frasa yang kosong setelah normalisasi selalu dianggap ditemukan (sama seperti `"" in teks`)
+        self.frasa_kosong = [f for f in self.daftar_frasa if not normalisasi_teks(f)]
+        self._transisi: List[Dict[str, int]] = [{}]
+        self._gagal: List[int] = [0]
+        self._keluaran: List[Tuple[int, ...]] = [()]
+        for indeks, frasa in enumerate(self.daftar_frasa):
+            self._tambah(normalisasi_teks(frasa), indeks)
+        self._bangun_tautan_gagal()
+
+    def _tambah(self, frasa_normal: str, indeks: int):
+        if not frasa_normal:
+            return
+        keadaan = 0
+        for karakter in frasa_normal:
+            berikut = self._transisi[keadaan].get(karakter)
+            if berikut is None:
+                berikut = len(self._transisi)
+                self._transisi.append({})
+                self._gagal.append(0)
+                self._keluaran.append(())
+                self._transisi[keadaan][karakter] = berikut
+            keadaan = berikut
+        self._keluaran[keadaan] += (indeks,)
+
+    def _bangun_tautan_gagal(self):
+        antrian = deque(self._transisi[0].values())
+        while antrian:
+            keadaan = antrian.popleft()
+            for karakter, berikut in self._transisi[keadaan].items():
+                antrian.append(berikut)
+                gagal = self._gagal[keadaan]
+                while gagal and karakter not in self._transisi[gagal]:
+                    gagal = self._gagal[gagal]
+                kandidat = self._transisi[gagal].get(karakter, 0)
+                self._gagal[berikut] = kandidat if kandidat != berikut else 0
+                # Frasa yang merupakan akhiran frasa lain ikut dilaporkan
+                self._keluaran[berikut] += self._keluaran[self._gagal[berikut]]
+
+    def langkah(self, keadaan: int, karakter: str) -> int:
+        while keadaan and karakter not in self._transisi[keadaan]:
+            keadaan = self._gagal[keadaan]
+        return self._transisi[keadaan].get(karakter, 0)
+
+    def pemindai(self) -> "PemindaiFrasa":
+        return PemindaiFrasa(self)
+
+    def cari(self, teks: str) -> Set[str]:
+        """Himpunan frasa yang muncul di `teks` (untuk teks pendek sekali pakai)."""
+        pemindai = self.pemindai()
+        pemindai.umpan(teks)
+        return set(pemindai.lokasi)
+
+
+class PemindaiFrasa:
+    """Status pemindaian satu aliran teks. `lokasi` = {frasa: [halaman tempat frasa ditemukan]}."""
+
+    def __init__(self, pencocok: PencocokFrasa):
+        self.pencocok = pencocok
+        self.keadaan = 0
+        self.lokasi: Dict[str, List[Optional[int]]] = {frasa: [] for frasa in pencocok.frasa_kosong}
+
+    def umpan(self, teks: str, halaman: Optional[int] = None):
+        pencocok = self.pencocok
+        for karakter in normalisasi_teks(teks):
+            self.keadaan = pencocok.langkah(self.keadaan, karakter)
+            for indeks in pencocok._keluaran[self.keadaan]:
+                halaman_frasa = self.lokasi.setdefault(pencocok.daftar_frasa[indeks], [])
+                if not halaman_frasa or halaman_frasa[-1] != halaman:
+                    halaman_frasa.append(halaman)
+
+
+@lru_cache(maxsize=64)
+def get_pencocok_frasa(daftar_frasa: Tuple[str, ...]) -> PencocokFrasa:
+    """Automaton di-cache per daftar frasa (tuple), jadi setiap set aturan hanya dibangun sekali."""
+    return PencocokFrasa(daftar_frasa)
@@ -0,0 +1,179 @@
+# backend/penjadwal_batch.py
+# Pool proses untuk tahap-tahap CPU-bound (ekstraksi/OCR PDF dan OCR foto) agar beberapa
+# file dalam satu batch bisa mengalir bersamaan melewati tahap 1 -> 2 -> 3.
+# Modul ini sengaja hanya mengimpor modul ringan: worker dibuat dengan metode "spawn"
+# sehingga setiap proses worker hanya memuat yang dibutuhkan (tanpa torch/transformers).
+
+import os
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from ekstraksi_pdf import ekstrak_aset_terstruktur, simpan_hasil_ke_disk, ekstrak_dan_simpan_streaming, bagi_rentang_halaman
+from artefak_halaman import ArtefakDokumen
+from validasi_foto import ekstrak_sidik_gambar
+from metrik_layanan import ambil_delta, gabungkan_delta
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+CPU_JUMLAH_PROSES = int(os.environ.get("CPU_JUMLAH_PROSES", str(max(1, (os.cpu_count() or 2) - 1))))
+# Foto satu proyek dibagi ke beberapa tugas berisi paling banyak sekian foto, agar tersebar
+# ke semua proses di pool (300 foto / 8 = 38 tugas)
+FOTO_PER_TUGAS = int(os.environ.get("FOTO_PER_TUGAS", "8"))
+# 1 = halaman/gambar langsung ditulis ke disk saat diekstrak (memori tidak tumbuh dengan ukuran PDF);
+# 0 = mode lama, seluruh dokumen dikumpulkan di memori dulu
+EKSTRAKSI_STREAMING = os.environ.get("EKSTRAKSI_STREAMING", "1") == "1"
+# Satu PDF dibagi menjadi paling banyak sekian rentang halaman yang diekstrak di proses berbeda
+# (hanya mode streaming). Rentang tidak dibuat lebih pendek dari EKSTRAKSI_HALAMAN_MIN_PER_TUGAS
+# karena setiap proses harus membuka dan mem-parse PDF sendiri.
+EKSTRAKSI_JUMLAH_WORKER = int(os.environ.get("EKSTRAKSI_JUMLAH_WORKER", str(CPU_JUMLAH_PROSES)))
+EKSTRAKSI_HALAMAN_MIN_PER_TUGAS = int(os.environ.get("EKSTRAKSI_HALAMAN_MIN_PER_TUGAS", "4"))
+
+_POOL = None
+_SALURAN_PROGRES = None
+_CALLBACK_PROGRES: Dict[str, Callable[[str, int, int], None]] = {}
+_POOL_LOCK = threading.Lock()
+
+# Diisi di dalam proses worker oleh _inisialisasi_worker
+_SALURAN_WORKER = None
+# Penanda pesan metrik di saluran progres (pesan lain berbentuk (token, tahap, posisi, total))
+_PESAN_METRIK = "__metrik__"
+
+
+def _inisialisasi_worker(saluran_progres):
+    global _SALURAN_WORKER
+    _SALURAN_WORKER = saluran_progres
+    # Paralelisme sudah di tingkat proses; cegah Tesseract (OpenMP) membuka thread sendiri
+    # di setiap proses sehingga core CPU tidak direbutkan.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _callback_worker(token_progres: str, tahap: str):
+    """progress_callback di sisi worker: meneruskan (token, tahap, posisi, total) ke proses induk."""
+    if not token_progres or _SALURAN_WORKER is None:
+        return None
+
+    def callback(posisi: int, total: int):
+        _SALURAN_WORKER.put((token_progres, tahap, posisi, total))
+
+    return callback
+
+
+def _kirim_metrik_worker():
+    """Mengirim metrik yang dicatat worker selama satu tugas ke proses induk (satu pesan per tugas)."""
+    if _SALURAN_WORKER is None:
+        return
+    delta = ambil_delta()
+    if delta:
+        _SALURAN_WORKER.put((_PESAN_METRIK, delta))
+
+
+def _kuras_saluran_progres(saluran):
+    while True:
+        pesan = saluran.get()
+        if pesan is None:
+            return
+        if pesan[0] == _PESAN_METRIK:
+            gabungkan_delta(pesan[1])
+            continue
+        token, tahap, posisi, total = pesan
+        callback = _CALLBACK_PROGRES.get(token)
+        if callback:
+            try:
+                callback(tahap, posisi, total)
+            except Exception as e:
+                print(f"[PERINGATAN] Callback progres gagal: {e}")
+
+
+def get_pool_cpu() -> ProcessPoolExecutor:
+    """Getter singleton untuk pool proses tahap CPU-bound."""
+    global _POOL, _SALURAN_PROGRES
+    with _POOL_LOCK:
+        if _POOL is None:
+            konteks = multiprocessing.get_context("spawn")
+            _SALURAN_PROGRES = konteks.Queue()
+            _POOL = ProcessPoolExecutor(
+                max_workers=CPU_JUMLAH_PROSES,
+                mp_context=konteks,
+                initializer=_inisialisasi_worker,
+                initargs=(_SALURAN_PROGRES,),
+            )
+            threading.Thread(target=_kuras_saluran_progres, args=(_SALURAN_PROGRES,), name="progres-pool-cpu", daemon=True).start()
+            print(f"--- Pool proses CPU dibuat: {CPU_JUMLAH_PROSES} proses ---")
+        return _POOL
+
+
+def shutdown_pool_cpu():
+    global _POOL, _SALURAN_PROGRES
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _SALURAN_PROGRES.put(None)
+            _POOL, _SALURAN_PROGRES = None, None
+
+
+def daftarkan_callback_progres(callback: Callable[[str, int, int], None]) -> str:
+    """Mendaftarkan callback(tahap, posisi, total) dan mengembalikan token untuk dikirim ke worker."""
+    if callback is None:
+        return None
+    token = uuid.uuid4().hex
+    _CALLBACK_PROGRES[token] = callback
+    return token
+
+
+def hapus_callback_progres(token: str):
+    if token:
+        _CALLBACK_PROGRES.pop(token, None)
+
+
+# --- Fungsi tahap (dijalankan di dalam proses worker) ---
+
+def bagi_tugas_ekstraksi(total_halaman: int) -> List[range]:
+    if not EKSTRAKSI_STREAMING:
+        return [range(total_halaman)]
+    return bagi_rentang_halaman(total_halaman, EKSTRAKSI_JUMLAH_WORKER, EKSTRAKSI_HALAMAN_MIN_PER_TUGAS)
+
+
+def tahap_ekstraksi(path_pdf: str, path_proyek: str, token_progres: str = None, rentang_halaman: range = None) -> Tuple[dict, Dict[int, dict]]:
+    """
+    Tahap 1: ekstraksi aset + simpan ke disk. Yang dikirim balik ke induk hanya ringkasan
+    path dan data OCR halaman (untuk diteruskan ke pipeline AI agar tidak di-OCR ulang).
+    Dengan `rentang_halaman` hanya rentang itu yang diekstrak (mode streaming); ringkasan
+    beberapa rentang disatukan di induk dengan gabungkan_hasil_rentang.
+    """
+    callback = _callback_worker(token_progres, "ekstraksi")
+    try:
+        with ArtefakDokumen(path_pdf) as artefak:
+            if EKSTRAKSI_STREAMING or rentang_halaman is not None:
+                hasil = ekstrak_dan_simpan_streaming(path_pdf, path_proyek, progress_callback=callback, artefak=artefak, rentang_halaman=rentang_halaman)
+                return hasil, artefak.ekspor_ocr()
+            data_mentah = ekstrak_aset_terstruktur(path_pdf, progress_callback=callback, artefak=artefak)
+            if not data_mentah:
+                raise Exception("Ekstraksi aset dasar gagal.")
+            return simpan_hasil_ke_disk(data_mentah, path_proyek), artefak.ekspor_ocr()
+    finally:
+        _kirim_metrik_worker()
+
+
+def bagi_tugas_foto(list_gambar: List[str], ukuran: int = None) -> List[List[str]]:
+    ukuran = max(1, ukuran or FOTO_PER_TUGAS)
+    return [list_gambar[i:i + ukuran] for i in range(0, len(list_gambar), ukuran)]
+
+
+def tahap_ocr_foto(list_gambar: List[str], token_progres: str = None) -> dict:
+    """
+    Tahap 3 (bagian CPU): hash perseptual + teks overlay setiap foto.
+    Hasilnya {path: sidik} atau {path: Exception} untuk dicocokkan ke indeks master di proses induk.
+    """
+    callback = _callback_worker(token_progres, "ocr_foto")
+    metadata = {}
+    for i, path_gambar in enumerate(list_gambar, 1):
+        try:
+            metadata[path_gambar] = ekstrak_sidik_gambar(path_gambar)
+        except Exception as e:
+            metadata[path_gambar] = e
+        if callback:
+            callback(i, len(list_gambar))
+    _kirim_metrik_worker()
+    return metadata
@@ -0,0 +1,386 @@
+# backend/pipeline_proyek.py
+# Alur pemrosesan satu sesi (ekstraksi -> AI -> validasi foto), dipakai bersama oleh
+# endpoint sinkron /upload_and_validate dan mode job asinkron.
+
+import os
+import json
+import asyncio
+import functools
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from validasi_foto import proses_validasi_dengan_petunjuk
+from indeks_master import get_indeks_master, IndeksMaster
+from cache_hasil import get_cache_hasil, hitung_sha256_file
+from executor_ai import get_executor_ai, versi_model_ai, AntrianAIPenuhError
+from penjadwal_batch import (
+    get_pool_cpu,
+    daftarkan_callback_progres,
+    hapus_callback_progres,
+    tahap_ekstraksi,
+    tahap_ocr_foto,
+    bagi_tugas_foto,
+    bagi_tugas_ekstraksi,
+)
+from ekstraksi_pdf import hitung_halaman_pdf, gabungkan_hasil_rentang
+from metrik_layanan import DURASI_TAHAP, HALAMAN, GAMBAR
+from profil_permintaan import PerekamJejak, span_jejak
+
+# --- Pengaturan Path ---
+DATA_DIR = Path("data")
+INPUT_PDF_DIR = DATA_DIR / "input_pdf"
+OUTPUT_EKSTRAKSI_DIR = DATA_DIR / "output_ekstraksi"
+SISTEM_VALIDASI_DIR = DATA_DIR / "sistem_validasi"
+
+INPUT_PDF_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_EKSTRAKSI_DIR.mkdir(parents=True, exist_ok=True)
+SISTEM_VALIDASI_DIR.mkdir(parents=True, exist_ok=True)
+
+# "lengkap" = ekstraksi -> AI -> validasi foto; "ekstraksi_saja" = tanpa tahap AI, sehingga
+# proses ini tidak pernah memuat torch/transformers (cocok untuk worker ekstraksi/dedupe foto)
+MODE_LAYANAN = os.environ.get("MODE_LAYANAN", "lengkap")
+MODE_EKSTRAKSI_SAJA = MODE_LAYANAN == "ekstraksi_saja"
+
+# Jumlah file dari satu batch yang boleh berada di dalam pipeline secara bersamaan
+BATCH_MAKS_FILE_AKTIF = int(os.environ.get("BATCH_MAKS_FILE_AKTIF", "4"))
+
+# Tipe callback untuk event progres: menerima satu dict event
+KirimEvent = Callable[[dict], None]
+
+
+def _buat_callback_progres(kirim_event: KirimEvent, nama_file: str, tahap: str):
+    """Membuat progress_callback (halaman/gambar ke-i dari total) yang meneruskan event ke stream job."""
+    if kirim_event is None:
+        return None
+
+    def callback(posisi: int, total: int):
+        kirim_event({"jenis": "progres", "nama_file": nama_file, "tahap": tahap, "posisi": posisi, "total": total})
+
+    return callback
+
+
+def _buat_callback_progres_bertahap(kirim_event: KirimEvent, nama_file: str, awalan: str = ""):
+    """Sama seperti di atas, untuk callback yang juga menyebut nama langkahnya (langkah, posisi, total)."""
+    if kirim_event is None:
+        return None
+
+    def callback(langkah: str, posisi: int, total: int):
+        kirim_event({"jenis": "progres", "nama_file": nama_file, "tahap": f"{awalan}{langkah}", "posisi": posisi, "total": total})
+
+    return callback
+
+
+def _buat_callback_progres_terkumpul(kirim_event: KirimEvent, nama_file: str, tahap: str, total: int):
+    """
+    Untuk pekerjaan yang dibagi ke beberapa tugas pool: setiap tugas melapor posisinya sendiri,
+    jadi progres gabungan dihitung dari jumlah laporan (satu per halaman/foto) dari tugas mana pun.
+    """
+    callback_induk = _buat_callback_progres(kirim_event, nama_file, tahap)
+    if callback_induk is None:
+        return None
+    jumlah_selesai = 0
+
+    def callback(langkah: str, posisi: int, total_tugas: int):
+        # Dipanggil dari satu thread saja (penguras progres pool)
+        nonlocal jumlah_selesai
+        jumlah_selesai += 1
+        callback_induk(jumlah_selesai, total)
+
+    return callback
+
+
+async def _ekstraksi_paralel(loop, pool_cpu, path_pdf: str, path_proyek: str, kirim_event: KirimEvent, nama_file: str, token_progres: str) -> Tuple[dict, dict]:
+    """
+    Tahap 1 untuk satu PDF: halaman dibagi ke beberapa rentang berurutan yang masing-masing
+    diekstrak di proses pool sendiri, lalu digabung sesuai urutan halaman. PDF pendek (atau
+    mode non-streaming) tetap satu tugas.
+    """
+    total_halaman = await loop.run_in_executor(None, hitung_halaman_pdf, path_pdf)
+    daftar_rentang = bagi_tugas_ekstraksi(total_halaman)
+    if len(daftar_rentang) <= 1:
+        return await loop.run_in_executor(pool_cpu, tahap_ekstraksi, path_pdf, path_proyek, token_progres)
+
+    token_rentang = daftarkan_callback_progres(_buat_callback_progres_terkumpul(kirim_event, nama_file, "ekstraksi", total_halaman))
+    try:
+        hasil_per_rentang = await asyncio.gather(*[
+            loop.run_in_executor(pool_cpu, tahap_ekstraksi, path_pdf, path_proyek, token_rentang, rentang)
+            for rentang in daftar_rentang
+        ])
+    finally:
+        hapus_callback_progres(token_rentang)
+    hasil_ekstraksi = await loop.run_in_executor(None, gabungkan_hasil_rentang, [h for h, _ in hasil_per_rentang], path_proyek)
+    data_ocr = {n: ocr for _, data in hasil_per_rentang for n, ocr in data.items()}
+    print(f"[Tahap 1/3] {nama_file}: {total_halaman} halaman diekstrak dalam {len(daftar_rentang)} rentang paralel.")
+    return hasil_ekstraksi, data_ocr
+
+
+async def _sidik_foto_paralel(loop, pool_cpu, list_gambar: List[str], kirim_event: KirimEvent, nama_file: str) -> dict:
+    """Membagi foto satu proyek ke beberapa tugas pool agar hash + OCR overlay berjalan paralel."""
+    token_progres = daftarkan_callback_progres(_buat_callback_progres_terkumpul(kirim_event, nama_file, "ocr_foto", len(list_gambar)))
+    try:
+        hasil_per_tugas = await asyncio.gather(*[
+            loop.run_in_executor(pool_cpu, tahap_ocr_foto, tugas, token_progres)
+            for tugas in bagi_tugas_foto(list_gambar)
+        ])
+    finally:
+        hapus_callback_progres(token_progres)
+    return {path: sidik for hasil in hasil_per_tugas for path, sidik in hasil.items()}
+
+
+async def _ambil_checkpoint(loop, checkpoint, nama_file: str, tahap: str):
+    if checkpoint is None:
+        return None
+    return await loop.run_in_executor(None, checkpoint.ambil, nama_file, tahap)
+
+
+async def _simpan_checkpoint(loop, checkpoint, nama_file: str, tahap: str, data):
+    if checkpoint is not None:
+        await loop.run_in_executor(None, checkpoint.simpan, nama_file, tahap, data)
+
+
+async def proses_satu_proyek(
+    temp_pdf_path: Path,
+    nama_file: str,
+    path_sesi_output: Path,
+    indeks_master: IndeksMaster,
+    kirim_event: KirimEvent = None,
+    giliran_sebelumnya: asyncio.Event = None,
+    sha256_pdf: str = None,
+    perekam: Optional[PerekamJejak] = None,
+    checkpoint=None,
+    nama_folder: str = None
+) -> dict:
+    """
+    Menjalankan ketiga tahap untuk satu PDF dan menulis laporan_validasi_proyek.json.
+    Tahap 1 dan hash/OCR foto (dibagi ke beberapa tugas) berjalan di pool proses CPU, tahap 2 di executor AI, sehingga
+    beberapa file bisa berada di tahap yang berbeda pada saat yang sama. Pencocokan ke
+    indeks master menunggu `giliran_sebelumnya` agar hasil duplikasi tetap deterministik
+    (mengikuti urutan file dalam batch). `sha256_pdf` diisi jika hash sudah dihitung saat upload.
+    `perekam` (hanya untuk permintaan yang diprofil) mencatat span setiap tahap.
+    `checkpoint` (objek dengan ambil(nama_file, tahap) / simpan(nama_file, tahap, data), mis.
+    CheckpointBatch di proses_arsip) menyimpan hasil tahap ekstraksi dan AI; tahap yang sudah
+    punya checkpoint tidak dijalankan ulang.
+    `nama_folder` (default `nama_file`) menentukan folder proyek di output sesi; hanya folder
+    yang memakainya, laporan dan event tetap memakai `nama_file`.
+    """
+    loop = asyncio.get_running_loop()
+    pool_cpu = get_pool_cpu()
+    executor_ai = get_executor_ai()
+    path_proyek_output = path_sesi_output / Path(nama_folder or nama_file).stem
+    laporan_proyek_final = {}
+    tahap_dari_checkpoint = []
+    cache = get_cache_hasil()
+    token_progres = daftarkan_callback_progres(_buat_callback_progres_bertahap(kirim_event, nama_file))
+
+    try:
+        if cache and not sha256_pdf:
+            sha256_pdf = await loop.run_in_executor(None, hitung_sha256_file, str(temp_pdf_path))
+
+        # Data OCR hanya ada di memori; tahap AI yang dilanjutkan dari checkpoint ekstraksi
+        # mengambil OCR halaman dari cache (jika aktif) atau menjalankan Tesseract lagi
+        data_ocr = None
+        hasil_ekstraksi = await _ambil_checkpoint(loop, checkpoint, nama_file, "ekstraksi")
+        if hasil_ekstraksi is not None:
+            tahap_dari_checkpoint.append("ekstraksi")
+            print(f"[Tahap 1/3] {nama_file}: diambil dari checkpoint.")
+        else:
+            print(f"[Tahap 1/3] {nama_file}: memulai ekstraksi aset dasar...")
+            with DURASI_TAHAP.waktu(tahap="ekstraksi"), span_jejak(perekam, "ekstraksi", nama_file):
+                hasil_ekstraksi, data_ocr = await _ekstraksi_paralel(
+                    loop, pool_cpu, str(temp_pdf_path), str(path_proyek_output), kirim_event, nama_file, token_progres
+                )
+            HALAMAN.tambah(len(hasil_ekstraksi.get("hasil_per_halaman", [])), tahap="ekstraksi")
+            GAMBAR.tambah(hasil_ekstraksi.get("statistik_gambar", {}).get("unik", 0))
+            await _simpan_checkpoint(loop, checkpoint, nama_file, "ekstraksi", hasil_ekstraksi)
+            print(f"[Tahap 1/3] {nama_file}: ekstraksi aset dasar selesai.")
+        laporan_proyek_final["hasil_ekstraksi_dasar"] = hasil_ekstraksi
+
+        if MODE_EKSTRAKSI_SAJA:
+            hasil_ai = {"dilewati": True, "alasan": "MODE_LAYANAN=ekstraksi_saja"}
+            print(f"[Tahap 2/3] {nama_file}: dilewati (mode ekstraksi saja).")
+        elif (hasil_ai := await _ambil_checkpoint(loop, checkpoint, nama_file, "ai")) is not None:
+            tahap_dari_checkpoint.append("ai")
+            print(f"[Tahap 2/3] {nama_file}: diambil dari checkpoint.")
+        else:
+            # PDF yang persis sama (byte per byte) dengan model yang sama tidak perlu diproses AI lagi.
+            # Tahap 1 tetap dijalankan karena aset gambar dibutuhkan di folder sesi ini; OCR-nya
+            # sudah diambil dari cache per halaman.
+            entri_cache = None
+            if cache:
+                versi = await loop.run_in_executor(None, versi_model_ai)
+                entri_cache = await loop.run_in_executor(None, cache.ambil_dokumen, sha256_pdf, versi)
+                laporan_proyek_final["cache"] = {"sha256": sha256_pdf, "dokumen": "hit" if entri_cache else "miss"}
+
+            if entri_cache:
+                hasil_ai = entri_cache["hasil_ai"]
+                print(f"[Tahap 2/3] {nama_file}: hasil AI diambil dari cache.")
+            else:
+                print(f"[Tahap 2/3] {nama_file}: mengirim pekerjaan ke executor AI ({executor_ai.jumlah_dalam_antrian} pekerjaan aktif)...")
+                # Pekerjaan berjalan di thread executor, event loop tetap bebas melayani request lain
+                with DURASI_TAHAP.waktu(tahap="ai"), span_jejak(perekam, "ai", nama_file):
+                    future_ai = executor_ai.submit(
+                        str(temp_pdf_path.resolve()), nama_file,
+                        progress_callback=_buat_callback_progres_bertahap(kirim_event, nama_file, "ai_"),
+                        data_ocr=data_ocr
+                    )
+                    hasil_ai = await asyncio.wrap_future(future_ai)
+                # Hasil dengan halaman yang OCR-nya gagal tidak di-cache: upload berikutnya mencoba lagi
+                if cache and not hasil_ai.get("halaman_ocr_gagal"):
+                    await loop.run_in_executor(None, cache.simpan_dokumen, sha256_pdf, versi, hasil_ai, hasil_ekstraksi)
+                print(f"[Tahap 2/3] {nama_file}: executor AI selesai.")
+            await _simpan_checkpoint(loop, checkpoint, nama_file, "ai", hasil_ai)
+        laporan_proyek_final["hasil_pemrosesan_ai"] = hasil_ai
+        if tahap_dari_checkpoint:
+            laporan_proyek_final["tahap_dari_checkpoint"] = tahap_dari_checkpoint
+
+        print(f"[Tahap 3/3] {nama_file}: memulai validasi duplikasi foto...")
+        # Path gambar di ringkasan ekstraksi relatif terhadap folder sesi; gambar yang dipakai
+        # ulang di beberapa halaman (logo, tanda tangan) cukup divalidasi sekali
+        list_gambar_absolut = [
+            str((path_sesi_output / p["path"]).resolve())
+            for h in hasil_ekstraksi.get("hasil_per_halaman", []) for p in h.get("path_gambar", [])
+            if not p.get("dipakai_ulang")
+        ]
+        with DURASI_TAHAP.waktu(tahap="ocr_foto"), span_jejak(perekam, "ocr_foto", nama_file, jumlah_foto=len(list_gambar_absolut)):
+            metadata_gambar = await _sidik_foto_paralel(loop, pool_cpu, list_gambar_absolut, kirim_event, nama_file)
+    finally:
+        hapus_callback_progres(token_progres)
+
+    if giliran_sebelumnya is not None:
+        with span_jejak(perekam, "menunggu_giliran_indeks", nama_file):
+            await giliran_sebelumnya.wait()
+    with DURASI_TAHAP.waktu(tahap="validasi_foto"), span_jejak(perekam, "validasi_foto", nama_file):
+        hasil_validasi_foto = await loop.run_in_executor(None, functools.partial(
+            proses_validasi_dengan_petunjuk,
+            list_gambar_proyek=list_gambar_absolut, indeks_master=indeks_master,
+            nama_proyek=nama_file, path_sesi=str(path_sesi_output),
+            progress_callback=_buat_callback_progres(kirim_event, nama_file, "validasi_foto"),
+            metadata_gambar=metadata_gambar
+        ))
+    laporan_proyek_final["validasi_duplikasi_foto"] = hasil_validasi_foto
+    print(f"[Tahap 3/3] {nama_file}: validasi foto selesai.")
+
+    path_laporan_proyek = path_proyek_output / "laporan_validasi_proyek.json"
+    with open(path_laporan_proyek, "w", encoding="utf-8") as f:
+        json.dump(laporan_proyek_final, f, indent=4, ensure_ascii=False)
+
+    return {
+        "nama_file": nama_file,
+        "status_keseluruhan": "BERHASIL" # Asumsi berhasil jika tidak ada error
+    }
+
+
+async def _proses_file_dalam_batch(
+    idx: int,
+    total: int,
+    temp_pdf_path: Path,
+    nama_file: str,
+    path_sesi_output: Path,
+    indeks_master: IndeksMaster,
+    kirim_event: KirimEvent,
+    giliran_sebelumnya: asyncio.Event,
+    giliran_ini: asyncio.Event,
+    sha256_pdf: str = None,
+    perekam: Optional[PerekamJejak] = None,
+    checkpoint=None,
+    hapus_pdf_sumber: bool = True,
+    nama_folder: str = None
+) -> dict:
+    loop = asyncio.get_running_loop()
+    try:
+        # File yang sudah selesai di run sebelumnya (checkpoint "selesai") tidak diproses lagi
+        hasil_proyek = await _ambil_checkpoint(loop, checkpoint, nama_file, "selesai")
+        if hasil_proyek is not None:
+            print(f"--- Proyek {idx}/{total}: {nama_file} sudah selesai (checkpoint) ---")
+        else:
+            print(f"\n--- Memproses Proyek {idx}/{total}: {nama_file} ---")
+            if kirim_event:
+                kirim_event({"jenis": "file_mulai", "nama_file": nama_file, "posisi": idx, "total": total})
+            try:
+                with span_jejak(perekam, "file", nama_file, kategori="file", posisi=idx):
+                    hasil_proyek = await proses_satu_proyek(
+                        temp_pdf_path, nama_file, path_sesi_output, indeks_master, kirim_event, giliran_sebelumnya, sha256_pdf, perekam, checkpoint,
+                        nama_folder
+                    )
+                await _simpan_checkpoint(loop, checkpoint, nama_file, "selesai", hasil_proyek)
+            except AntrianAIPenuhError as e:
+                print(f"\n[ERROR] Executor AI menolak {nama_file}: {e}")
+                hasil_proyek = {"nama_file": nama_file, "status_keseluruhan": "ERROR_ANTRIAN_AI_PENUH"}
+            except Exception as e:
+                print(f"\n[ERROR] Gagal memproses {nama_file}: {e}")
+                hasil_proyek = {"nama_file": nama_file, "status_keseluruhan": f"ERROR_{type(e).__name__}"}
+            finally:
+                if hapus_pdf_sumber and temp_pdf_path.exists():
+                    os.remove(temp_pdf_path)
+    finally:
+        # File berikutnya boleh mencocokkan fotonya setelah file ini selesai (berhasil atau gagal)
+        if giliran_sebelumnya is not None:
+            await giliran_sebelumnya.wait()
+        giliran_ini.set()
+
+    if kirim_event:
+        kirim_event({"jenis": "file_selesai", **hasil_proyek})
+    return hasil_proyek
+
+
+async def proses_sesi(
+    id_sesi: str,
+    daftar_pdf: List[Tuple[Path, str]],
+    kirim_event: KirimEvent = None,
+    sha256_per_file: Dict[str, str] = None,
+    perekam: Optional[PerekamJejak] = None,
+    checkpoint=None,
+    hapus_pdf_sumber: bool = True,
+    nama_folder_per_file: Dict[str, str] = None
+) -> dict:
+    """
+    Memproses semua PDF (path sementara, nama file asli) dalam satu sesi secara pipelined.
+    Hasil per file tetap dilaporkan sesuai urutan upload. File sementara dihapus setelah diproses,
+    kecuali `hapus_pdf_sumber=False` (PDF arsip yang diproses lewat proses_arsip).
+    `sha256_per_file` ({str(path): sha256}) berisi hash yang sudah dihitung saat upload.
+    Dengan `perekam`, event progres per halaman/gambar juga dicatat sebagai span.
+    `checkpoint`: lihat proses_satu_proyek; file yang sudah selesai dilewati.
+    `nama_folder_per_file` ({str(path): nama}) memberi nama folder proyek yang berbeda dari nama
+    file, mis. untuk upload berisi beberapa file bernama sama.
+    """
+    sha256_per_file = sha256_per_file or {}
+    nama_folder_per_file = nama_folder_per_file or {}
+    if perekam is not None:
+        kirim_event = perekam.bungkus_kirim_event(kirim_event)
+    path_sesi_output = OUTPUT_EKSTRAKSI_DIR / id_sesi
+
+    laporan_sesi_keseluruhan = {"id_sesi": id_sesi, "proyek_yang_diproses": []}
+    # Tidak dimuat ke memori: setiap foto dicari/dicatat langsung di indeks SQLite
+    indeks_master = await asyncio.get_running_loop().run_in_executor(None, get_indeks_master)
+
+    # Batasi jumlah file yang sedang "mengalir" agar antrian executor AI tidak meluap: hanya
+    # BATCH_MAKS_FILE_AKTIF pekerja yang mengambil file satu per satu sesuai urutan batch (bukan
+    # satu coroutine per PDF, yang untuk arsip bisa ribuan). Karena file diambil berurutan, file
+    # yang ditunggu giliran indeksnya selalu sudah dipegang pekerja lain, jadi tidak bisa macet.
+    total = len(daftar_pdf)
+    hasil_per_file: List[Optional[dict]] = [None] * total
+    antrian_file = iter(enumerate(daftar_pdf, 1))
+    giliran_terakhir: Optional[asyncio.Event] = None
+
+    async def pekerja_file():
+        nonlocal giliran_terakhir
+        for idx, (temp_pdf_path, nama_file) in antrian_file:
+            # Tanpa await di antara next() dan baris ini, jadi rantai giliran mengikuti urutan file
+            giliran_sebelumnya, giliran_terakhir = giliran_terakhir, asyncio.Event()
+            hasil_per_file[idx - 1] = await _proses_file_dalam_batch(
+                idx, total, temp_pdf_path, nama_file, path_sesi_output, indeks_master, kirim_event,
+                giliran_sebelumnya, giliran_terakhir,
+                sha256_per_file.get(str(temp_pdf_path)), perekam, checkpoint, hapus_pdf_sumber,
+                nama_folder_per_file.get(str(temp_pdf_path))
+            )
+
+    await asyncio.gather(*[pekerja_file() for _ in range(min(BATCH_MAKS_FILE_AKTIF, total))])
+    laporan_sesi_keseluruhan["proyek_yang_diproses"] = hasil_per_file
+
+    path_sesi_output.mkdir(parents=True, exist_ok=True)
+    path_laporan_sesi = path_sesi_output / "laporan_sesi_keseluruhan.json"
+    with open(path_laporan_sesi, "w", encoding="utf-8") as f:
+        json.dump(laporan_sesi_keseluruhan, f, indent=4, ensure_ascii=False)
+
+    print("\n" + "="*50 + "\nSesi keseluruhan selesai.\n" + "="*50 + "\n")
+    return laporan_sesi_keseluruhan
@@ -0,0 +1,187 @@
+# backend/profil_permintaan.py
+# Profil opsional untuk satu permintaan (header X-Profil: 1 atau query ?profil=1):
+# - profiler sampling: setiap PROFIL_INTERVAL_MS semua thread proses ini diambil stack-nya
+#   (sys._current_frames) dan ditulis dalam format "folded stacks" (flamegraph.pl, speedscope,
+#   inferno, dll.);
+# - jejak span: per file -> per tahap -> per halaman/gambar dalam format Chrome Trace Event
+#   (chrome://tracing, Perfetto, speedscope). Span per halaman diturunkan dari event progres
+#   yang memang sudah dikirim pipeline, jadi loop per halaman tidak perlu diubah.
+# Permintaan tanpa profil tidak membuat objek apa pun di sini.
+# Proses worker pool CPU tidak ikut di-sampling; pekerjaannya terlihat sebagai span.
+
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# --- Konfigurasi (bisa diubah lewat environment variable) ---
+# 0 = permintaan profil diabaikan (mis. di produksi yang tidak boleh dibebani profiler)
+PROFIL_DIIZINKAN = os.environ.get("PROFIL_DIIZINKAN", "1") == "1"
+PROFIL_INTERVAL_MS = float(os.environ.get("PROFIL_INTERVAL_MS", "5"))
+
+NAMA_FILE_FOLDED = "profil_permintaan.folded"
+NAMA_FILE_JEJAK = "jejak_permintaan.json"
+NAMA_FILE_JEJAK_PROYEK = "jejak_profil.json"
+
+
+class ProfilerSampling:
+    """Mengambil stack semua thread (kecuali thread sampler) secara berkala."""
+
+    def __init__(self, interval_ms: float = PROFIL_INTERVAL_MS):
+        self.interval = max(1.0, interval_ms) / 1000
+        self.sampel: Counter = Counter()
+        self.jumlah_tik = 0
+        self._berhenti = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profiler-sampling", daemon=True)
+
+    def mulai(self):
+        self._thread.start()
+
+    def berhenti(self):
+        self._berhenti.set()
+        self._thread.join()
+
+    def _loop(self):
+        id_sendiri = threading.get_ident()
+        while not self._berhenti.wait(self.interval):
+            nama_thread = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == id_sendiri:
+                    continue
+                tumpukan = []
+                while frame is not None:
+                    kode = frame.f_code
+                    tumpukan.append(f"{kode.co_name} ({os.path.basename(kode.co_filename)}:{kode.co_firstlineno})")
+                    frame = frame.f_back
+                tumpukan.append(nama_thread.get(ident, f"thread-{ident}"))
+                self.sampel[";".join(reversed(tumpukan))] += 1
+            self.jumlah_tik += 1
+
+    def tulis_folded(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for tumpukan, jumlah in self.sampel.most_common():
+                f.write(f"{tumpukan} {jumlah}\n")
+
+
+class PerekamJejak:
+    """
+    Mengumpulkan span (nama, mulai, selesai) per file. Setiap file mendapat lajur (tid) sendiri
+    di viewer; span tahap dan halaman bersarang di dalam span file.
+    """
+
+    def __init__(self):
+        self.mulai = time.perf_counter()
+        self._span: List[dict] = []
+        self._lajur: Dict[str, int] = {}
+        # Waktu event terakhir per file dan per (file, tahap), untuk menghitung span halaman
+        self._terakhir_per_file: Dict[str, float] = {}
+        self._terakhir_per_tahap: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _tid(self, nama_file: Optional[str]) -> int:
+        kunci = nama_file or ""
+        if kunci not in self._lajur:
+            self._lajur[kunci] = len(self._lajur)
+        return self._lajur[kunci]
+
+    def catat_span(self, nama: str, mulai: float, selesai: float, nama_file: str = None, kategori: str = "tahap", **atribut):
+        with self._lock:
+            self._span.append({
+                "name": nama, "cat": kategori, "ph": "X", "pid": 1, "tid": self._tid(nama_file),
+                "ts": round((mulai - self.mulai) * 1e6, 1), "dur": round((selesai - mulai) * 1e6, 1),
+                "args": {"nama_file": nama_file, **atribut} if nama_file else atribut,
+            })
+
+    @contextmanager
+    def span(self, nama: str, nama_file: str = None, kategori: str = "tahap", **atribut):
+        mulai = time.perf_counter()
+        if nama_file:
+            with self._lock:
+                self._terakhir_per_file[nama_file] = mulai
+        try:
+            yield
+        finally:
+            self.catat_span(nama, mulai, time.perf_counter(), nama_file, kategori, **atribut)
+
+    def _catat_progres(self, event: dict):
+        sekarang = time.perf_counter()
+        nama_file, tahap = event.get("nama_file"), event.get("tahap")
+        with self._lock:
+            # Halaman pertama suatu tahap dihitung sejak event/span terakhir file ini
+            mulai = self._terakhir_per_tahap.get((nama_file, tahap), self._terakhir_per_file.get(nama_file, self.mulai))
+            self._terakhir_per_tahap[(nama_file, tahap)] = sekarang
+            self._terakhir_per_file[nama_file] = sekarang
+        self.catat_span(f"{tahap} {event.get('posisi')}/{event.get('total')}", mulai, sekarang, nama_file, "halaman")
+
+    def bungkus_kirim_event(self, kirim_event: Optional[Callable[[dict], None]]) -> Callable[[dict], None]:
+        """kirim_event yang juga mencatat event progres sebagai span halaman/gambar."""
+        def kirim(event: dict):
+            if event.get("jenis") == "progres":
+                self._catat_progres(event)
+            if kirim_event is not None:
+                kirim_event(event)
+        return kirim
+
+    def tulis_chrome_trace(self, path: Path, nama_file: str = None):
+        with self._lock:
+            daftar_span = [s for s in self._span if nama_file is None or s["args"].get("nama_file") in (nama_file, None)]
+            lajur = dict(self._lajur)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": nama or "permintaan"}}
+            for nama, tid in lajur.items() if nama_file is None or nama in (nama_file, "")
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + sorted(daftar_span, key=lambda s: s["ts"]), "displayTimeUnit": "ms"}, f)
+
+
+def span_jejak(perekam: Optional[PerekamJejak], nama: str, nama_file: str = None, **atribut):
+    """`perekam.span(...)` jika profil aktif, selain itu context manager kosong."""
+    return perekam.span(nama, nama_file, **atribut) if perekam is not None else nullcontext()
+
+
+class SesiProfil:
+    """Profiler sampling + perekam jejak untuk satu permintaan."""
+
+    def __init__(self):
+        self.jejak = PerekamJejak()
+        self.profiler = ProfilerSampling()
+        self._mulai = None
+
+    def mulai(self) -> "SesiProfil":
+        self._mulai = time.perf_counter()
+        self.profiler.mulai()
+        return self
+
+    def selesai_dan_tulis(self, path_sesi: Path, daftar_proyek: List[Tuple[str, str]] = ()) -> dict:
+        """
+        Menghentikan profiler lalu menulis folded stacks dan jejak sesi di folder sesi, serta
+        jejak per file di folder proyeknya (di samping laporan_validasi_proyek.json).
+        `daftar_proyek` berisi pasangan (nama file, nama folder proyek).
+        """
+        self.profiler.berhenti()
+        durasi = time.perf_counter() - self._mulai
+        path_sesi.mkdir(parents=True, exist_ok=True)
+        self.profiler.tulis_folded(path_sesi / NAMA_FILE_FOLDED)
+        self.jejak.tulis_chrome_trace(path_sesi / NAMA_FILE_JEJAK)
+        jejak_proyek = []
+        for nama_file, nama_folder in daftar_proyek:
+            folder_proyek = path_sesi / Path(nama_folder).stem
+            if folder_proyek.is_dir():
+                self.jejak.tulis_chrome_trace(folder_proyek / NAMA_FILE_JEJAK_PROYEK, nama_file)
+                jejak_proyek.append(f"{folder_proyek.name}/{NAMA_FILE_JEJAK_PROYEK}")
+        print(f"[PROFIL] {path_sesi.name}: {durasi:.2f} dtk, {self.profiler.jumlah_tik} tik sampling.")
+        return {
+            "durasi_detik": round(durasi, 3),
+            "interval_sampling_ms": self.profiler.interval * 1000,
+            "jumlah_tik_sampling": self.profiler.jumlah_tik,
+            "profil_folded": NAMA_FILE_FOLDED,
+            "jejak": NAMA_FILE_JEJAK,
+            "jejak_per_proyek": jejak_proyek,
+            # Sampler melihat semua thread proses ini, termasuk permintaan lain yang berjalan bersamaan
+            "catatan": "Profil sampling mencakup semua thread proses API; proses worker pool CPU hanya terlihat sebagai span.",
+        }
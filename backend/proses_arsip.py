@@ -0,0 +1,179 @@
+# backend/proses_arsip.py
+# Pemrosesan offline satu folder arsip PDF (rekursif) tanpa lewat HTTP, mis. untuk mengisi
+# indeks master foto dari ribuan laporan lama. Memakai alur yang sama dengan endpoint upload
+# (proses_sesi: ekstraksi -> AI -> validasi foto, dengan pool proses CPU dan executor AI),
+# sehingga laporan per proyek ditulis dengan susunan yang sama di data/output_ekstraksi/<id_sesi>.
+# PDF sumber tidak dihapus. Kemajuan disimpan per file dan per tahap (ekstraksi, ai, selesai)
+# di _checkpoint_batch.sqlite3 dalam folder sesi; menjalankan perintah yang sama lagi
+# melanjutkan dari tahap terakhir yang selesai.
+# Jalankan dari folder backend/ (sama seperti uvicorn) agar folder data/ yang dipakai sama.
+#
+# Pemakaian:
+#   python proses_arsip.py /arsip/laporan_2023
+#   python proses_arsip.py /arsip/laporan_2023 --proses-cpu 6 --file-aktif 8 --worker-ai 2
+#   python proses_arsip.py /arsip/laporan_2023 --tanpa-ai          # hanya ekstraksi + indeks foto
+#   python proses_arsip.py /arsip/laporan_2023 --id-sesi arsip_2023 --mulai-ulang
+
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+NAMA_FILE_CHECKPOINT = "_checkpoint_batch.sqlite3"
+
+
+class CheckpointBatch:
+    """
+    Hasil tahap per file di SQLite: (nama_file, tahap) -> JSON. Dipakai proses_satu_proyek
+    lewat ambil/simpan; setiap simpan langsung di-commit agar bertahan jika proses dihentikan.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._kon = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._kon:
+            self._kon.execute("PRAGMA journal_mode=WAL")
+            self._kon.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoint (
+                    nama_file TEXT NOT NULL,
+                    tahap TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    waktu REAL NOT NULL,
+                    PRIMARY KEY (nama_file, tahap)
+                )
+            """)
+
+    def ambil(self, nama_file: str, tahap: str) -> Optional[Any]:
+        with self._lock:
+            baris = self._kon.execute(
+                "SELECT data FROM checkpoint WHERE nama_file = ? AND tahap = ?", (nama_file, tahap)
+            ).fetchone()
+        return json.loads(baris[0]) if baris else None
+
+    def simpan(self, nama_file: str, tahap: str, data: Any):
+        with self._lock, self._kon:
+            self._kon.execute(
+                "INSERT OR REPLACE INTO checkpoint VALUES (?, ?, ?, ?)",
+                (nama_file, tahap, json.dumps(data, ensure_ascii=False), time.time())
+            )
+
+    def ringkasan(self) -> dict:
+        with self._lock:
+            return dict(self._kon.execute("SELECT tahap, COUNT(*) FROM checkpoint GROUP BY tahap").fetchall())
+
+    def tutup(self):
+        with self._lock:
+            self._kon.close()
+
+
+def cari_pdf(folder: Path, pola: str = "*") -> List[Tuple[Path, str]]:
+    """
+    Semua PDF di bawah `folder` (urut agar hasil duplikasi deterministik). Nama file dibentuk
+    dari path relatifnya ("2023/januari/BAUT.pdf" -> "2023__januari__BAUT.pdf") karena laporan
+    arsip di folder berbeda sering bernama sama, sedangkan folder proyek memakai nama file.
+    Ekstensi dicek tanpa membedakan huruf besar/kecil (glob "*.pdf" melewatkan "*.PDF" di Linux).
+    """
+    daftar = []
+    for path in sorted(folder.rglob(pola)):
+        if path.is_file() and path.suffix.lower() == ".pdf":
+            daftar.append((path, "__".join(path.relative_to(folder).parts)))
+    return daftar
+
+
+def _id_sesi_default(folder: Path) -> str:
+    # Tetap sama untuk folder yang sama, jadi menjalankan ulang perintah otomatis melanjutkan
+    return "arsip_" + re.sub(r"[^A-Za-z0-9_.-]+", "_", folder.resolve().name)
+
+
+def _buat_pencetak_progres(total: int):
+    jumlah_selesai = 0
+
+    def kirim_event(event: dict):
+        nonlocal jumlah_selesai
+        if event.get("jenis") == "file_selesai":
+            jumlah_selesai += 1
+            print(f"[ARSIP] {jumlah_selesai}/{total} {event['nama_file']}: {event.get('status_keseluruhan')}")
+
+    return kirim_event
+
+
+async def jalankan_arsip(daftar_pdf: List[Tuple[Path, str]], id_sesi: str, checkpoint: CheckpointBatch) -> dict:
+    from pipeline_proyek import proses_sesi
+    from penjadwal_batch import shutdown_pool_cpu
+    from executor_ai import shutdown_executor_ai
+    try:
+        return await proses_sesi(
+            id_sesi, daftar_pdf, _buat_pencetak_progres(len(daftar_pdf)),
+            checkpoint=checkpoint, hapus_pdf_sumber=False
+        )
+    finally:
+        shutdown_executor_ai()
+        shutdown_pool_cpu()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Proses satu folder arsip PDF secara offline dengan checkpoint.")
+    parser.add_argument("folder", help="Folder berisi PDF (dicari rekursif)")
+    parser.add_argument("--pola", default="*", help="Pola glob nama file, hanya file .pdf/.PDF yang diambil (default: *)")
+    parser.add_argument("--id-sesi", default=None, help="Nama folder sesi di data/output_ekstraksi (default: arsip_<nama folder>)")
+    parser.add_argument("--proses-cpu", type=int, default=None, help="Jumlah proses pool CPU (CPU_JUMLAH_PROSES)")
+    parser.add_argument("--file-aktif", type=int, default=None, help="Jumlah file yang diproses bersamaan (BATCH_MAKS_FILE_AKTIF)")
+    parser.add_argument("--worker-ai", type=int, default=None, help="Jumlah worker executor AI (AI_JUMLAH_WORKER)")
+    parser.add_argument("--tanpa-ai", action="store_true", help="Lewati tahap AI (MODE_LAYANAN=ekstraksi_saja)")
+    parser.add_argument("--mulai-ulang", action="store_true", help="Abaikan checkpoint lama dan proses semua file dari awal")
+    args = parser.parse_args()
+
+    folder = Path(args.folder)
+    if not folder.is_dir():
+        parser.error(f"Folder tidak ditemukan: {folder}")
+
+    # Konfigurasi modul pipeline dibaca dari environment saat diimpor, jadi diset sebelum impor
+    if args.proses_cpu:
+        os.environ["CPU_JUMLAH_PROSES"] = str(args.proses_cpu)
+    if args.file_aktif:
+        os.environ["BATCH_MAKS_FILE_AKTIF"] = str(args.file_aktif)
+        # Semua file aktif harus muat di antrian executor AI agar tidak ada yang ditolak
+        os.environ["AI_MAKS_ANTRIAN"] = str(max(args.file_aktif, int(os.environ.get("AI_MAKS_ANTRIAN", "16"))))
+    if args.worker_ai:
+        os.environ["AI_JUMLAH_WORKER"] = str(args.worker_ai)
+    if args.tanpa_ai:
+        os.environ["MODE_LAYANAN"] = "ekstraksi_saja"
+
+    from pipeline_proyek import OUTPUT_EKSTRAKSI_DIR
+
+    daftar_pdf = cari_pdf(folder, args.pola)
+    if not daftar_pdf:
+        print(f"Tidak ada PDF di {folder}.")
+        raise SystemExit(0)
+
+    id_sesi = args.id_sesi or _id_sesi_default(folder)
+    path_checkpoint = OUTPUT_EKSTRAKSI_DIR / id_sesi / NAMA_FILE_CHECKPOINT
+    if args.mulai_ulang and path_checkpoint.exists():
+        for path in path_checkpoint.parent.glob(NAMA_FILE_CHECKPOINT + "*"):
+            path.unlink()
+    checkpoint = CheckpointBatch(path_checkpoint)
+    sudah = checkpoint.ringkasan()
+    print(f"[ARSIP] {len(daftar_pdf)} PDF, sesi {id_sesi}; checkpoint: "
+          f"{sudah.get('selesai', 0)} selesai, {sudah.get('ai', 0)} AI, {sudah.get('ekstraksi', 0)} ekstraksi.")
+
+    mulai = time.perf_counter()
+    try:
+        laporan = asyncio.run(jalankan_arsip(daftar_pdf, id_sesi, checkpoint))
+    except KeyboardInterrupt:
+        print(f"\n[ARSIP] Dihentikan. Jalankan perintah yang sama untuk melanjutkan (sesi {id_sesi}).")
+        raise SystemExit(130)
+    finally:
+        checkpoint.tutup()
+
+    status = [p["status_keseluruhan"] for p in laporan["proyek_yang_diproses"]]
+    gagal = [s for s in status if s != "BERHASIL"]
+    print(f"[ARSIP] Selesai dalam {time.perf_counter() - mulai:.1f} dtk: {len(status) - len(gagal)} berhasil, {len(gagal)} gagal.")
+    print(f"[ARSIP] Laporan: {OUTPUT_EKSTRAKSI_DIR / id_sesi}")
@@ -2,10 +2,39 @@
 import os
 import json
 import re
-from typing import Dict, List, Any, Callable
+from typing import Dict, List, Any, Callable, Optional
 from PIL import Image
+import cv2
+import numpy as np
 import pytesseract
 
+from hash_persepsi import phash, dhash
+from ekstraksi_pdf import GAMBAR_LUAS_PIKSEL_MINIMUM
+from metrik_layanan import DURASI_LANGKAH, FOTO_DUPLIKAT
+
+# --- Konfigurasi pencocokan foto (bisa diubah lewat environment variable) ---
+# Batas jarak Hamming (dari 64 bit) agar dua foto dianggap duplikat; keduanya harus terpenuhi
+FOTO_JARAK_PHASH_MAKS = int(os.environ.get("FOTO_JARAK_PHASH_MAKS", "10"))
+FOTO_JARAK_DHASH_MAKS = int(os.environ.get("FOTO_JARAK_DHASH_MAKS", "14"))
+# OCR teks overlay tetap dijalankan sebagai sinyal kedua; 0 = lewati Tesseract sepenuhnya
+FOTO_OCR_SEKUNDER = os.environ.get("FOTO_OCR_SEKUNDER", "1") == "1"
+# Logo, kop, stempel, dan tanda tangan berulang di banyak laporan dan bukan foto lapangan;
+# jika ikut dicocokkan, semuanya terlapor sebagai foto duplikat. Gambar di bawah luas ini
+# (filter luas yang sama seperti GAMBAR_LUAS_PIKSEL_MINIMUM saat ekstraksi, ambangnya lebih
+# besar) atau yang latarnya sebagian besar putih polos tidak dicocokkan ke indeks master.
+FOTO_LUAS_PIKSEL_MINIMUM = int(os.environ.get("FOTO_LUAS_PIKSEL_MINIMUM", str(16 * GAMBAR_LUAS_PIKSEL_MINIMUM)))
+FOTO_FRAKSI_LATAR_PUTIH_MAKS = float(os.environ.get("FOTO_FRAKSI_LATAR_PUTIH_MAKS", "0.6"))
+
+# --- Konfigurasi OCR overlay ---
+# Overlay timestamp/GPS hanya dicari di pita atas dan bawah foto (fraksi tinggi foto)
+FOTO_PITA_ATAS = float(os.environ.get("FOTO_PITA_ATAS", "0.25"))
+FOTO_PITA_BAWAH = float(os.environ.get("FOTO_PITA_BAWAH", "0.35"))
+# Tinggi baris teks (piksel) setelah crop di-resize; Tesseract paling akurat di kisaran 20-40 px
+FOTO_TINGGI_TEKS_TARGET = int(os.environ.get("FOTO_TINGGI_TEKS_TARGET", "32"))
+# Lebar gambar kerja untuk mendeteksi pita teks (deteksi tidak butuh resolusi penuh)
+_LEBAR_DETEKSI = 960
+_CONFIG_OCR_OVERLAY = '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz .,:-/|°'
+
 def bersihkan_teks(teks_mentah: str) -> str:
     if not teks_mentah: return ""
     teks_bersih = re.sub(r'\s+', ' ', teks_mentah.strip())
@@ -13,27 +42,155 @@ def bersihkan_teks(teks_mentah: str) -> str:
     teks_bersih = re.sub(r'(\d{1,2})/(\d{1,2})/(\d{4})', r'\1-\2-\3', teks_bersih)
     return teks_bersih.strip()
 
+def _muat_gray(path_gambar: str) -> np.ndarray:
+    with Image.open(path_gambar) as img:
+        return np.asarray(img.convert('L'))
+
+def cari_pita_teks(gray: np.ndarray):
+    """
+    Mencari baris teks overlay di pita atas/bawah dengan operasi OpenCV murah pada gambar
+    kecil: gradien morfologi -> Otsu -> closing horizontal -> komponen yang berbentuk baris.
+    Mengembalikan (daftar kotak [x1, y1, x2, y2] dalam koordinat asli, tinggi baris teks
+    dalam piksel asli), atau ([], None) jika tidak ada baris teks yang meyakinkan.
+    """
+    tinggi, lebar = gray.shape
+    skala = min(1.0, _LEBAR_DETEKSI / lebar)
+    kecil = cv2.resize(gray, None, fx=skala, fy=skala, interpolation=cv2.INTER_AREA) if skala < 1 else gray
+    tinggi_kecil, lebar_kecil = kecil.shape
+
+    gradien = cv2.morphologyEx(kecil, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, biner = cv2.threshold(gradien, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    biner = cv2.morphologyEx(biner, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    jumlah, _, statistik, _ = cv2.connectedComponentsWithStats(biner)
+
+    batas_atas, batas_bawah = tinggi_kecil * FOTO_PITA_ATAS, tinggi_kecil * (1 - FOTO_PITA_BAWAH)
+    baris_per_pita = {"atas": [], "bawah": []}
+    for x, y, w, h, _ in statistik[1:jumlah]:
+        # Baris teks: jauh lebih lebar dari tingginya dan tidak terlalu tinggi
+        if w < 3 * h or h < 4 or h > 0.1 * tinggi_kecil:
+            continue
+        tengah_y = y + h / 2
+        if tengah_y <= batas_atas:
+            baris_per_pita["atas"].append((x, y, x + w, y + h))
+        elif tengah_y >= batas_bawah:
+            baris_per_pita["bawah"].append((x, y, x + w, y + h))
+
+    semua_baris = baris_per_pita["atas"] + baris_per_pita["bawah"]
+    if not semua_baris:
+        return [], None
+    tinggi_baris = float(np.median([y2 - y1 for _, y1, _, y2 in semua_baris]))
+    pad = tinggi_baris * 0.5
+    kotak = []
+    for daftar in baris_per_pita.values():
+        if daftar:
+            x1, y1 = min(b[0] for b in daftar) - pad, min(b[1] for b in daftar) - pad
+            x2, y2 = max(b[2] for b in daftar) + pad, max(b[3] for b in daftar) + pad
+            kotak.append([
+                int(max(0, x1) / skala), int(max(0, y1) / skala),
+                int(min(lebar_kecil, x2) / skala), int(min(tinggi_kecil, y2) / skala),
+            ])
+    return kotak, tinggi_baris / skala
+
+def siapkan_roi_overlay(gray: np.ndarray) -> np.ndarray:
+    """
+    Crop pita teks, resize agar tinggi baris ~FOTO_TINGGI_TEKS_TARGET, lalu threshold
+    (vektor, bukan per piksel di Python). Beberapa pita ditumpuk menjadi satu gambar
+    agar Tesseract cukup dipanggil sekali. Tanpa pita terdeteksi, seluruh foto dipakai.
+    """
+    kotak, tinggi_baris = cari_pita_teks(gray)
+    if not kotak:
+        tinggi, lebar = gray.shape
+        kotak = [[0, 0, lebar, tinggi]]
+        # Tinggi baris tidak diketahui: cukup batasi lebar agar foto 4000 px tidak di-OCR penuh
+        skala = min(1.0, 2000 / lebar)
+    else:
+        skala = min(2.0, max(0.2, FOTO_TINGGI_TEKS_TARGET / tinggi_baris))
+
+    potongan = []
+    for x1, y1, x2, y2 in kotak:
+        crop = gray[y1:y2, x1:x2]
+        if skala != 1.0:
+            crop = cv2.resize(crop, None, fx=skala, fy=skala, interpolation=cv2.INTER_AREA if skala < 1 else cv2.INTER_CUBIC)
+        _, crop = cv2.threshold(crop, 127, 255, cv2.THRESH_BINARY)
+        potongan.append(crop)
+
+    lebar_maks = max(p.shape[1] for p in potongan)
+    jarak = np.full((FOTO_TINGGI_TEKS_TARGET, lebar_maks), 255, np.uint8)
+    susunan = []
+    for p in potongan:
+        if susunan:
+            susunan.append(jarak)
+        susunan.append(cv2.copyMakeBorder(p, 0, 0, 0, lebar_maks - p.shape[1], cv2.BORDER_CONSTANT, value=255))
+    return np.vstack(susunan)
+
+def ocr_overlay(gray: np.ndarray) -> str:
+    roi = siapkan_roi_overlay(gray)
+    teks_mentah = pytesseract.image_to_string(Image.fromarray(roi), config=_CONFIG_OCR_OVERLAY)
+    return bersihkan_teks(teks_mentah)
+
 def ekstrak_metadata_gambar(path_gambar: str) -> str:
     try:
-        with Image.open(path_gambar) as img:
-            img_gray = img.convert('L')
-            img_processed = img_gray.point(lambda x: 0 if x < 128 else 255, '1')
-            config_ocr = '--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz .,:-/|°'
-            teks_mentah = pytesseract.image_to_string(img_processed, config=config_ocr)
-            return bersihkan_teks(teks_mentah)
+        return ocr_overlay(_muat_gray(path_gambar))
     except FileNotFoundError:
         raise FileNotFoundError(f"File gambar tidak ditemukan: {path_gambar}")
     except Exception as e:
         raise Exception(f"Error saat memproses gambar {path_gambar}: {str(e)}")
 
+def alasan_bukan_foto(gray: np.ndarray) -> Optional[str]:
+    """Alasan gambar dianggap bukan foto lapangan (lihat FOTO_LUAS_PIKSEL_MINIMUM), atau None."""
+    tinggi, lebar = gray.shape
+    if lebar * tinggi < FOTO_LUAS_PIKSEL_MINIMUM:
+        return f"terlalu kecil ({lebar}x{tinggi})"
+    fraksi_putih = np.count_nonzero(gray >= 245) / gray.size
+    if fraksi_putih > FOTO_FRAKSI_LATAR_PUTIH_MAKS:
+        return f"latar putih {fraksi_putih:.0%} (logo/tanda tangan)"
+    return None
+
+def ekstrak_sidik_gambar(path_gambar: str) -> Dict[str, Any]:
+    """
+    Sidik satu foto: hash perseptual (sinyal utama) dan teks overlay hasil OCR (sinyal kedua).
+    Gagal OCR tidak menggagalkan sidik; pesan errornya disimpan di "error_ocr".
+    Gambar yang bukan foto (alasan_bukan_foto) hanya mendapat "bukan_foto", tanpa hash dan OCR.
+    """
+    if not os.path.exists(path_gambar):
+        raise FileNotFoundError(f"File gambar tidak ditemukan: {path_gambar}")
+    # Gambar dibaca sekali untuk hash dan OCR
+    try:
+        gray = _muat_gray(path_gambar)
+        alasan = alasan_bukan_foto(gray)
+        if alasan:
+            return {"phash": None, "dhash": None, "teks": None, "bukan_foto": alasan}
+        sidik = {"phash": phash(gray), "dhash": dhash(gray), "teks": None}
+    except Exception as e:
+        raise Exception(f"Error saat menghitung hash gambar {path_gambar}: {str(e)}")
+    if FOTO_OCR_SEKUNDER:
+        try:
+            with DURASI_LANGKAH.waktu(langkah="ocr_foto"):
+                sidik["teks"] = ocr_overlay(gray)
+        except Exception as e:
+            sidik["error_ocr"] = f"Error saat memproses gambar {path_gambar}: {str(e)}"
+    return sidik
+
 def proses_validasi_dengan_petunjuk(
     list_gambar_proyek: List[str], 
-    indeks_master: Dict[str, Any], 
+    indeks_master: Any, 
     nama_proyek: str, 
     path_sesi: str,
-    progress_callback: Callable[[int, int], None] = None
+    progress_callback: Callable[[int, int], None] = None,
+    metadata_gambar: Dict[str, Any] = None
 ) -> Dict[str, Any]:
-    detail_duplikat, error_log = [], []
+    """
+    Mencocokkan setiap foto proyek dengan arsip di indeks master (IndeksMaster).
+    Duplikat ditentukan oleh jarak pHash/dHash ke foto termirip di arsip; teks overlay
+    yang sama hanya sinyal kedua. Foto yang teks overlay-nya sama tetapi gambarnya
+    berbeda dilaporkan terpisah di "kecocokan_teks_saja" untuk dicek manual, kecuali jika
+    entri teks itu belum punya hash (entri lama hasil migrasi yang fotonya tidak ditemukan):
+    seperti sebelum ada hash, teks overlay yang sama persis dianggap duplikat.
+    Logo/tanda tangan (alasan_bukan_foto) dilewati dan dilaporkan di "gambar_bukan_foto".
+    `metadata_gambar` ({path: sidik atau Exception}) boleh diisi jika sidik sudah dihitung
+    sebelumnya (mis. di pool proses); jika tidak, dihitung di sini.
+    """
+    detail_duplikat, kecocokan_teks_saja, gambar_bukan_foto, error_log = [], [], [], []
     jumlah_berhasil_diproses, file_unik_baru = 0, 0
     total_gambar = len(list_gambar_proyek)
 
@@ -45,22 +202,55 @@ def proses_validasi_dengan_petunjuk(
             progress_callback(i, total_gambar)
             
         try:
-            metadata_teks = ekstrak_metadata_gambar(path_gambar_input)
-            if not metadata_teks or len(metadata_teks.strip()) < 5:
-                jumlah_berhasil_diproses += 1; continue
-            
-            if metadata_teks in indeks_master:
-                path_relatif_duplikat = os.path.relpath(path_gambar_input, path_sesi)
-                duplikat_info = { "duplikat_ditemukan": path_relatif_duplikat.replace("\\", "/"), "duplikat_dari_petunjuk": indeks_master[metadata_teks] }
-                detail_duplikat.append(duplikat_info)
+            if metadata_gambar is not None and path_gambar_input in metadata_gambar:
+                sidik = metadata_gambar[path_gambar_input]
+                if isinstance(sidik, Exception):
+                    raise sidik
+            else:
+                sidik = ekstrak_sidik_gambar(path_gambar_input)
+            if sidik.get("error_ocr"):
+                error_log.append(f"OCR overlay gagal pada file {os.path.basename(path_gambar_input)}: {sidik['error_ocr']}")
+
+            path_relatif_file = os.path.relpath(path_gambar_input, path_sesi).replace("\\", "/")
+            if sidik.get("bukan_foto"):
+                gambar_bukan_foto.append({ "file": path_relatif_file, "alasan": sidik["bukan_foto"] })
+                jumlah_berhasil_diproses += 1
+                continue
+
+            teks = sidik.get("teks")
+            teks = teks if teks and len(teks.strip()) >= 5 else None
+            petunjuk_baru = { "sesi_asli": os.path.basename(path_sesi), "proyek_asli": nama_proyek, "path_relatif_di_sesi": path_relatif_file }
+
+            with DURASI_LANGKAH.waktu(langkah="cari_indeks"):
+                # Cari-atau-catat dalam satu transaksi: aman jika sesi lain memproses foto yang sama bersamaan
+                kecocokan = indeks_master.cocokkan_atau_catat_foto(
+                    sidik["phash"], sidik["dhash"], petunjuk_baru, teks,
+                    FOTO_JARAK_PHASH_MAKS, FOTO_JARAK_DHASH_MAKS
+                )
+                # Indeks teks overlay tetap diisi (first-writer-wins) sebagai sinyal kedua
+                petunjuk_teks = indeks_master.setdefault(teks, petunjuk_baru) if teks else None
+            # Dibandingkan isinya: saat run dilanjutkan, petunjuk foto ini sendiri bisa sudah tercatat
+            teks_sudah_ada = petunjuk_teks is not None and petunjuk_teks != petunjuk_baru
+            if not kecocokan and teks_sudah_ada and not indeks_master.punya_hash(petunjuk_teks):
+                kecocokan = {"petunjuk": petunjuk_teks, "jarak_phash": None, "jarak_dhash": None, "kemiripan": None, "sidik_ocr": teks}
+
+            if kecocokan:
+                FOTO_DUPLIKAT.tambah()
+                detail_duplikat.append({
+                    "duplikat_ditemukan": path_relatif_file,
+                    "duplikat_dari_petunjuk": kecocokan["petunjuk"],
+                    "jarak_phash": kecocokan["jarak_phash"],
+                    "jarak_dhash": kecocokan["jarak_dhash"],
+                    "kemiripan": kecocokan["kemiripan"],
+                    "teks_overlay_sama": bool(teks) and teks == kecocokan["sidik_ocr"],
+                })
             else:
-                path_relatif_file = os.path.relpath(path_gambar_input, path_sesi)
-                petunjuk_baru = { "sesi_asli": os.path.basename(path_sesi), "proyek_asli": nama_proyek, "path_relatif_di_sesi": path_relatif_file.replace("\\", "/") }
-                indeks_master[metadata_teks] = petunjuk_baru
                 file_unik_baru += 1
+                if teks_sudah_ada:
+                    kecocokan_teks_saja.append({ "file": path_relatif_file, "teks_overlay": teks, "petunjuk_teks": petunjuk_teks })
             
             jumlah_berhasil_diproses += 1
         except Exception as e:
             error_log.append(f"Error pada file {os.path.basename(path_gambar_input)}: {e}")
             
-    return { "status": "selesai", "jumlah_gambar_diproses": total_gambar, "berhasil_diproses": jumlah_berhasil_diproses, "duplikat_ditemukan": len(detail_duplikat), "file_unik_baru_dicatat": file_unik_baru, "detail_duplikat": detail_duplikat, "error_log": error_log }
\ No newline at end of file
+    return { "status": "selesai", "jumlah_gambar_diproses": total_gambar, "berhasil_diproses": jumlah_berhasil_diproses, "duplikat_ditemukan": len(detail_duplikat), "file_unik_baru_dicatat": file_unik_baru, "detail_duplikat": detail_duplikat, "kecocokan_teks_saja": kecocokan_teks_saja, "gambar_bukan_foto": gambar_bukan_foto, "error_log": error_log }
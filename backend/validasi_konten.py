@@ -1,12 +1,17 @@
 # backend/validasi_konten.py
 # Versi dengan metode pencarian "tanpa spasi" untuk mengatasi tokenization
 
+import os
 import re
 import json
 from typing import List, Dict, Any
 from json_repair import repair_json
 
-from backend.konteks_extractor import get_indobert_model_and_tokenizer
+from pencocok_frasa import get_pencocok_frasa
+
+# Halaman (selain halaman 1) baru dipilih untuk diproses model jika memuat minimal sekian
+# frasa_petunjuk_halaman yang berbeda; satu label saja sering muncul di keterangan foto
+PRAKLASIFIKASI_MIN_FRASA = int(os.environ.get("PRAKLASIFIKASI_MIN_FRASA", "2"))
 
 ATURAN_VALIDASI = {
     "BAUT": {
@@ -26,7 +31,10 @@ ATURAN_VALIDASI = {
             # Tambahkan field lain yang spesifik untuk BAUT
         ],
         # Kata kunci untuk membantu identifikasi otomatis di masa depan
-        "frasa_kunci_identifikasi": ["UJI TERIMA", "BAUT"] 
+        "frasa_kunci_identifikasi": ["UJI TERIMA", "BAUT"],
+        # Label yang biasa tercetak di halaman berisi field wajib (untuk memilih halaman
+        # yang perlu diproses model, lihat praklasifikasi_dokumen)
+        "frasa_petunjuk_halaman": ["PROYEK", "KONTRAK", "WITEL", "DISTRICT", "LOKASI", "PELAKSANA", "NOMOR", "TANGGAL", "SURAT PESANAN", "PERMOHONAN"]
     },
     "BACT": {
         "nama_dokumen": "Berita Acara Commissioning Test",
@@ -43,7 +51,8 @@ ATURAN_VALIDASI = {
             "TAHUN"
             # Tambahkan field lain yang spesifik untuk BACT
         ],
-        "frasa_kunci_identifikasi": ["COMMISSIONING TEST", "BACT", "BATC"]
+        "frasa_kunci_identifikasi": ["COMMISSIONING TEST", "BACT", "BATC"],
+        "frasa_petunjuk_halaman": ["PROYEK", "KONTRAK", "WITEL", "DISTRICT", "LOKASI", "PELAKSANA", "TANGGAL", "HARI", "BULAN", "TAHUN"]
     },
     "UMUM": {
         "nama_dokumen": "Dokumen Umum",
@@ -57,48 +66,34 @@ def cek_kelengkapan_dokumen(laporan_kontekstual: List[Dict[str, Any]], aturan_ke
     """
     Memvalidasi kelengkapan dokumen berdasarkan keberadaan frasa wajib
     menggunakan metode pencarian 'tanpa spasi' untuk mengatasi tokenization.
+    Token dialirkan halaman per halaman ke satu automaton berisi semua frasa wajib,
+    sehingga biayanya linear terhadap panjang dokumen berapa pun jumlah frasanya.
     """
     
     frasa_wajib = aturan_kelengkapan.get('frasa_wajib', [])
     if not frasa_wajib:
         return {"status": "DILEWATI", "message": "Tidak ada aturan frasa wajib yang didefinisikan."}
 
-    # Gabungkan semua token dari semua halaman menjadi satu string teks besar
-    teks_dokumen_lengkap = ""
-    for halaman in laporan_kontekstual:
+    pemindai = get_pencocok_frasa(tuple(frasa_wajib)).pemindai()
+    for nomor, halaman in enumerate(laporan_kontekstual, 1):
         analisis_halaman = halaman.get('analisis', {})
         hasil_analisis = analisis_halaman.get('hasil_analisis_kontekstual', [])
         for item in hasil_analisis:
-            # Menggunakan 'token' yang sudah di-lowercase dari model jika ada, atau handle token dari tokenizer
-            # Untuk LayoutLMV3, token biasanya sudah bersih
-            token = item.get('token', '')
-            # Menghilangkan karakter khusus awal kata dari beberapa tokenizer (seperti ' ')
-            if token.startswith(' '):
-                token = token[1:]
-            teks_dokumen_lengkap += token
-
-    # --- PERBAIKAN LOGIKA DI SINI ---
-    # Normalisasi teks ke huruf kecil dan hapus SEMUA spasi dan karakter non-alfanumerik
-    teks_dokumen_normal = re.sub(r'[^a-z0-9]', '', teks_dokumen_lengkap.lower())
-
-    frasa_ditemukan = []
-    frasa_tidak_ditemukan = []
-
-    for frasa in frasa_wajib:
-        # Normalisasi frasa yang dicari dengan cara yang sama
-        frasa_normal = re.sub(r'[^a-z0-9]', '', frasa.lower())
-        
-        if frasa_normal in teks_dokumen_normal:
-            frasa_ditemukan.append(frasa)
-        else:
-            frasa_tidak_ditemukan.append(frasa)
+            # Karakter non-alfanumerik (spasi, penanda awal kata tokenizer) dibuang oleh normalisasi;
+            # status automaton berlanjut antar token dan antar halaman
+            pemindai.umpan(item.get('token', ''), halaman.get('halaman', nomor))
+
+    frasa_ditemukan = [frasa for frasa in frasa_wajib if frasa in pemindai.lokasi]
+    frasa_tidak_ditemukan = [frasa for frasa in frasa_wajib if frasa not in pemindai.lokasi]
 
     status = "LENGKAP" if not frasa_tidak_ditemukan else "TIDAK LENGKAP"
 
     return {
         "status": status,
         "frasa_ditemukan": frasa_ditemukan,
-        "frasa_tidak_ditemukan": frasa_tidak_ditemukan
+        "frasa_tidak_ditemukan": frasa_tidak_ditemukan,
+        # Halaman tempat setiap frasa ditemukan (halaman tempat frasa berakhir)
+        "lokasi_frasa": {frasa: pemindai.lokasi[frasa] for frasa in frasa_ditemukan}
     }
 
 # Di dalam backend/validasi_konten.py
@@ -141,6 +136,23 @@ def _gabungkan_token_menjadi_entitas(hasil_analisis_kontekstual: list) -> list:
     entitas_final.sort(key=lambda e: (e["box"][1], e["box"][0]))
     return entitas_final
 
+# Semua label field yang dipakai oleh salah satu tipe dokumen di ATURAN_VALIDASI
+LABEL_FIELD_VALIDASI = {field for aturan in ATURAN_VALIDASI.values() for field in aturan["field_wajib"]}
+
+def entitas_punya_label_field(entitas: list) -> bool:
+    """
+    True jika minimal satu entitas berlabel field yang dikenal ATURAN_VALIDASI
+    (prefiks BIO "B-"/"I-" diabaikan). Halaman tanpa entitas seperti ini tidak
+    perlu ditata ulang oleh FLAN-T5.
+    """
+    for item in entitas:
+        label = item.get("label", "")
+        if label[:2] in ("B-", "I-"):
+            label = label[2:]
+        if label in LABEL_FIELD_VALIDASI:
+            return True
+    return False
+
 def tata_ulang_dengan_indobert_lokal(final_entities: list) -> dict:
     
     """
@@ -159,6 +171,8 @@ def tata_ulang_dengan_indobert_lokal(final_entities: list) -> dict:
     input_text = "\n".join(input_lines)
 
     # 2. Panggil getter untuk mendapatkan model dan tokenizer yang sudah pasti terisi
+    # (diimpor di sini agar modul validasi bisa dipakai tanpa memuat torch/transformers)
+    from konteks_extractor import get_indobert_model_and_tokenizer
     brain_model, brain_tokenizer = get_indobert_model_and_tokenizer()
 
     # 3. Lakukan Tokenisasi (gunakan variabel lokal)
@@ -236,6 +250,62 @@ def cek_validitas_isian_data(data_terstruktur: dict, tipe_dokumen: str) -> dict:
         "field_kosong": field_kosong
     }
 
+# Urutan pengecekan jika frasa beberapa tipe muncul bersamaan
+PRIORITAS_TIPE_DOKUMEN = ("BACT", "BAUT")
+# Frasa kunci dari frasa_kunci_identifikasi di ATURAN_VALIDASI, dipisah menjadi judul (lebih
+# dari satu kata, mis. "UJI TERIMA") dan singkatan (BAUT/BACT/BATC). Judul dicocokkan dengan
+# pencocok frasa (tahan pemecahan token); singkatan hanya sebagai kata utuh, karena tanpa batas
+# kata "BATC" juga cocok dengan "batch" dan nomor BACT yang dikutip di halaman BAUT ikut terbaca.
+_JUDUL_KE_TIPE = {
+    frasa: tipe
+    for tipe in PRIORITAS_TIPE_DOKUMEN
+    for frasa in ATURAN_VALIDASI[tipe].get("frasa_kunci_identifikasi", [])
+    if len(frasa.split()) > 1
+}
+# Angka dan garis bawah dihitung sebagai batas kata agar nama file seperti "BAUT_2023.pdf" tetap dikenali
+_POLA_SINGKATAN_PER_TIPE = {
+    tipe: re.compile(
+        r"(?<![A-Za-z])(?:" + "|".join(re.escape(f) for f in ATURAN_VALIDASI[tipe].get("frasa_kunci_identifikasi", []) if len(f.split()) == 1) + r")(?![A-Za-z])",
+        re.IGNORECASE
+    )
+    for tipe in PRIORITAS_TIPE_DOKUMEN
+}
+
+def _tipe_dari_frasa_kunci(teks: str) -> str | None:
+    """
+    Tipe dokumen dari judul di `teks` (urut menurut PRIORITAS_TIPE_DOKUMEN jika beberapa judul
+    muncul); jika tidak ada judul, dari singkatan yang muncul sebagai kata utuh.
+    """
+    ditemukan = {_JUDUL_KE_TIPE[frasa] for frasa in get_pencocok_frasa(tuple(_JUDUL_KE_TIPE)).cari(teks)}
+    if not ditemukan:
+        ditemukan = {tipe for tipe, pola in _POLA_SINGKATAN_PER_TIPE.items() if pola.search(teks)}
+    return next((tipe for tipe in PRIORITAS_TIPE_DOKUMEN if tipe in ditemukan), None)
+
+def praklasifikasi_dokumen(teks_per_halaman: List[str], nama_file_pdf: str) -> Dict[str, Any]:
+    """
+    Tebakan awal sebelum model dijalankan, dari lapisan teks PDF (`teks_per_halaman[i]` =
+    teks halaman i+1, kosong untuk halaman scan) dan nama file:
+    - tipe: dari frasa_kunci_identifikasi di halaman 1, lalu nama file; None jika tidak dikenali
+    - halaman_terpilih: halaman yang kemungkinan berisi field wajib tipe tersebut. Halaman 1
+      dan halaman tanpa lapisan teks (isinya belum diketahui) selalu ikut. Jika tipe tidak
+      dikenali, semua halaman dipilih.
+    """
+    semua_halaman = list(range(1, len(teks_per_halaman) + 1))
+    tipe, sumber = None, None
+    if teks_per_halaman:
+        tipe, sumber = _tipe_dari_frasa_kunci(teks_per_halaman[0]), "teks_halaman_1"
+    if not tipe:
+        tipe, sumber = _tipe_dari_frasa_kunci(nama_file_pdf), "nama_file"
+    if not tipe:
+        return {"tipe": None, "sumber": None, "halaman_terpilih": semua_halaman}
+
+    pencocok = get_pencocok_frasa(tuple(ATURAN_VALIDASI[tipe].get("frasa_petunjuk_halaman", [])))
+    halaman_terpilih = [
+        nomor for nomor, teks in zip(semua_halaman, teks_per_halaman)
+        if nomor == 1 or not teks.strip() or len(pencocok.cari(teks)) >= PRAKLASIFIKASI_MIN_FRASA
+    ]
+    return {"tipe": tipe, "sumber": sumber, "halaman_terpilih": halaman_terpilih}
+
 def deteksi_tipe_dokumen_dari_hasil_ai(data_terstruktur: dict, nama_file_pdf: str) -> str:
     """
     Mendeteksi tipe dokumen (BAUT/BACT) dengan prioritas pada hasil ekstraksi AI,
@@ -246,24 +316,17 @@ def deteksi_tipe_dokumen_dari_hasil_ai(data_terstruktur: dict, nama_file_pdf: st
     # (Sesuaikan nama field ini dengan output JSON Impian kita)
     
     # Gabungkan semua nilai teks yang mungkin relevan dari hasil AI
-    teks_untuk_diperiksa = ""
-    if "SECTION" in data_terstruktur:
-        teks_untuk_diperiksa += " " + str(data_terstruktur["SECTION"]).upper()
-    if "Tipe_Dokumen" in data_terstruktur:
-        teks_untuk_diperiksa += " " + str(data_terstruktur["Tipe_Dokumen"]).upper()
-    
-    # Cek frasa kunci di teks yang diekstrak
-    if "COMMISSIONING TEST" in teks_untuk_diperiksa or "BACT" in teks_untuk_diperiksa or "BATC" in teks_untuk_diperiksa:
-        return "BACT"
-    if "UJI TERIMA" in teks_untuk_diperiksa or "BAUT" in teks_untuk_diperiksa:
-        return "BAUT"
+    teks_untuk_diperiksa = " ".join(
+        str(data_terstruktur[field]) for field in ("SECTION", "Tipe_Dokumen") if field in data_terstruktur
+    )
+    tipe = _tipe_dari_frasa_kunci(teks_untuk_diperiksa)
+    if tipe:
+        return tipe
 
     # --- STRATEGI 2: Cek Nama File (Cadangan) ---
-    nama_file_upper = nama_file_pdf.upper()
-    if "BACT" in nama_file_upper or "BATC" in nama_file_upper:
-        return "BACT"
-    if "BAUT" in nama_file_upper:
-        return "BAUT"
+    tipe = _tipe_dari_frasa_kunci(nama_file_pdf)
+    if tipe:
+        return tipe
         
     # --- Fallback Terakhir ---
-    return "UMUM"
\ No newline at end of file
+    return "UMUM"